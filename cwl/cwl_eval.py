@@ -13,48 +13,111 @@ __license__ = 'MIT'
 __version__ = '1.0.0'
 
 import os
+import sys
+import glob
 import argparse
+import collections
+import itertools
 import logging
+import operator
+import multiprocessing
+import numpy as np
 from cwl.seeker.trec_qrel_handler import TrecQrelHandler
+from cwl.seeker.trec_qrel_index import TrecQrelIndex, is_qrel_index
+from cwl.seeker.trec_qrel_diff import read_judgements, changed_topics, apply_qrel_delta
+from cwl.seeker.trec_result_sorter import TrecResultSorter
+from cwl.seeker.column_file_reader import is_stdin, read_columns, to_floats
 from cwl.ruler.cwl_ruler import CWLRuler
-from cwl.ruler.ranking import RankingMaker, Ranking
+from cwl.ruler.ranking import RankingMaker, Ranking, RankingBatch
+from cwl.ruler.result_writer import RESULT_WRITERS, MEASUREMENT_NAMES, SUMMARY_TOPIC_ID, INTERVAL_TOPIC_IDS, \
+    format_rows
+from cwl.ruler.measurement_summary import MeasurementSummary
+from cwl.ruler.significance import CORRECTIONS, compare_runs
+from cwl.ruler.bootstrap import bootstrap_intervals
+from cwl.ruler.result_cache import CACHE_VERSION, ResultCache, file_digest, make_key
 
 
 def read_in_cost_file(cost_file):
     """
     Reads in the cost file and stores in a dictionary for looking up the costs.
     The element_type is to be denoted in the TREC Results File using the previously unused field (2nd Column).
-    :param cost_file: expects a space/tab seperated file with element_type (string) and cost(float)
+    :param cost_file: expects a space/tab seperated file with element_type (string) and cost(float),
+    which may be compressed (gzip, bzip2 or xz), or - for stdin
     :return: returns a dictionary of element_type/costs
     """
     costs = dict()
-    with open(cost_file, "r") as cf:
-        while cf:
-            line = cf.readline()
-            if not line:
-                break
-            (element_type, cost) = line.split()
-            element_type = element_type.strip()
-            costs[element_type] = float(cost)
+    for line_numbers, (element_types, element_costs) in read_columns(cost_file, 2):
+        costs.update(zip(element_types, to_floats(element_costs, line_numbers, cost_file, "cost")))
     return costs
 
 
+def read_in_gain_file(gain_file):
+    """
+    Opens the gain file as a qrel index if it has been compiled into one (see seeker.trec_qrel_index),
+    otherwise reads in the TREC qrel file.
+    :param gain_file: a TREC formatted qrel file (which may be compressed, or - for stdin), or a qrel index
+    :return: seeker.trec_qrel_index.TrecQrelIndex or seeker.trec_qrel_handler.TrecQrelHandler
+    """
+    if is_qrel_index(gain_file):
+        return TrecQrelIndex(gain_file)
+    return TrecQrelHandler(gain_file)
+
+
 def check_file_exists(filename):
-    if filename and not os.path.exists(filename):
+    if filename and not is_stdin(filename) and not os.path.exists(filename):
         print("{0} Not Found".format(filename))
         quit(1)
 
 
+def expand_result_files(result_files):
+    """
+    Expands any glob patterns (e.g. runs/*.txt) in the list of result files, keeping the order given.
+    Patterns that match no files are kept as they are (so that they are reported as not found).
+    :param result_files: a result file, or a list of result files and/or glob patterns
+    :return: the list of result files
+    """
+    if isinstance(result_files, str):
+        result_files = [result_files]
+    expanded = []
+    for result_file in result_files:
+        matches = sorted(glob.glob(result_file)) if glob.has_magic(result_file) else []
+        expanded.extend(matches if matches else [result_file])
+    return expanded
+
+
+# the extensions of compressed files, which are left out of run ids
+COMPRESSED_EXTENSIONS = [".gz", ".bz2", ".xz"]
+
+
+def get_run_id(results_file):
+    """
+    The run id that labels the measurements of a result file (i.e. the name of the file,
+    without the extension of a compressed file), or stdin if it is read from stdin.
+    """
+    if is_stdin(results_file):
+        return "stdin"
+    run_id = os.path.basename(results_file)
+    for extension in COMPRESSED_EXTENSIONS:
+        if run_id.endswith(extension) and len(run_id) > len(extension):
+            return run_id[:-len(extension)]
+    return run_id
+
+
 def parse_args():
 
     arg_parser = argparse.ArgumentParser(description="CWL Evaluation Metrics")
     arg_parser.add_argument("gain_file", help="A TREC Formatted Qrel File with "
                                               "relevance column assumed to be gain values."
                                               "Gain values should be between zero and one (unless otherwise specified)."
-                                              "Four column tab/space sep file with fields: topic_id unused doc_id gain")
-    arg_parser.add_argument("result_file",
-                            help="TREC formatted results file. Six column tab/space sep file with fields:"
-                                 " topic_id element_type doc_id rank score run_id.")
+                                              "Four column tab/space sep file with fields: topic_id unused doc_id gain. "
+                                              "It may be compressed (gzip, bzip2 or xz), or - to read it from stdin. "
+                                              "Or a qrel index compiled from one with: "
+                                              "python -m cwl.seeker.trec_qrel_index <qrel_file> <index_file>")
+    arg_parser.add_argument("result_file", nargs="+",
+                            help="TREC formatted results file(s) or glob pattern(s). Six column tab/space sep file "
+                                 "with fields: topic_id element_type doc_id rank score run_id. If there is more than "
+                                 "one, each line of output is labelled with the run id (the name of the result file). "
+                                 "Result files may be compressed (gzip, bzip2 or xz), or - to read one from stdin.")
     arg_parser.add_argument("-c", "--cost_file",
                             help="Costs associated with each element type specified in result file.",
                             required=False, default=None)
@@ -76,13 +139,96 @@ def parse_args():
                                                " for checking gain input file. "
                                                "(default=0.0)", required=False, default=0.0, type=float)
     arg_parser.add_argument("--max_cost", help="Maximum cost associated with an item. Used for computing residuals. "
-                                               "(default=1.0)", required=False, default=1.0)
+                                               "(default=1.0)", required=False, default=1.0, type=float)
     arg_parser.add_argument("--min_cost", help="Minimum cost associated with an item. Used for computing residuals. "
-                                               "(default=1.0)", required=False, default=1.0)
+                                               "(default=1.0)", required=False, default=1.0, type=float)
     arg_parser.add_argument("--max_depth", help="Maximum depth to compute metrics. "
                                                 "(default=1000)", required=False, default=1000, type=int)
+    arg_parser.add_argument("--batch_size", help="Number of topics that are measured together in one batch. "
+                                                 "(default=1000)", required=False, default=1000, type=int)
+    arg_parser.add_argument("--workers", help="Number of worker processes that measure batches of topics in parallel. "
+                                              "(default=1)", required=False, default=1, type=int)
+    arg_parser.add_argument("--epsilon", help="Stop scoring a ranking at the depth where the probability of examining "
+                                              "an item falls to epsilon or below. The truncation error (the examination "
+                                              "probability dropped) is written to the log. (default=0.0)",
+                            required=False, default=0.0, type=float)
+    arg_parser.add_argument("-o", "--output_dir", help="If specified, the measurements of each result file are saved "
+                                                       "to <output_dir>/<run_id>.cwl (or the extension of the "
+                                                       "format) rather than printed.",
+                            required=False, default=None)
+    arg_parser.add_argument("-f", "--format", help="The format of the measurements: tsv (the default), csv, jsonl "
+                                                   "(a JSON object per line) or npz (a NumPy archive with an array "
+                                                   "per column). csv and jsonl give the measurements at full "
+                                                   "precision.",
+                            required=False, default="tsv", choices=sorted(RESULT_WRITERS), dest="output_format")
+    arg_parser.add_argument("--compare", help="Compare the result files (two or more) with paired t-tests, Wilcoxon "
+                                              "signed rank tests and permutation tests of each metric over the topics "
+                                              "that they share, and output the p-values (rather than the "
+                                              "measurements, which are only saved with -o). The first result file is "
+                                              "compared with each of the others, unless --all_pairs is given.",
+                            required=False, action="store_true")
+    arg_parser.add_argument("--all_pairs", "--all-pairs", help="Compare every pair of result files.",
+                            required=False, action="store_true")
+    arg_parser.add_argument("--correction", help="The correction of the p-values of each metric and test for the "
+                                                 "number of pairs of result files that are compared. (default=holm)",
+                            required=False, default="holm", choices=CORRECTIONS)
+    arg_parser.add_argument("--permutations", help="Number of random permutations of the permutation test. "
+                                                   "(default=10000)", required=False, default=10000, type=int)
+    arg_parser.add_argument("--measure", help="The measurement that is compared. (default=EU)",
+                            required=False, default="EU", choices=MEASUREMENT_NAMES)
+    arg_parser.add_argument("--seed", help="The seed of the random permutations and bootstrap resamples. "
+                                           "(default=0)",
+                            required=False, default=0, type=int)
+    arg_parser.add_argument("--summary", help="After the measurements of the topics of each result file, output "
+                                              "their means over all the topics (the rows of the topic 'all').",
+                            required=False, action="store_true")
+    arg_parser.add_argument("--summary_only", "--summary-only", help="Only output the means of the measurements "
+                                                                     "over all the topics (the rows of the topic "
+                                                                     "'all'), rather than the measurements of each "
+                                                                     "topic as well.",
+                            required=False, action="store_true")
+    arg_parser.add_argument("--bootstrap", help="Number of bootstrap resamples of the topics of each result file, "
+                                                "from which the percentile and BCa confidence intervals of the means "
+                                                "of the measurements are output after the measurements (and the "
+                                                "'all' rows). "
+                                                "(default=0, no intervals)", required=False, default=0, type=int)
+    arg_parser.add_argument("--confidence", help="The confidence level of the bootstrap intervals. (default=0.95)",
+                            required=False, default=0.95, type=float)
+    arg_parser.add_argument("--cache_dir", "--cache-dir", help="If specified, the measurements of each topic are cached "
+                                                               "in this directory, keyed by the contents of the inputs "
+                                                               "(the ranking of the topic, the gain and cost files, the "
+                                                               "metrics and the options), and only the topics that are "
+                                                               "not cached are measured.",
+                            required=False, default=None)
+    arg_parser.add_argument("--cache_size", "--cache-size", help="The size of the cache in MB, beyond which the entries "
+                                                                 "used least recently are evicted. (default=1024)",
+                            required=False, default=1024.0, type=float)
+    arg_parser.add_argument("--previous_qrels", "--previous-qrels", help="The previous version of the gain file, "
+                                                                         "with which the runs were measured and saved "
+                                                                         "to the output_dir (-o). Only the topics "
+                                                                         "whose judgements have changed are measured "
+                                                                         "again, and the saved files are updated.",
+                            required=False, default=None)
+    arg_parser.add_argument("--qrels_delta", "--qrels-delta", help="A TREC qrel file of the judgements that are new "
+                                                                   "or have changed since the runs were measured with "
+                                                                   "the gain file and saved to the output_dir (-o). "
+                                                                   "The judgements replace those of the gain file, and "
+                                                                   "only the topics they change are measured again.",
+                            required=False, default=None)
 
     p_args = arg_parser.parse_args()
+    p_args.result_file = expand_result_files(p_args.result_file)
+    if p_args.compare and len(p_args.result_file) < 2:
+        arg_parser.error("--compare needs two or more result files")
+    if p_args.bootstrap < 0 or not 0.0 < p_args.confidence < 1.0:
+        arg_parser.error("--bootstrap must be at least zero, and --confidence between zero and one")
+    if sum(1 for f in [p_args.gain_file, p_args.cost_file, p_args.previous_qrels, p_args.qrels_delta] +
+           p_args.result_file if f and is_stdin(f)) > 1:
+        arg_parser.error("only one of the input files can be read from stdin (-)")
+    if p_args.previous_qrels and p_args.qrels_delta:
+        arg_parser.error("only one of --previous_qrels and --qrels_delta can be given")
+    if (p_args.previous_qrels or p_args.qrels_delta) and not p_args.output_dir:
+        arg_parser.error("--previous_qrels and --qrels_delta update the measurements saved in an output_dir (-o)")
     if p_args.colnames:
         p_args.colnames = True
     else:
@@ -96,77 +242,491 @@ def parse_args():
     return p_args
 
 
+def read_in_topics(results_file):
+    """
+    Reads in the TREC results file, topic by topic.
+    The items of each topic are ranked by score, with ties broken on the doc_id (see seeker.trec_result_sorter).
+    :param results_file: TREC formatted results file
+    :return: yields the topic_id, and the lists of the doc_ids and element_types of the items in the ranking,
+    of each topic
+    """
+    return TrecResultSorter().topics(results_file)
+
+
+def read_in_batches(results_file, batch_size):
+    """
+    Groups the topics in the results file into batches (lists) of up to batch_size topics.
+    """
+    batch = []
+    for topic in read_in_topics(results_file):
+        batch.append(topic)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def measure_topics(cwl_ruler, qrh, costs, topics, max_gain=1.0, max_cost=1.0, min_cost=1.0, max_n=1000):
+    """
+    Builds the ranking of each topic, then measures them as one batch (see ruler.ranking.RankingBatch).
+    :param topics: a list of the topic_id, doc_ids and element_types of each topic (see read_in_topics)
+    :return: the topic ids, and the arrays of the measurements and residuals (see CWLRuler.measurements)
+    """
+    rankings = []
+    for topic_id, doc_ids, element_types in topics:
+        ranking_maker = RankingMaker(topic_id, qrh, costs,
+                                     max_gain=max_gain, max_cost=max_cost, min_cost=min_cost, max_n=max_n)
+        ranking_maker.add_all(doc_ids, element_types)
+        rankings.append(ranking_maker.get_ranking())
+
+    if not rankings:
+        # (e.g. when every topic of the batch is cached)
+        shape = (0, len(cwl_ruler.metrics), len(MEASUREMENT_NAMES))
+        return [], np.zeros(shape), np.zeros(shape) if cwl_ruler.residuals else None
+    cwl_ruler.measure_batch(RankingBatch(rankings))
+    return cwl_ruler.measurements()
+
+
+# The state of each worker process (the ruler, the qrels and the costs),
+# which is set up once per worker by init_worker, rather than being sent with each batch of topics.
+_worker_state = {}
+
+
+def init_worker(cwl_ruler, qrh, costs, ranking_params):
+    _worker_state["args"] = (cwl_ruler, qrh, costs)
+    _worker_state["ranking_params"] = ranking_params
+
+
+def measure_topics_in_worker(task):
+    (run_index, topics) = task
+    return run_index, measure_topics(*_worker_state["args"], topics, **_worker_state["ranking_params"])
+
+
+def get_worker_pool(workers, init_args, initializer=init_worker):
+    """
+    Creates a pool of worker processes. Where possible the workers are forked,
+    so that they share the qrels with the main process, rather than each receiving a copy.
+    :param initializer: sets up the state of each worker from the init_args
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+    return context.Pool(workers, initializer=initializer, initargs=init_args)
+
+
+def cache_key(gain_file, cost_file, cwl_ruler, epsilon, ranking_params):
+    """
+    The key of the inputs shared by all of the topics (see ruler.result_cache): the digests of the gain and cost files,
+    the metrics (by their classes and parameters, see CWLMetric.params), and the options of the measurements.
+    :return: the key, or None if the gain or cost file is read from stdin (and so cannot be hashed)
+    """
+    if is_stdin(gain_file) or (cost_file and is_stdin(cost_file)):
+        return None
+    metrics = ["{0}:{1}".format(type(metric).__name__, ",".join(metric.params())) for metric in cwl_ruler.metrics]
+    options = ["{0}={1!r}".format(name, value) for name, value in sorted(ranking_params.items())]
+    options += ["residuals={0!r}".format(cwl_ruler.residuals), "epsilon={0!r}".format(epsilon)]
+    return make_key(str(CACHE_VERSION), file_digest(gain_file), file_digest(cost_file) if cost_file else "",
+                    metrics, options)
+
+
+def cached_tasks(cache, base_key, results_files, batch_size, n_metrics, pending):
+    """
+    Reads the batches of topics of the runs (see read_in_batches), and looks up the measurements of each topic in the
+    cache, by the key of its ranking (see ruler.result_cache). A run whose result file is unchanged is not read at all,
+    as its topics are listed in the cache (by the digest of the file).
+    :param pending: a deque, to which the topic ids, the keys and the cached measurements of each batch are added
+    (see merge_cached)
+    :return: yields the run index and the topics that are not cached (which may be none) of each batch
+    """
+    for run_index, results_file in enumerate(results_files):
+        run_key = None if is_stdin(results_file) else make_key(base_key, file_digest(results_file))
+        cached_run = cache.get_run(run_key) if run_key else None
+        if cached_run is not None:
+            (topic_ids, keys) = cached_run
+            hits = cache.get_topics(keys, n_metrics)
+            # (unless some of its topics have since been evicted)
+            if len(hits) == len(set(keys)):
+                for start in range(0, len(keys), batch_size):
+                    pending.append((topic_ids[start:start + batch_size], keys[start:start + batch_size], hits))
+                    yield run_index, []
+                continue
+        (run_topic_ids, run_keys) = ([], [])
+        for batch in read_in_batches(results_file, batch_size):
+            topic_ids = [topic_id for topic_id, doc_ids, element_types in batch]
+            keys = [make_key(base_key, topic_id, doc_ids, element_types) for topic_id, doc_ids, element_types in batch]
+            hits = cache.get_topics(keys, n_metrics)
+            pending.append((topic_ids, keys, hits))
+            run_topic_ids.extend(topic_ids)
+            run_keys.extend(keys)
+            yield run_index, [topic for topic, key in zip(batch, keys) if key not in hits]
+        if run_key:
+            cache.put_run(run_key, run_topic_ids, run_keys)
+
+
+def stored_measurements(filename, writer_class, metric_names, n_columns):
+    """
+    Reads the measurements of each topic from a file saved with -o (see write_measurements).
+    :param n_columns: the number of measurements (and residuals) of each metric
+    :return: a dict of the (metrics x columns) array of the measurements of each topic, or None if the file does not
+    exist, or does not hold the measurements of each topic for the same metrics (and residuals)
+    """
+    if not os.path.exists(filename):
+        return None
+    with open(filename, "rb") if writer_class.binary else open(filename, newline="") as f:
+        (topic_ids, names, values) = writer_class.read_rows(f)
+    if values.shape[1:] != (n_columns,):
+        return None
+    rows = collections.defaultdict(list)
+    for topic_id, name, row in zip(topic_ids, names, values):
+        if topic_id != SUMMARY_TOPIC_ID and topic_id not in INTERVAL_TOPIC_IDS:
+            rows[topic_id].append((name, row))
+    stored = {}
+    for topic_id, topic_rows in rows.items():
+        if [name for name, row in topic_rows] != list(metric_names):
+            return None
+        stored[topic_id] = np.array([row for name, row in topic_rows])
+    return stored
+
+
+def stored_tasks(output_dir, writer_class, results_files, batch_size, metric_names, n_columns, affected, pending):
+    """
+    Reads the batches of topics of the runs (see read_in_batches), and looks up the measurements of each topic in the
+    file of the run that was saved before (with -o) in the output_dir, where the qrels of only the affected topics
+    have changed since. Only the affected topics, and those that are not in the file, are measured again.
+    A run without a file (or whose file holds other metrics) is measured in full.
+    :param affected: the set of the ids of the topics whose qrels have changed
+    :param pending: a deque, to which the topic ids and the stored measurements of each batch are added
+    (see merge_cached, where the topic ids are the keys)
+    :return: yields the run index and the topics that are measured (which may be none) of each batch
+    """
+    for run_index, results_file in enumerate(results_files):
+        filename = os.path.join(output_dir, get_run_id(results_file) + writer_class.extension)
+        stored = stored_measurements(filename, writer_class, metric_names, n_columns) or {}
+        hits = dict((topic_id, values) for topic_id, values in stored.items() if topic_id not in affected)
+        (n_topics, n_measured) = (0, 0)
+        for batch in read_in_batches(results_file, batch_size):
+            topic_ids = [topic_id for topic_id, doc_ids, element_types in batch]
+            pending.append((topic_ids, topic_ids, hits))
+            measured = [topic for topic in batch if topic[0] not in hits]
+            n_topics += len(batch)
+            n_measured += len(measured)
+            yield run_index, measured
+        logging.getLogger('cwl').info("{0}: {1} of {2} topics were measured again".format(
+            filename, n_measured, n_topics))
+
+
+def merge_cached(cache, measurements, pending, n_metrics, residuals):
+    """
+    Adds the measurements of the topics that were not cached to the cache (if there is one), and merges them with
+    those that were, in the order of the topics of each batch (see cached_tasks and stored_tasks).
+    :param measurements: yields the run index and the measurements of the topics that were not cached of each batch
+    :return: yields the run index and the measurements of all of the topics of each batch (see measure_topics)
+    """
+    n_measurements = len(MEASUREMENT_NAMES)
+    for run_index, (_, scores, residual_scores) in measurements:
+        (topic_ids, keys, hits) = pending.popleft()
+        values = scores if residual_scores is None else np.concatenate((scores, residual_scores), axis=-1)
+        if cache is not None:
+            cache.put_topics([key for key in keys if key not in hits], values)
+        measured = iter(values)
+        merged = [hits[key] if key in hits else next(measured) for key in keys]
+        merged = np.stack(merged) if merged else np.zeros((0, n_metrics, n_measurements * (2 if residuals else 1)))
+        yield run_index, (topic_ids, merged[..., :n_measurements], merged[..., n_measurements:] if residuals else None)
+
+
+def write_run(writer, batches, run_id, summary=False, summary_only=False, bootstrap=None):
+    """
+    Writes the measurements of the batches of topics of a run, optionally followed by their means over all the topics
+    (the "all" rows), which are aggregated as the batches are written (see ruler.measurement_summary).
+    :param writer: the writer (see ruler.result_writer)
+    :param batches: the measurements of each batch of topics of the run (see measure_topics)
+    :param run_id: the run id
+    :param summary: if True, the "all" rows are written after the measurements of the topics
+    :param summary_only: if True, only the "all" rows are written
+    :param bootstrap: the parameters of the bootstrap intervals of the means (see ruler.bootstrap.bootstrap_intervals),
+    which are written last, or None
+    :return: the summary of the measurements of the run
+    """
+    measurement_summary = MeasurementSummary()
+    collected = []
+    for topic_ids, scores, residual_scores in batches:
+        measurement_summary.update(scores, residual_scores)
+        if bootstrap is not None:
+            collected.append(scores if residual_scores is None else np.concatenate((scores, residual_scores), axis=-1))
+        if not summary_only:
+            writer.write_batch(topic_ids, scores, residual_scores, run_id=run_id)
+    if summary or summary_only:
+        writer.write_summary(measurement_summary, run_id)
+    if bootstrap is not None and measurement_summary.count:
+        # (the intervals of the residuals are from the same resamples as those of the measurements)
+        intervals = bootstrap_intervals(np.concatenate(collected), **bootstrap)
+        n_measurements = len(MEASUREMENT_NAMES)
+        residual_intervals = intervals[..., n_measurements:] if writer.residuals else None
+        writer.write_intervals(intervals[..., :n_measurements], residual_intervals, run_id)
+    return measurement_summary
+
+
+def write_measurements(measurements, run_ids, writer_class, writer_params, output_dir=None, summary=False,
+                       summary_only=False, bootstrap=None):
+    """
+    Writes the measurements of the runs to stdout, where each row is labelled with the run id if there is more than
+    one run, or to a file per run (<output_dir>/<run_id> with the extension of the format).
+    :param measurements: yields the run index and the measurements of each batch of topics (see measure_topics),
+    with the runs in order
+    :param run_ids: the list of run ids
+    :param writer_class: the class of the writer of the format (see ruler.result_writer)
+    :param writer_params: the parameters of the writer (the metric names, residuals and col_names)
+    :param output_dir: the directory for the files of the runs (None for stdout)
+    :param summary: if True, the "all" rows of each run are written after its topics (see write_run)
+    :param summary_only: if True, only the "all" rows of each run are written
+    :param bootstrap: the parameters of the bootstrap intervals of the means of each run (see write_run), or None
+    :return: the summaries of the measurements of the runs
+    """
+    summaries = [MeasurementSummary() for _ in run_ids]
+    runs = itertools.groupby(measurements, key=operator.itemgetter(0))
+    if output_dir is None:
+        out = sys.stdout.buffer if writer_class.binary else sys.stdout
+        writer = writer_class(out, label_runs=len(run_ids) > 1, **writer_params)
+        writer.write_header()
+        for run_index, batches in runs:
+            batches = (batch for _, batch in batches)
+            summaries[run_index] = write_run(writer, batches, run_ids[run_index], summary, summary_only, bootstrap)
+        writer.close()
+        out.flush()
+        return summaries
+
+    os.makedirs(output_dir, exist_ok=True)
+    next_index = 0
+    # (the runs with no topics, which are skipped by the measurements, still get a file)
+    for run_index, batches in itertools.chain(runs, [(len(run_ids), [])]):
+        while next_index <= min(run_index, len(run_ids) - 1):
+            filename = os.path.join(output_dir, run_ids[next_index] + writer_class.extension)
+            with open(filename, "wb" if writer_class.binary else "w") as out:
+                writer = writer_class(out, **writer_params)
+                writer.write_header()
+                run_batches = (batch for _, batch in batches) if next_index == run_index else []
+                summaries[next_index] = write_run(writer, run_batches, run_ids[next_index], summary, summary_only,
+                                                  bootstrap)
+                writer.close()
+            next_index += 1
+    return summaries
+
+
+def collect_measurements(measurements, collected):
+    """
+    Passes on the measurements of each batch of topics, while adding the topic ids and the measurements to those
+    collected for the run (a pair of lists for each run).
+    """
+    for run_index, batch in measurements:
+        collected[run_index][0].extend(batch[0])
+        collected[run_index][1].append(batch[1])
+        yield run_index, batch
+
+
+def write_comparison(collected, run_ids, metric_names, measure="EU", all_pairs=False, correction="holm",
+                     permutations=10000, seed=0, col_names=False, pool=None, workers=1):
+    """
+    Compares the runs with paired tests of each metric (see ruler.significance.compare_runs),
+    over the topics measured for every run, and writes the p-values of the tests of each pair of runs to stdout.
+    :param collected: the topic ids and the arrays of the measurements of the batches of each run
+    (see collect_measurements)
+    :param measure: the name of the measurement that is compared
+    :param all_pairs: if True, every pair of runs is compared, otherwise the first run is compared with the others
+    :param pool: a pool of (workers) worker processes, across which the metrics of each pair are split
+    """
+    logger = logging.getLogger('cwl')
+    topic_sets = [set(topic_ids) for topic_ids, _ in collected]
+    common = [topic_id for topic_id in collected[0][0] if all(topic_id in s for s in topic_sets)]
+    run_scores = []
+    for run_id, (topic_ids, scores), topic_set in zip(run_ids, collected, topic_sets):
+        if len(topic_set) > len(common):
+            logger.info("{0}: {1} topics are left out of the comparison (as not all the runs have them)".format(
+                run_id, len(topic_set) - len(common)))
+        rows = {topic_id: i for i, topic_id in enumerate(topic_ids)}
+        scores = np.concatenate(scores) if scores else np.zeros((0, len(metric_names), len(MEASUREMENT_NAMES)))
+        run_scores.append(scores[[rows[topic_id] for topic_id in common], :, MEASUREMENT_NAMES.index(measure)])
+
+    if all_pairs:
+        pairs = list(itertools.combinations(range(len(run_ids)), 2))
+    else:
+        pairs = [(0, b) for b in range(1, len(run_ids))]
+    p_values = compare_runs(run_scores, pairs, permutations, seed, correction, pool, workers)
+
+    if col_names:
+        sys.stdout.write("RunA\tRunB\tMetric\tMeasure\tTopics\tMeanA\tMeanB\tDiff\tT-test\tWilcoxon\tPermutation\n")
+    n_metrics = len(metric_names)
+    means = [np.mean(scores, axis=0) if len(common) else np.full(n_metrics, np.nan) for scores in run_scores]
+    columns = [[run_ids[a] for a, b in pairs for _ in range(n_metrics)],
+               [run_ids[b] for a, b in pairs for _ in range(n_metrics)],
+               metric_names * len(pairs), [measure] * (len(pairs) * n_metrics), [len(common)] * (len(pairs) * n_metrics),
+               np.concatenate([means[a] for a, b in pairs]), np.concatenate([means[b] for a, b in pairs]),
+               np.concatenate([means[b] - means[a] for a, b in pairs])] + [p.ravel() for p in p_values]
+    if pairs and n_metrics:
+        sys.stdout.write(format_rows("%s\t%s\t%s\t%s\t%d\t%.4f\t%.4f\t%.4f\t%.4g\t%.4g\t%.4g\n", columns))
+    sys.stdout.flush()
+
+
+def evaluate_runs(measurements, run_ids, writer_class, writer_params, output_dir=None, summary=False,
+                  summary_only=False, comparison=None, pool=None, workers=1, bootstrap=None):
+    """
+    Writes the measurements of the runs (see write_measurements), unless the runs are compared, in which case
+    the measurements are collected, and only saved if there is an output_dir, and the comparison is written
+    (see write_comparison).
+    :param comparison: the parameters of the comparison (see write_comparison), or None if the runs are not compared
+    :return: the summaries of the measurements of the runs
+    """
+    if comparison is None:
+        return write_measurements(measurements, run_ids, writer_class, writer_params, output_dir, summary,
+                                  summary_only, bootstrap)
+
+    collected = [([], []) for _ in run_ids]
+    measurements = collect_measurements(measurements, collected)
+    if output_dir is None:
+        summaries = [MeasurementSummary() for _ in run_ids]
+        for run_index, (topic_ids, scores, residual_scores) in measurements:
+            summaries[run_index].update(scores, residual_scores)
+    else:
+        summaries = write_measurements(measurements, run_ids, writer_class, writer_params, output_dir, summary,
+                                       summary_only, bootstrap)
+    write_comparison(collected, run_ids, writer_params["metric_names"], col_names=writer_params["col_names"],
+                     pool=pool, workers=workers, **comparison)
+    return summaries
+
+
+def log_summary(logger, run_id, metric_names, summary):
+    """
+    Logs the aggregates of each measurement of each metric over the topics of a run (see ruler.measurement_summary).
+    """
+    if summary.count == 0:
+        return
+    variance = summary.variance()
+    for i, metric_name in enumerate(metric_names):
+        for j, measurement_name in enumerate(MEASUREMENT_NAMES):
+            logger.info("{0} {1} {2} count={3} mean={4} var={5} min={6} max={7}".format(
+                run_id, metric_name, measurement_name, summary.count, summary.mean[i, j], variance[i, j],
+                summary.min[i, j], summary.max[i, j]))
+
+
 def main(results_file, gain_file, cost_file=None, metrics_file=None, bib_file=None, col_names=False,
-         residuals=False, max_gain=1.0, min_gain=0.0, max_cost=1.0, min_cost=1.0, max_n=1000):
+         residuals=False, max_gain=1.0, min_gain=0.0, max_cost=1.0, min_cost=1.0, max_n=1000, batch_size=1000,
+         epsilon=0.0, workers=1, output_dir=None, output_format="tsv", summary=False, summary_only=False,
+         compare=False, all_pairs=False, correction="holm", permutations=10000, measure="EU", seed=0, bootstrap=0,
+         confidence=0.95, cache_dir=None, cache_size=1024.0, previous_qrels=None, qrels_delta=None):
   
+    results_files = expand_result_files(results_file)
     logger = logging.getLogger('cwl')
     logger.setLevel(logging.DEBUG)
     logger.addHandler(logging.FileHandler('cwl.log'))
-    logger.info("Processing: {} using gain: {} and costs: {}".format(results_file, gain_file, cost_file))
+    logger.info("Processing: {} using gain: {} and costs: {}".format(
+        " ".join(results_files), gain_file, cost_file))
     logger.info("max_gain={} min_gain={} max_cost={}  min_cost={} max_n={}".format(max_gain, min_gain, max_cost, min_cost, max_n))
     if residuals:
         logger.info("Residuals are being computed assuming max gain is: {}".format(max_gain))
-    qrh = TrecQrelHandler(gain_file)
+    if epsilon > 0.0:
+        logger.info("Scoring stops where the probability of examining an item is at most epsilon={}".format(epsilon))
+    qrh = read_in_gain_file(gain_file)
+    affected = None
+    if previous_qrels:
+        # (only the judgements of a previous qrel file are read, as they are just compared)
+        if is_qrel_index(previous_qrels):
+            previous = read_in_gain_file(previous_qrels)
+        else:
+            previous = read_judgements(previous_qrels)
+        affected = changed_topics(previous, qrh)
+    elif qrels_delta:
+        affected = apply_qrel_delta(qrh, qrels_delta)
+    if affected is not None:
+        if output_dir is None:
+            raise ValueError("The measurements of the runs saved in an output_dir are needed to re-evaluate them")
+        logger.info("The qrels of {0} topics have changed".format(len(affected)))
     qrh.validate_gains(min_gain=min_gain, max_gain=max_gain)
     costs = None
     # read in cost file - if cost file exists
     if cost_file:
         costs = read_in_cost_file(cost_file)
-    cwl_ruler = CWLRuler(metrics_file, residuals)
-
-    curr_topic_id = None
-    ranking_maker = None
+    cwl_ruler = CWLRuler(metrics_file, residuals, epsilon)
+    ranking_params = dict(max_gain=max_gain, max_cost=max_cost, min_cost=min_cost, max_n=max_n)
 
-    if col_names:
-        if residuals:
-            print("Topic\tMetric\tEU\tETU\tEC\tETC\tED\tResEU\tResETU\tResEC\tResETC\tResED")
+    writer_params = dict(metric_names=cwl_ruler.metric_names(), residuals=residuals, col_names=col_names)
+    # Perform the measurements once a full batch of topics has been read.
+    # The qrels, costs and metrics are shared by all of the runs, which are read one after the other.
+    tasks = ((run_index, batch) for run_index, rf in enumerate(results_files)
+             for batch in read_in_batches(rf, batch_size))
+    cache = None
+    if affected is not None:
+        # only the topics whose qrels have changed are measured, and merged with the measurements saved before
+        pending = collections.deque()
+        n_columns = len(MEASUREMENT_NAMES) * (2 if residuals else 1)
+        tasks = stored_tasks(output_dir, RESULT_WRITERS[output_format], results_files, batch_size,
+                             cwl_ruler.metric_names(), n_columns, affected, pending)
+        if cache_dir:
+            logger.info("The cache is not used, as the measurements saved in the output_dir are updated")
+    elif cache_dir:
+        base_key = cache_key(gain_file, cost_file, cwl_ruler, epsilon, ranking_params)
+        if base_key is None:
+            logger.info("The cache is not used, as the gain or cost file is read from stdin")
         else:
-            print("Topic\tMetric\tEU\tETU\tEC\tETC\tED")
-
-    with open(results_file, "r") as rf:
-        while rf:
-            line = rf.readline()
-            if not line:
-                break
-            (topic_id, element_type, doc_id, rank, score, run_id) = line.split()
-            doc_id = doc_id.strip()
-
-            if topic_id == curr_topic_id:
-                # build vectors
-                ranking_maker.add(doc_id, element_type)
-            else:
-                if curr_topic_id is not None:
-                    # Perform the measurements
-                    ranking = ranking_maker.get_ranking()
-                    # print(ranking._gains[0:10])
-                    cwl_ruler.measure(ranking)
-                    cwl_ruler.report()
-
-                # new topic
-                curr_topic_id = topic_id
-
-                # reset seen list
-                ranking_maker = RankingMaker(curr_topic_id, qrh, costs,
-                                             max_gain=max_gain, max_cost=max_cost, min_cost=min_cost, max_n=max_n)
-                ranking_maker.add(doc_id, element_type)
-
-        # Perform the Measurements on the last topic
-        ranking = ranking_maker.get_ranking()
-        # print(ranking._gains[0:10])
-        cwl_ruler.measure(ranking)
-        cwl_ruler.report()
+            cache = ResultCache(cache_dir, int(cache_size * (1 << 20)))
+            # only the topics that are not cached are measured
+            pending = collections.deque()
+            tasks = cached_tasks(cache, base_key, results_files, batch_size, len(cwl_ruler.metrics), pending)
+    run_ids = [get_run_id(rf) for rf in results_files]
+    comparison = None
+    if compare:
+        if len(run_ids) < 2:
+            raise ValueError("Two or more result files are needed to compare them")
+        comparison = dict(measure=measure, all_pairs=all_pairs, correction=correction, permutations=permutations,
+                          seed=seed)
+    bootstrap_params = None
+    if bootstrap > 0:
+        bootstrap_params = dict(n_resamples=bootstrap, confidence=confidence, seed=seed)
+    writer_class = RESULT_WRITERS[output_format]
+    if workers > 1:
+        # the batches (of all the runs) are measured in parallel, and reported in the same order as they were read
+        sys.stdout.flush()
+        with get_worker_pool(workers, (cwl_ruler, qrh, costs, ranking_params)) as pool:
+            measurements = pool.imap(measure_topics_in_worker, tasks)
+            if cache is not None or affected is not None:
+                measurements = merge_cached(cache, measurements, pending, len(cwl_ruler.metrics), residuals)
+            summaries = evaluate_runs(measurements, run_ids, writer_class, writer_params, output_dir, summary,
+                                      summary_only, comparison, pool, workers, bootstrap_params)
+    else:
+        measurements = ((run_index, measure_topics(cwl_ruler, qrh, costs, batch, **ranking_params))
+                        for run_index, batch in tasks)
+        if cache is not None or affected is not None:
+            measurements = merge_cached(cache, measurements, pending, len(cwl_ruler.metrics), residuals)
+        summaries = evaluate_runs(measurements, run_ids, writer_class, writer_params, output_dir, summary,
+                                  summary_only, comparison, bootstrap=bootstrap_params)
+    if cache is not None:
+        logger.info("Cache: {0} topics were cached, and {1} were measured".format(cache.hits, cache.misses))
+        cache.close()
+    for run_id, summary in zip(run_ids, summaries):
+        log_summary(logger, run_id, cwl_ruler.metric_names(), summary)
 
     if bib_file:
         cwl_ruler.save_bibtex(bib_file)
 
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["serve"]:
+        from cwl import cwl_server
+        cwl_server.main(sys.argv[2:])
+        sys.exit(0)
+
     args = parse_args()
 
-    check_file_exists(args.result_file)
+    for result_file in args.result_file:
+        check_file_exists(result_file)
     check_file_exists(args.gain_file)
     check_file_exists(args.cost_file)
     check_file_exists(args.metrics_file)
+    check_file_exists(args.previous_qrels)
+    check_file_exists(args.qrels_delta)
 
     main(args.result_file, args.gain_file, args.cost_file, args.metrics_file, args.bib_file,
-         args.colnames, args.residuals, args.max_gain, args.min_gain, args.max_cost, args.min_cost, args.max_depth)
+         args.colnames, args.residuals, args.max_gain, args.min_gain, args.max_cost, args.min_cost, args.max_depth,
+         args.batch_size, args.epsilon, args.workers, args.output_dir, args.output_format, args.summary, args.summary_only,
+         args.compare, args.all_pairs, args.correction, args.permutations, args.measure, args.seed,
+         args.bootstrap, args.confidence, args.cache_dir, args.cache_size, args.previous_qrels, args.qrels_delta)
@@ -0,0 +1,189 @@
+"""
+Evaluation of rankings held in memory (e.g. in learning to rank or tuning loops), without reading or writing files
+"""
+
+import numpy as np
+from cwl.seeker.trec_qrel_handler import TrecQrelHandler
+from cwl.ruler.cwl_ruler import CWLRuler
+from cwl.ruler.ranking import RankingMaker, Ranking, RankingBatch
+from cwl.ruler.result_writer import MEASUREMENT_NAMES, RESIDUAL_NAMES
+from cwl.ruler.measurement_summary import MeasurementSummary
+
+
+def measurement_records(topic_ids, metric_names, scores, residual_scores=None):
+    """
+    Makes a structured array with a row per topic and metric (in the order of the rows of cwl-eval),
+    with the fields topic, metric, EU, ETU, EC, ETC and ED (and ResEU, ..., ResED if there are residuals).
+    :param topic_ids: the list of the topic ids
+    :param metric_names: the list of the names of the metrics
+    :param scores: a (topics x metrics x 5) array of the measurements
+    :param residual_scores: a (topics x metrics x 5) array of the residuals (or None)
+    :return: numpy structured array
+    """
+    names = MEASUREMENT_NAMES + (RESIDUAL_NAMES if residual_scores is not None else [])
+    topic_ids = np.array(topic_ids, dtype=str).reshape(-1)
+    metric_names = np.array(metric_names, dtype=str).reshape(-1)
+    dtype = [("topic", topic_ids.dtype), ("metric", metric_names.dtype)] + [(name, float) for name in names]
+    records = np.zeros(len(topic_ids) * len(metric_names), dtype=dtype)
+    records["topic"] = np.repeat(topic_ids, len(metric_names))
+    records["metric"] = np.tile(metric_names, len(topic_ids))
+    values = np.asarray(scores, dtype=float)
+    if residual_scores is not None:
+        values = np.concatenate((values, np.asarray(residual_scores, dtype=float)), axis=-1)
+    values = values.reshape(len(records), len(names))
+    for j, name in enumerate(names):
+        records[name] = values[:, j]
+    return records
+
+
+class CWLEvaluator(object):
+
+    def __init__(self, qrels=None, metrics=None, metrics_file=None, costs=None, residuals=False, epsilon=0.0,
+                 max_gain=1.0, min_gain=0.0, max_cost=1.0, min_cost=1.0, max_n=1000, batch_size=1000):
+        """
+        Measures rankings held in memory, as cwl_eval.main measures those of a result file, but returns the
+        measurements rather than printing them. The qrels (and their index of doc ids), the costs and the metrics
+        are set up once, and are reused by every call of evaluate (or measure), along with the C/W/L vectors
+        cached by the metrics.
+        :param qrels: the gains of the judged docs of each topic, as a dict, e.g. {topic: {doc: gain}},
+        a TrecQrelHandler or a TrecQrelIndex, or None if the rankings are given as gains
+        :param metrics: the list of the metrics (instances of the classes of ruler.measures)
+        :param metrics_file: the file of the metrics (see CWLRuler.populate_list), if metrics is not given
+        (if neither is given, the default metrics of cwl-eval are measured)
+        :param costs: the cost of each element type, as a dict, e.g. {element_type: cost}
+        :param residuals: whether the residuals are computed
+        :param epsilon: the examination probability at which the scoring of a ranking stops
+        :param max_n: the depth to which the rankings are measured
+        :param batch_size: the number of topics that are measured together in one batch
+        """
+        if isinstance(qrels, dict):
+            handler = TrecQrelHandler()
+            handler.read_dict(qrels)
+            qrels = handler
+        if qrels is not None:
+            qrels.validate_gains(min_gain=min_gain, max_gain=max_gain)
+        self.qrels = qrels
+        self.topics = set(qrels.get_topic_list()) if qrels is not None else set()
+        self.costs = costs
+        self.residuals = residuals
+        self.ruler = CWLRuler(metrics_file, residuals, epsilon, metrics=metrics)
+        self.ranking_params = dict(max_gain=max_gain, min_gain=min_gain, max_cost=max_cost, min_cost=min_cost,
+                                   max_n=max_n)
+        self.batch_size = batch_size
+        # the aggregates of the measurements of the topics of the last call (see ruler.measurement_summary)
+        self.summary = MeasurementSummary()
+
+    def metric_names(self):
+        return self.ruler.metric_names()
+
+    def make_ranking(self, topic_id, ranking):
+        """
+        Makes the ranking of a topic from:
+            a list (or array) of the doc ids in rank order, whose gains are those of the qrels;
+            a pair of the lists of the doc ids and of their element types, whose costs are those of the costs;
+            a list (or array) of numbers (floats, ints or bools), of the gains of the items in rank order
+            (NaN, or None, for unjudged items);
+            or a pair of the arrays of the gains and of the costs (NaN for unknown costs).
+        As any list of numbers is taken to be gains, a ranking of doc ids that are numbers has to be given
+        explicitly, as a dict of the doc ids (and their element types), e.g. {"doc_ids": [1, 2]}.
+        The gains (and costs) can be given explicitly in the same way, e.g. {"gains": [1, 0], "costs": [1.0, 2.0]}.
+        The total gain and relevant items of a topic are those of the qrels, if the topic is in them,
+        otherwise those of the gains of the ranking.
+        :return: ruler.ranking.Ranking
+        """
+        topic_id = str(topic_id)
+        if isinstance(ranking, dict):
+            if "doc_ids" in ranking:
+                # (doc ids that are numbers are looked up as the strings of the qrels)
+                doc_ids = [str(doc_id) for doc_id in ranking["doc_ids"]]
+                return self._ranking_of_docs(topic_id, doc_ids, ranking.get("element_types"))
+            if "gains" in ranking:
+                return self._ranking_of_gains(topic_id, ranking["gains"], ranking.get("costs"))
+            raise ValueError("The ranking of topic {0} should have either doc_ids or gains".format(topic_id))
+        element_types = None
+        if isinstance(ranking, tuple) and len(ranking) == 2 and not isinstance(ranking[0], str):
+            (ranking, element_types) = ranking
+        if isinstance(ranking, np.ndarray):
+            is_gains = ranking.dtype.kind in "biuf"
+        else:
+            # (a list is only converted to an array if it is of gains, as doc ids are looked up as they are)
+            first = ranking[0] if len(ranking) > 0 else None
+            is_gains = first is None or isinstance(first, (int, float, np.number, np.bool_))
+        if is_gains:
+            return self._ranking_of_gains(topic_id, ranking, element_types)
+        return self._ranking_of_docs(topic_id, ranking, element_types)
+
+    def _ranking_of_docs(self, topic_id, doc_ids, element_types=None):
+        if self.qrels is None:
+            raise ValueError("The ranking of topic {0} is of doc ids, but there are no qrels".format(topic_id))
+        if element_types is None:
+            element_types = [None] * len(doc_ids)
+        ranking_maker = RankingMaker(topic_id, self.qrels, self.costs, **self.ranking_params)
+        ranking_maker.add_all(doc_ids, element_types)
+        return ranking_maker.get_ranking()
+
+    def _ranking_of_gains(self, topic_id, gains, costs=None):
+        gains = np.asarray(gains, dtype=float)[0:self.ranking_params["max_n"]]
+        if costs is None:
+            costs = np.full(len(gains), np.nan)
+        else:
+            costs = np.asarray(costs, dtype=float)[0:len(gains)]
+        if costs.shape != gains.shape or gains.ndim != 1:
+            raise ValueError("The gains and costs of topic {0} are not vectors of the same length".format(topic_id))
+        ranking = Ranking(topic_id, gains, costs, **self.ranking_params)
+        if topic_id in self.topics:
+            ranking.total_qrel_gain = self.qrels.get_total_gains(topic_id)
+            ranking.total_qrel_rels = self.qrels.get_total_rels(topic_id)
+        return ranking
+
+    def make_rankings(self, rankings, topic_ids=None):
+        """
+        :param rankings: the ranking of each topic (see make_ranking), as a dict, e.g. {topic: [doc, ...]},
+        or a (topics x ranks) array of the gains of the items of each topic
+        :param topic_ids: the topic ids of the rows of an array of gains (by default, the number of the row)
+        :return: the list of the rankings (ruler.ranking.Ranking)
+        """
+        if isinstance(rankings, dict):
+            return [self.make_ranking(topic_id, ranking) for topic_id, ranking in rankings.items()]
+        rankings = np.asarray(rankings, dtype=float)
+        if rankings.ndim != 2:
+            raise ValueError("The gains of the rankings should be a (topics x ranks) array")
+        if topic_ids is None:
+            topic_ids = range(len(rankings))
+        if len(topic_ids) != len(rankings):
+            raise ValueError("There are {0} topic ids for {1} rankings".format(len(topic_ids), len(rankings)))
+        return [self.make_ranking(topic_id, gains) for topic_id, gains in zip(topic_ids, rankings)]
+
+    def measure(self, rankings, topic_ids=None):
+        """
+        Measures the rankings with each metric, batch_size topics at a time, and aggregates the measurements
+        in self.summary (see ruler.measurement_summary).
+        :param rankings: the ranking of each topic (see make_rankings)
+        :param topic_ids: the topic ids of the rows of an array of gains
+        :return: the topic ids, and the (topics x metrics x 5) arrays of the measurements and of the residuals
+        (or None, if the residuals are not computed), as CWLRuler.measurements
+        """
+        rankings = self.make_rankings(rankings, topic_ids)
+        self.summary = MeasurementSummary()
+        shape = (0, len(self.ruler.metrics), len(MEASUREMENT_NAMES))
+        (all_topic_ids, scores, residual_scores) = ([], [np.zeros(shape)], [np.zeros(shape)])
+        for start in range(0, len(rankings), self.batch_size):
+            self.ruler.measure_batch(RankingBatch(rankings[start:start + self.batch_size]))
+            (batch_topic_ids, batch_scores, batch_residual_scores) = self.ruler.measurements()
+            self.summary.update(batch_scores, batch_residual_scores)
+            all_topic_ids.extend(batch_topic_ids)
+            scores.append(batch_scores)
+            residual_scores.append(batch_residual_scores)
+        residual_scores = np.concatenate(residual_scores) if self.residuals else None
+        return all_topic_ids, np.concatenate(scores), residual_scores
+
+    def evaluate(self, rankings, topic_ids=None):
+        """
+        Measures the rankings with each metric (see measure).
+        :param rankings: the ranking of each topic, as a dict, e.g. {topic: [doc, ...]}, or a (topics x ranks)
+        array of the gains of the items of each topic (see make_ranking for the forms of a ranking)
+        :param topic_ids: the topic ids of the rows of an array of gains
+        :return: a structured array with a row per topic and metric (see measurement_records)
+        """
+        (topic_ids, scores, residual_scores) = self.measure(rankings, topic_ids)
+        return measurement_records(topic_ids, self.metric_names(), scores, residual_scores)
@@ -0,0 +1,388 @@
+"""
+cwl-eval serve: a local evaluation server, which keeps qrels and metrics in memory between evaluations
+"""
+
+import argparse
+import collections
+import io
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+import time
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from cwl.cwl_eval import read_in_gain_file, read_in_cost_file, get_worker_pool
+from cwl.cwl_evaluator import CWLEvaluator
+from cwl.ruler.result_writer import RESULT_WRITERS
+from cwl.seeker.trec_result_sorter import TrecResultSorter
+
+# the name of the metric set of the default metrics of cwl-eval
+DEFAULT_METRICS = "default"
+# the number of the latest requests whose latencies are kept for the percentiles
+LATENCY_WINDOW = 1000
+CONTENT_TYPES = {"tsv": "text/tab-separated-values", "csv": "text/csv", "jsonl": "application/x-ndjson",
+                 "npz": "application/octet-stream"}
+
+logger = logging.getLogger('cwl')
+
+
+def named_file(text):
+    """
+    Splits NAME=FILE into its name and file, where the name defaults to the file name (without its extension).
+    """
+    (name, sep, filename) = text.partition("=")
+    if not sep:
+        filename = text
+        name = os.path.splitext(os.path.basename(text))[0]
+    if not name or not filename:
+        raise argparse.ArgumentTypeError("{0} is not [NAME=]FILE".format(text))
+    return name, filename
+
+
+def is_set(query, key):
+    """
+    Whether the flag is set in the query of a request, e.g. residuals=1 (or true, or yes).
+    """
+    return query.get(key, "0").lower() in ("1", "true", "yes")
+
+
+class ServerStats(object):
+
+    def __init__(self, window=LATENCY_WINDOW):
+        """
+        Counts the requests, errors and topics evaluated by the server, and keeps the latencies of the latest
+        (window) evaluations, from which the latency percentiles are taken. The counts may be updated by
+        many threads at once.
+        """
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.topics = 0
+        self.in_flight = 0
+        self.latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, latency, topics=0, error=False):
+        """
+        :param latency: the time (in seconds) from receiving the request to having the response
+        :param topics: the number of topics that were evaluated
+        :param error: whether the request failed
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self.errors += 1 if error else 0
+            self.topics += topics
+            self.latencies.append(latency)
+
+    def snapshot(self):
+        """
+        :return: a dict of the counters, the throughput (requests and topics per second) since the server started,
+        and the mean and percentiles of the latencies (in milliseconds) of the latest requests
+        """
+        with self._lock:
+            uptime = time.time() - self.started
+            latencies = np.array(self.latencies) * 1000.0
+            stats = dict(uptime=uptime, requests=self.requests, errors=self.errors, topics=self.topics,
+                         in_flight=self.in_flight, requests_per_second=self.requests / uptime if uptime else 0.0,
+                         topics_per_second=self.topics / uptime if uptime else 0.0)
+        if len(latencies):
+            (p50, p95, p99) = np.percentile(latencies, [50, 95, 99])
+            stats.update(latency_mean_ms=float(np.mean(latencies)), latency_p50_ms=float(p50),
+                         latency_p95_ms=float(p95), latency_p99_ms=float(p99),
+                         latency_max_ms=float(np.max(latencies)))
+        return stats
+
+
+class EvaluationService(object):
+
+    def __init__(self, qrels_files, metrics_files=None, cost_file=None, max_gain=1.0, min_gain=0.0, max_cost=1.0,
+                 min_cost=1.0, max_n=1000, batch_size=1000, epsilon=0.0):
+        """
+        Holds the qrels sets and metric sets of the server in memory, along with an evaluator (see
+        cwl_evaluator.CWLEvaluator) for each pair of them (and whether the residuals are computed), which are
+        made once and reused by every request. The evaluators without residuals are made up front,
+        so that the metrics are found and built before the server starts (or its workers are forked).
+        :param qrels_files: a list of the names and files of the qrels sets (which may be qrel indexes)
+        :param metrics_files: a list of the names and files of the metric sets (along with which the default metrics
+        of cwl-eval are available as "default")
+        :param cost_file: the costs of the element types (or None)
+        """
+        self.qrels = collections.OrderedDict()
+        for name, qrels_file in qrels_files:
+            self.qrels[name] = read_in_gain_file(qrels_file)
+        self.metrics_files = collections.OrderedDict([(DEFAULT_METRICS, None)])
+        self.metrics_files.update(metrics_files or [])
+        self.costs = read_in_cost_file(cost_file) if cost_file else None
+        self.params = dict(max_gain=max_gain, min_gain=min_gain, max_cost=max_cost, min_cost=min_cost, max_n=max_n,
+                           batch_size=batch_size, epsilon=epsilon)
+        self.evaluators = {}
+        for qrels_name in self.qrels:
+            for metrics_name in self.metrics_files:
+                self.evaluator(qrels_name, metrics_name, False)
+
+    def sets(self):
+        return dict(qrels=list(self.qrels), metrics=list(self.metrics_files))
+
+    def evaluator(self, qrels_name=None, metrics_name=None, residuals=False):
+        """
+        :param qrels_name: the name of the qrels set (which can be left out if there is only one)
+        :param metrics_name: the name of the metric set (the default metrics if None)
+        :return: the evaluator of the qrels and metrics (cwl_evaluator.CWLEvaluator)
+        """
+        if qrels_name is None and len(self.qrels) == 1:
+            qrels_name = next(iter(self.qrels))
+        metrics_name = DEFAULT_METRICS if metrics_name is None else metrics_name
+        if qrels_name not in self.qrels:
+            raise KeyError("Unknown qrels set {0} (the sets are {1})".format(qrels_name, ", ".join(self.qrels)))
+        if metrics_name not in self.metrics_files:
+            raise KeyError("Unknown metric set {0} (the sets are {1})".format(
+                metrics_name, ", ".join(self.metrics_files)))
+        key = (qrels_name, metrics_name, residuals)
+        if key not in self.evaluators:
+            self.evaluators[key] = CWLEvaluator(self.qrels[qrels_name], metrics_file=self.metrics_files[metrics_name],
+                                                costs=self.costs, residuals=residuals, **self.params)
+        return self.evaluators[key]
+
+    def evaluate(self, payload, json_payload=False, qrels_name=None, metrics_name=None, residuals=False,
+                 output_format="tsv", col_names=False, summary=False, summary_only=False):
+        """
+        Evaluates a run sent to the server.
+        :param payload: the run, as the lines of a TREC formatted results file, or (if json_payload) as a JSON
+        object of the ranking of each topic (see cwl_evaluator.CWLEvaluator.make_ranking), e.g. {topic: [doc, ...]}
+        :return: the measurements of the topics and, if summary or summary_only, their means (the "all" rows),
+        in the output format (as cwl-eval writes them), and the number of topics
+        """
+        evaluator = self.evaluator(qrels_name, metrics_name, residuals)
+        if json_payload:
+            rankings = json.loads(payload.decode("utf-8"))
+            if not isinstance(rankings, dict):
+                raise ValueError("The JSON payload should be an object of the ranking of each topic")
+            # (a pair of lists is of the doc ids and element types, or of the gains and costs,
+            # while a ranking given as an object, e.g. {"doc_ids": [...]}, is passed on as it is)
+            rankings = dict((topic_id, tuple(ranking) if isinstance(ranking, list) and len(ranking) == 2
+                             and isinstance(ranking[0], list) else ranking) for topic_id, ranking in rankings.items())
+        else:
+            rankings = dict((topic_id, (doc_ids, element_types)) for topic_id, doc_ids, element_types
+                            in TrecResultSorter().topics_in_memory(payload, "the run"))
+        (topic_ids, scores, residual_scores) = evaluator.measure(rankings)
+
+        writer_class = RESULT_WRITERS[output_format]
+        out = io.BytesIO() if writer_class.binary else io.StringIO()
+        writer = writer_class(out, evaluator.metric_names(), residuals, col_names)
+        writer.write_header()
+        if not summary_only:
+            writer.write_batch(topic_ids, scores, residual_scores)
+        if summary or summary_only:
+            writer.write_summary(evaluator.summary)
+        writer.close()
+        output = out.getvalue()
+        return (output if writer_class.binary else output.encode("utf-8")), len(topic_ids)
+
+
+# The service of each worker process, which is forked with the qrels and metrics already in memory.
+_worker_service = {}
+
+
+def init_worker(service):
+    _worker_service["service"] = service
+
+
+def evaluate_in_worker(task):
+    (payload, options) = task
+    try:
+        return True, _worker_service["service"].evaluate(payload, **options)
+    except (KeyError, ValueError) as e:
+        # (the error is sent back as a message, as not every exception can be pickled)
+        return False, (type(e).__name__, str(e.args[0]) if e.args else str(e))
+
+
+class EvaluationRequestHandler(BaseHTTPRequestHandler):
+    """
+    The requests of the server:
+        POST /evaluate?qrels=NAME&metrics=NAME&residuals=1&format=tsv&colnames=1&summary=1&summary_only=1
+            with a TREC run (or, with Content-Type: application/json, a JSON object of the rankings)
+            as the body, responds with the measurements (all the parameters are optional)
+        GET /stats responds with the counters of the server (see ServerStats), as JSON
+        GET /sets responds with the names of the qrels sets and metric sets, as JSON
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/stats":
+            self._respond(200, json.dumps(self.server.stats.snapshot()).encode("utf-8"), "application/json")
+        elif path == "/sets":
+            self._respond(200, json.dumps(self.server.service.sets()).encode("utf-8"), "application/json")
+        else:
+            self._respond(404, b"Not found\n")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/evaluate":
+            self._respond(404, b"Not found\n")
+            return
+        started = time.time()
+        self.server.stats.start()
+        (status, body, content_type, topics) = (200, b"", "text/plain", 0)
+        try:
+            query = dict((key, values[-1]) for key, values in parse_qs(url.query).items())
+            output_format = query.get("format", "tsv")
+            if output_format not in RESULT_WRITERS:
+                raise ValueError("Unknown format {0}".format(output_format))
+            options = dict(json_payload=self.headers.get("Content-Type", "").startswith("application/json"),
+                           qrels_name=query.get("qrels"), metrics_name=query.get("metrics"),
+                           residuals=is_set(query, "residuals"), output_format=output_format,
+                           col_names=is_set(query, "colnames"), summary=is_set(query, "summary"),
+                           summary_only=is_set(query, "summary_only"))
+            payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            (ok, result) = self.server.evaluate(payload, options)
+            if ok:
+                (body, topics) = result
+                content_type = CONTENT_TYPES[output_format]
+            else:
+                (status, body) = (404 if result[0] == "KeyError" else 400, (result[1] + "\n").encode("utf-8"))
+        except ValueError as e:
+            (status, body) = (400, (str(e) + "\n").encode("utf-8"))
+        except Exception as e:
+            logger.exception("Evaluation failed")
+            (status, body) = (500, (str(e) + "\n").encode("utf-8"))
+        self.server.stats.finish(time.time() - started, topics, status != 200)
+        self._respond(status, body, content_type)
+
+    def _respond(self, status, body, content_type="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # (the client address of a Unix socket is empty)
+        logger.debug("%s %s", self.client_address or "unix", format % args)
+
+
+class EvaluationServerMixIn(object):
+    """
+    Evaluates the requests (each of which is handled by a thread of its own) in a pool of worker processes,
+    or, without a pool, one at a time in the server process (as the evaluators are not thread safe).
+    """
+    daemon_threads = True
+
+    def setup_service(self, service, pool=None):
+        self.service = service
+        self.pool = pool
+        self.stats = ServerStats()
+        self._lock = threading.Lock()
+
+    def evaluate(self, payload, options):
+        """
+        :return: True and the result of EvaluationService.evaluate, or False and the type and message of the error
+        """
+        if self.pool is not None:
+            return self.pool.apply(evaluate_in_worker, ((payload, options),))
+        with self._lock:
+            try:
+                return True, self.service.evaluate(payload, **options)
+            except (KeyError, ValueError) as e:
+                return False, (type(e).__name__, str(e.args[0]) if e.args else str(e))
+
+
+class EvaluationHTTPServer(EvaluationServerMixIn, ThreadingHTTPServer):
+    pass
+
+
+class EvaluationUnixServer(EvaluationServerMixIn, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    pass
+
+
+def make_server(service, port=8642, socket_path=None, pool=None):
+    """
+    Makes the server, which listens on localhost:port (port 0 picks a free port), or on a Unix socket.
+    :param service: the EvaluationService
+    :param socket_path: the path of the Unix socket (rather than the port), which is replaced if it exists
+    :param pool: the pool of worker processes (see get_worker_pool), or None
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = EvaluationUnixServer(socket_path, EvaluationRequestHandler)
+    else:
+        server = EvaluationHTTPServer(("127.0.0.1", port), EvaluationRequestHandler)
+    server.setup_service(service, pool)
+    return server
+
+
+def parse_args(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="cwl-eval serve",
+                                         description="Serves CWL evaluations of runs sent over HTTP, on localhost "
+                                                     "or a Unix socket, keeping the qrels and metrics in memory.")
+    arg_parser.add_argument("-q", "--qrels", help="A qrels set, as NAME=FILE (or FILE, named after the file), "
+                                                  "where the file is a TREC formatted qrel file, or a qrel index. "
+                                                  "Can be given more than once.",
+                            required=True, action="append", type=named_file)
+    arg_parser.add_argument("-m", "--metrics", help="A metric set, as NAME=FILE (or FILE, named after the file), "
+                                                    "where the file is a metrics file. Can be given more than once. "
+                                                    "The default metrics are always available as 'default'.",
+                            required=False, action="append", type=named_file, default=[])
+    arg_parser.add_argument("-c", "--cost_file", help="Costs associated with each element type specified in result file.",
+                            required=False, default=None)
+    arg_parser.add_argument("--port", help="The port to listen on (on localhost). (default=8642)",
+                            required=False, default=8642, type=int)
+    arg_parser.add_argument("--socket", help="The Unix socket to listen on (rather than a port).",
+                            required=False, default=None)
+    arg_parser.add_argument("--workers", help="Number of worker processes that evaluate requests in parallel. "
+                                              "(default=1, in the server process)",
+                            required=False, default=1, type=int)
+    arg_parser.add_argument("--max_gain", required=False, default=1.0, type=float,
+                            help="Maximum gain associated with an item. (default=1.0)")
+    arg_parser.add_argument("--min_gain", required=False, default=0.0, type=float,
+                            help="Minimum gain associated with an item. (default=0.0)")
+    arg_parser.add_argument("--max_cost", required=False, default=1.0, type=float,
+                            help="Maximum cost associated with an item. (default=1.0)")
+    arg_parser.add_argument("--min_cost", required=False, default=1.0, type=float,
+                            help="Minimum cost associated with an item. (default=1.0)")
+    arg_parser.add_argument("--max_depth", required=False, default=1000, type=int,
+                            help="Maximum depth to compute metrics. (default=1000)")
+    arg_parser.add_argument("--batch_size", required=False, default=1000, type=int,
+                            help="Number of topics that are measured together in one batch. (default=1000)")
+    arg_parser.add_argument("--epsilon", required=False, default=0.0, type=float,
+                            help="Stop scoring a ranking where the probability of examining an item falls to "
+                                 "epsilon or below. (default=0.0)")
+    return arg_parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.FileHandler('cwl.log'))
+    service = EvaluationService(args.qrels, args.metrics, args.cost_file, max_gain=args.max_gain,
+                                min_gain=args.min_gain, max_cost=args.max_cost, min_cost=args.min_cost,
+                                max_n=args.max_depth, batch_size=args.batch_size, epsilon=args.epsilon)
+    pool = get_worker_pool(args.workers, (service,), init_worker) if args.workers > 1 else None
+    server = make_server(service, args.port, args.socket, pool)
+    address = args.socket if args.socket else "http://127.0.0.1:{0}".format(server.server_address[1])
+    sys.stderr.write("cwl-eval serve: listening on {0} (qrels: {1}; metrics: {2})\n".format(
+        address, ", ".join(service.qrels), ", ".join(service.metrics_files)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if pool is not None:
+            pool.terminate()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import statistics
+import numpy as np
+
+# the number of resamples that are drawn at once (see resample_counts)
+RESAMPLE_BLOCK = 64
+
+_normal = statistics.NormalDist()
+
+
+def resample_counts(n, n_resamples, seed=0, block_size=RESAMPLE_BLOCK):
+    """
+    Draws the (n_resamples x n) matrix of the indexes of the topics in each resample (with replacement),
+    block_size resamples at a time, and counts how often each topic is drawn in each resample.
+    The same seed gives the same resamples (for the same block size).
+    Over 50k topics, 10000 resamples take about 6s to draw and count on one core.
+    :param n: the number of topics
+    :param n_resamples: the number of resamples
+    :param seed: the seed of the resamples
+    :return: yields (resamples x n) arrays of the number of times each topic is drawn in each resample
+    """
+    # (a Generator draws the indexes about twice as fast as a RandomState)
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_resamples, block_size):
+        indexes = rng.integers(0, n, size=(min(block_size, n_resamples - start), n))
+        counts = np.empty(indexes.shape)
+        # (one bincount per resample, as the counts of one resample stay in the cache while those of a block do not)
+        for i, resample in enumerate(indexes):
+            counts[i] = np.bincount(resample, minlength=n)
+        yield counts
+
+
+def bootstrap_means(values, n_resamples=1000, seed=0):
+    """
+    :param values: a (topics x columns) array
+    :return: the (resamples x columns) array of the means of the columns of each resample of the topics,
+    each block of which is its counts matrix times the values (about 3s for 10000 resamples of 50k x 80 values)
+    """
+    n = len(values)
+    return np.concatenate([np.matmul(counts, values) / n for counts in resample_counts(n, n_resamples, seed)])
+
+
+def _quantiles(sorted_means, q):
+    """
+    The q-th quantile of each column of the sorted bootstrap means (with linear interpolation),
+    where q may differ between the columns.
+    """
+    position = np.clip(q, 0.0, 1.0) * (len(sorted_means) - 1)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, len(sorted_means) - 1)
+    columns = np.arange(sorted_means.shape[1])
+    weight = position - lower
+    return (1.0 - weight) * sorted_means[lower, columns] + weight * sorted_means[upper, columns]
+
+
+def bootstrap_intervals(values, n_resamples=1000, confidence=0.95, seed=0):
+    """
+    The percentile and the bias corrected and accelerated (BCa) bootstrap confidence intervals of the means of the
+    values over the topics (Efron and Tibshirani, An Introduction to the Bootstrap, 1993, ch. 14).
+    The bias correction is the proportion of the resample means that are less than the mean (counting half of those
+    that are equal), and the acceleration is from the jackknife means of the topics.
+    :param values: a (topics x ...) array, e.g. (topics x metrics x measurements)
+    :param n_resamples: the number of resamples of the topics
+    :param confidence: the confidence level of the intervals
+    :param seed: the seed of the resamples
+    :return: a (4 x ...) array of the lower and upper bounds of the percentile interval,
+    and the lower and upper bounds of the BCa interval, of each mean
+    """
+    values = np.asarray(values, dtype=float)
+    shape = values.shape[1:]
+    n = len(values)
+    if n == 0 or n_resamples < 1:
+        return np.full((4,) + shape, np.nan)
+    values = values.reshape(n, -1)
+    means = np.sort(bootstrap_means(values, n_resamples, seed), axis=0)
+    mean = np.mean(values, axis=0)
+    alpha = (1.0 - confidence) / 2.0
+    intervals = np.zeros((4, values.shape[1]))
+    intervals[0] = _quantiles(means, np.full(values.shape[1], alpha))
+    intervals[1] = _quantiles(means, np.full(values.shape[1], 1.0 - alpha))
+
+    proportion = (np.sum(means < mean, axis=0) + 0.5 * np.sum(means == mean, axis=0)) / n_resamples
+    proportion = np.clip(proportion, 0.5 / n_resamples, 1.0 - 0.5 / n_resamples)
+    z0 = np.array([_normal.inv_cdf(p) for p in proportion])
+    jackknife = (np.sum(values, axis=0) - values) / max(n - 1, 1)
+    deviations = np.mean(jackknife, axis=0) - jackknife
+    denominator = 6.0 * np.power(np.sum(np.square(deviations), axis=0), 1.5)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        acceleration = np.where(denominator > 0.0, np.sum(np.power(deviations, 3), axis=0) / denominator, 0.0)
+    for bound, z_alpha in [(2, _normal.inv_cdf(alpha)), (3, _normal.inv_cdf(1.0 - alpha))]:
+        z = z0 + z_alpha
+        q = np.array([_normal.cdf(v) for v in z0 + z / (1.0 - acceleration * z)])
+        intervals[bound] = _quantiles(means, q)
+    # (where every resample has the same mean, so do the intervals)
+    constant = means[0] == means[-1]
+    intervals[:, constant] = means[0, constant]
+    return intervals.reshape((4,) + shape)
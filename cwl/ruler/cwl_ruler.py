@@ -1,99 +1,184 @@
-import os
-import inspect
-import importlib
-
-from cwl.ruler.measures.cwl_metrics import *
-from cwl.ruler.measures.cwl_precision import *
-from cwl.ruler.measures.cwl_rbp import *
-from cwl.ruler.measures.cwl_rr import *
-from cwl.ruler.measures.cwl_ap import *
-from cwl.ruler.measures.cwl_dcg import *
-from cwl.ruler.measures.cwl_inst import *
-from cwl.ruler.measures.cwl_insq import *
-from cwl.ruler.measures.cwl_tbg import *
-from cwl.ruler.measures.cwl_bpm import *
-from cwl.ruler.measures.cwl_umeasure import *
-from cwl.ruler.measures.cwl_ift import *
-from cwl.ruler.measures.cwl_nerr import *
+import sys
+import numpy as np
+
 from cwl.ruler.ranking import Ranking
+from cwl.ruler.result_writer import TsvResultWriter, format_rows
+from cwl.ruler.metric_sweep import MetricSweep, sweep_values
+from cwl.ruler.metric_registry import get_metric_class, metric_classes
+
+# the default set of metrics (in the format of a metrics file)
+# ideally we will tune these to create a set of baselines.
+# however, depending on the costs used... the tuning will be different
+# for instance, U-measure costs are in characters, while TBG costs are in seconds
+# if costs are not specified, then the cost of each item is 1.0
+DEFAULT_METRICS = [
+    "PrecisionCWLMetric(1)",
+    "PrecisionCWLMetric(2)",
+    "PrecisionCWLMetric(3)",
+    "PrecisionCWLMetric(4)",
+    "PrecisionCWLMetric(5)",
+    "PrecisionCWLMetric(10)",
+    "RBPCWLMetric(0.2)",
+    "RBPCWLMetric(0.4)",
+    "RBPCWLMetric(0.8)",
+    "NDCGCWLMetric(5)",
+    "NDCGCWLMetric(10)",
+    "RRCWLMetric()",
+    "APCWLMetric()",
+    "INSTCWLMetric(1.0)",
+    "INSTCWLMetric(2.0)",
+    "INSTCWLMetric(3.0)",
+]
+
+
+def __getattr__(name):
+    """
+    The metric classes used to be imported into this module, so e.g. from cwl.ruler.cwl_ruler import RBPCWLMetric
+    still works, by looking the class up in the registry (which only imports the module of that metric).
+    """
+    if not name.startswith("_"):
+        try:
+            return get_metric_class(name)
+        except NameError:
+            pass
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
 
 class CWLRuler(object):
 
-    def __init__(self, metrics_file=None, residuals=False):
+    def __init__(self, metrics_file=None, residuals=False, epsilon=0.0, metrics=None):
+        """
+        :param metrics_file: the file of the metrics to measure (see populate_list)
+        :param residuals: whether the residuals are computed
+        :param epsilon: the examination probability at which the scoring of a ranking stops
+        :param metrics: the list of the metrics to measure (instances of the classes of ruler.measures),
+        rather than those of a metrics file
+        """
         self.metrics = []
+        # the families of metrics (in self.metrics) that are scored together (see ruler.metric_sweep)
+        self.sweeps = []
+        self.batch = None
+        self.residuals = residuals
         #add the metrics to the list
         if metrics_file:
             # load up the metrics specified
             self.populate_list(metrics_file)
+        elif metrics:
+            self.metrics = list(metrics)
         else:
             # use the default set of metrics
-            # ideally we will tune these to create a set of baselines.
-            # however, depending on the costs used... the tuning will be different
-            # for instance, U-measure costs are in characters, while TBG costs are in seconds
-            # if costs are not specified, then the cost of each item is 1.0
-            self.metrics = [
-                PrecisionCWLMetric(1),
-                PrecisionCWLMetric(2),
-                PrecisionCWLMetric(3),
-                PrecisionCWLMetric(4),
-                PrecisionCWLMetric(5),
-                PrecisionCWLMetric(10),
-                RBPCWLMetric(0.2),
-                RBPCWLMetric(0.4),
-                RBPCWLMetric(0.8),
-                NDCGCWLMetric(5),
-                NDCGCWLMetric(10),
-                RRCWLMetric(),
-                APCWLMetric(),
-                INSTCWLMetric(1.0),
-                INSTCWLMetric(2.0),
-                INSTCWLMetric(3.0),
-            ]
+            for line in DEFAULT_METRICS:
+                self.add_metrics(line)
 
         for m in self.metrics:
             m.residuals = residuals
+            m.epsilon = epsilon
 
     def measure(self, ranking):
         for metric in self.metrics:
             metric.measure(ranking)
 
     def report(self):
+        """
+        Prints the measurements of the previously measured ranking (see ruler.result_writer.TsvResultWriter).
+        """
+        scores = np.array([[metric.get_scores() for metric in self.metrics]], dtype=float)
+        residual_scores = None
+        if self.residuals:
+            residual_scores = np.array([[metric.get_residual_scores() for metric in self.metrics]], dtype=float)
+        writer = TsvResultWriter(sys.stdout, self.metric_names(), self.residuals)
+        writer.write_batch([self.metrics[0].ranking.topic_id], scores, residual_scores)
+        writer.close()
+
+    def metric_names(self):
+        return [metric.name() for metric in self.metrics]
+
+    def measure_batch(self, batch):
+        """
+        Measures every topic in the batch (ruler.ranking.RankingBatch) with each metric
+        (the measurements are aggregated by the caller, see measurements and ruler.measurement_summary).
+        """
+        self.batch = batch
+        swept = set(id(metric) for sweep in self.sweeps for metric in sweep.metrics)
+        for sweep in self.sweeps:
+            sweep.measure_batch(batch)
         for metric in self.metrics:
-            metric.report()
+            if id(metric) not in swept:
+                metric.measure_batch(batch)
+
+    def report_batch(self, out=None):
+        """
+        Reports the measurements of the previously measured batch, topic by topic,
+        in the same order and format as calling measure and report on each ranking in turn.
+        :param out: the file to report to (stdout by default)
+        """
+        writer = TsvResultWriter(sys.stdout if out is None else out, self.metric_names(), self.residuals)
+        writer.write_batch(*self.measurements())
+        writer.close()
+
+    def measurements(self):
+        """
+        :return: the topic ids, and the (topics x metrics x 5) arrays of the measurements and of the residuals
+        (or None, if the residuals are not computed) of the previously measured batch,
+        as taken by the writers of ruler.result_writer
+        """
+        scores = np.stack([metric.batch_scores for metric in self.metrics], axis=1)
+        residual_scores = None
+        if self.residuals:
+            residual_scores = np.stack([metric.batch_residuals for metric in self.metrics], axis=1)
+        return list(self.batch.topic_ids), scores, residual_scores
 
     def csv(self):
-        out = ""
-        for metric in self.metrics:
-            out += (metric.csv() + ";")
-        return out
+        """
+        :return: the name and measurements (to three decimal places) of each metric for the previously
+        measured ranking, separated by commas, with a semicolon after each metric
+        """
+        scores = np.array([metric.get_scores() for metric in self.metrics], dtype=float)
+        return format_rows("%s,%.3f,%.3f,%.3f,%.3f,%.3f;", [self.metric_names()] + list(scores.T))
 
     def populate_list(self, input_filename):
         """
         Reads from the input filename -- should be like
             ClassName(param1, param2, ...)
         Then once each class has been instantiated, adds to the self.metrics list
+        One parameter may be a sweep, start:stop:step e.g. RBPCWLMetric(0.05:0.95:0.05),
+        which adds a metric for each value (see ruler.metric_sweep)
         Thanks @maxwelld90
         """
         f = open(input_filename, 'r')
 
         for line in f:
-            # Process the input line
-            line_split = line.strip().split('(')
-            line_split[-1] = line_split[-1][:-1]  # Removes the extra bracket at the end
-
-            class_name = line_split[0]
-            parameters = line_split[1].split(',')
-            self.metrics.append(self.instantiate_class(class_name, *parameters))
+            self.add_metrics(line)
 
         f.close()
 
+    def add_metrics(self, line):
+        """
+        Adds the metric (or the metrics of a sweep) of a line of a metrics file (see populate_list).
+        """
+        # Process the input line
+        line_split = line.strip().split('(')
+        line_split[-1] = line_split[-1][:-1]  # Removes the extra bracket at the end
+
+        class_name = line_split[0]
+        parameters = line_split[1].split(',')
+        swept = [i for i, parameter in enumerate(parameters) if ':' in parameter]
+        if not swept:
+            self.metrics.append(self.instantiate_class(class_name, *parameters))
+            return
+        if len(swept) > 1:
+            raise ValueError("Only one parameter of {0} can be swept: {1}".format(class_name, line.strip()))
+        position = swept[0]
+        metrics = [self.instantiate_class(class_name, *(parameters[0:position] + [value] + parameters[position + 1:]))
+                   for value in sweep_values(parameters[position])]
+        self.metrics.extend(metrics)
+        self.sweeps.append(MetricSweep(metrics))
+
     def instantiate_class(self, requested_class_name, *args, **kwargs):
         """
         Given a class name and one or more parameters, attempts to instantiate the requested class with the provided parameters.
         If successful, the instantiated class is returned.
         """
-        classes = self.get_class_list()
-        ref = None
         casted_args = []
         
         # Change the args to ints/floats. Assuming that that is all that is required.
@@ -107,51 +192,17 @@ class CWLRuler(object):
                 casted_args.append(float(val))
             else:
                 casted_args.append(int(val))
-        
-        for class_tuple in classes:
-            class_name = class_tuple[0]
-            class_ref = class_tuple[1]
 
-            if class_name == requested_class_name:
-                ref = class_ref(*casted_args)  # Instantiate the class with parameters!
-                # If you want to use parameter names, try kwargs instead.
-
-        # If ref is not set, the class was not located!
-        if ref is None:
-            raise NameError("The class {0} could not be found.".format(requested_class_name))
-
-        return ref
+        # (raises a NameError if the class is not found, see ruler.metric_registry)
+        class_ref = get_metric_class(requested_class_name)
+        return class_ref(*casted_args)  # Instantiate the class with parameters!
 
     def get_class_list(self):
         """
-        Looking inside the measures_package package, returns a list of all the classes that are available for instantiating.
-        This means that any class inside any .py file in the measures directory is returned in the list from this method.
+        Returns a list of the names and classes of all of the metrics that are available for instantiating
+        (see ruler.metric_registry), which imports every module in the measures directory.
         """
-        modules = []
-        classes = []
-        path = os.path.dirname(os.path.abspath(__file__))
-        measures_path = os.path.join(path, 'measures')
-        package_path = 'ruler.measures'
-
-        # List through the modules in the specified package, ignoring __init__.py, and append them to a list.
-        for f in os.listdir(measures_path):
-            if f.endswith('.py') and not f.startswith('__init__'):
-                modules.append('{0}.{1}'.format(package_path, os.path.splitext(f)[0]))
-
-        module_references = []
-
-        # Attempt to import each module in turn so we can access its classes
-        for module in modules:
-            module_references.append(importlib.import_module(module))
-
-        # Now loop through each module, looking at the classes within it -
-        # and then append each class to a list of valid classes.
-        for module in module_references:
-            for name, obj in inspect.getmembers(module):
-                if inspect.isclass(obj):
-                    classes.append((obj.__name__, obj))
-
-        return classes
+        return metric_classes()
 
     def print_list(self):
         """
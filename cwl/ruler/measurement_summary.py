@@ -0,0 +1,73 @@
+import numpy as np
+
+
+class MeasurementSummary(object):
+
+    def __init__(self):
+        """
+        Keeps streaming aggregates of the measurements of each metric over the topics measured so far:
+        the count, mean, variance, minimum and maximum of EU, ETU, EC, ETC and ED, and the means of the residuals.
+        The measurements of each batch of topics are summarised first, and then combined with those before it
+        (with the pairwise update of Chan et al., which, like Welford's update for one value at a time,
+        does not lose precision as the count grows).
+        """
+        self.count = 0
+        self.mean = None
+        self.min = None
+        self.max = None
+        self.residual_mean = None
+        # the sum of the squared differences from the mean
+        self._m2 = None
+
+    def update(self, scores, residual_scores=None):
+        """
+        Adds the measurements of a batch of topics.
+        :param scores: a (topics x metrics x 5) array of EU, ETU, EC, ETC and ED
+        :param residual_scores: a (topics x metrics x 5) array of the residuals (or None)
+        """
+        scores = np.asarray(scores, dtype=float)
+        if len(scores) == 0:
+            return
+        batch = MeasurementSummary()
+        batch.count = len(scores)
+        batch.mean = np.mean(scores, axis=0)
+        batch._m2 = np.sum(np.square(scores - batch.mean), axis=0)
+        batch.min = np.min(scores, axis=0)
+        batch.max = np.max(scores, axis=0)
+        if residual_scores is not None:
+            batch.residual_mean = np.mean(np.asarray(residual_scores, dtype=float), axis=0)
+        self.merge(batch)
+
+    def merge(self, other):
+        """
+        Adds the measurements summarised by another summary (e.g. of the topics measured elsewhere).
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count = other.count
+            self.mean = other.mean.copy()
+            self._m2 = other._m2.copy()
+            self.min = other.min.copy()
+            self.max = other.max.copy()
+            self.residual_mean = None if other.residual_mean is None else other.residual_mean.copy()
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self._m2 = self._m2 + other._m2 + np.square(delta) * (self.count * other.count / count)
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        if self.residual_mean is not None and other.residual_mean is not None:
+            self.residual_mean = self.residual_mean + (other.residual_mean - self.residual_mean) * (other.count / count)
+        else:
+            self.residual_mean = None
+        self.count = count
+
+    def variance(self):
+        """
+        :return: the (sample) variance of each measurement of each metric, or NaN if there are fewer than two topics
+        """
+        if self.count < 2:
+            return np.full(self.mean.shape, np.nan) if self.mean is not None else None
+        return self._m2 / (self.count - 1)
@@ -24,6 +24,9 @@ GrAPCWLMetric (TO BE IMPLEMENTED):
 """
 
 class APCWLMetric(CWLMetric):
+
+    VECTORIZED = True
+
     def __init__(self):
         super().__init__()
         self.metric_name = "AP"
@@ -45,28 +48,15 @@ class APCWLMetric(CWLMetric):
 
     def c_vector(self, ranking, worse_case=True):
         gains = ranking.get_gain_vector(worse_case)
-        rels = 0
-        for g in gains:
-            if g > 0.0:
-                rels += 1
-
-        n = len(gains)
-        rii = []
-        cvec = []
-        for i in range(0, n):
-            rii.append(gains[i]/(i+1))
-
-        for i in range(0, n-1):
-            bot = np.sum(rii[i:n])
-            top = np.sum(rii[i+1:n])
-
-            if top > 0.0:
-                cvec.append(top/bot)
-            else:
-                cvec.append(0.0)
-
-        cvec.append(0.0)
-        cvec = np.array(cvec)
+        n = gains.shape[-1]
+        rii = gains / np.arange(1, n + 1)
+        # suffix sums of rii i.e. the sum of rii from position i to n
+        suffix = np.cumsum(rii[..., ::-1], axis=-1)[..., ::-1]
+        bot = suffix[..., 0:-1]
+        top = suffix[..., 1:]
+
+        cvec = np.zeros(gains.shape)
+        np.divide(top, bot, out=cvec[..., 0:-1], where=(top > 0.0))
         return cvec
 
 
@@ -77,8 +67,11 @@ class TrAPCWLMetric(CWLMetric):
     However, apparently Harman's paper had an error, the demonminator was the number of relevant items retrieved
     and not the total number of relevant items (known). This was later corrected.
     """
+
+    VECTORIZED = True
+
     def __init__(self):
-        super(CWLMetric, self).__init__()
+        super().__init__()
         self.metric_name = "TrAP"
         self.bibtex = """
             @article{Harman:1992:ESIR,
@@ -96,33 +89,20 @@ class TrAPCWLMetric(CWLMetric):
         return self.metric_name
 
     def c_vector(self, ranking, worse_case=True):
-        wvec = self.w_vector(ranking, worse_case)
-
-        cvec = []
-        for i in range(0, len(wvec)-1):
-            if wvec[i] > 0.0:
-                cvec.append(wvec[i+1] / wvec[i])
-            else:
-                cvec.append(0.0)
-
-        cvec.append(0.0)
-        cvec = np.array(cvec)
-
-        return cvec
+        # the C vector is derived from the W vector, which defines this metric
+        return self.c_from_w(self.w_vector(ranking, worse_case))
 
     def w_vector(self, ranking, worse_case=True):
-        wvec = []
-        c_costs = np.cumsum(ranking.get_cost_vector(worse_case))
-        c_gains = np.cumsum(ranking.get_gain_vector(worse_case))
+        c_costs = np.cumsum(ranking.get_cost_vector(worse_case), axis=-1)
+        c_gains = np.cumsum(ranking.get_gain_vector(worse_case), axis=-1)
 
-        i = 0
-        while (c_gains[i] == 0) and (i < len(c_gains)-1):
-            c_gains[i] = 1.0
-            i += 1
+        # until the first gain is found (except at the last item), the cumulative gain is taken to be one
+        leading_zeros = np.logical_and.accumulate(c_gains == 0, axis=-1)
+        leading_zeros[..., -1] = False
+        c_gains[leading_zeros] = 1.0
 
-        total_rels = ranking.get_total_rels(worse_case)
+        total_rels = np.asarray(ranking.get_total_rels(worse_case), dtype=float)[..., np.newaxis]
         wvec = np.divide(c_gains, c_costs)
-        if total_rels > 0:
-            wvec = wvec / total_rels
+        np.divide(wvec, total_rels, out=wvec, where=(total_rels > 0))
 
-        return np.array(wvec)
+        return wvec
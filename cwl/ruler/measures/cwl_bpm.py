@@ -41,6 +41,8 @@ hb and hc are therefore scaling parameters.
 
 class BPMCWLMetric(CWLMetric):
 
+    VECTORIZED = True
+
     def __init__(self, T=1.0, K=10):
         CWLMetric.__init__(self)
         # super(CWLMetric, self).__init__()
@@ -68,32 +70,19 @@ class BPMCWLMetric(CWLMetric):
         gains = ranking.get_gain_vector(worse_case)
         costs = ranking.get_cost_vector(worse_case)
 
-        c_gain = np.cumsum(gains)
-        c_cost = np.cumsum(costs)
+        c_gain = np.cumsum(gains, axis=-1)
+        c_cost = np.cumsum(costs, axis=-1)
 
         # GAIN Constraint
-        rr_cvec = np.zeros(len(gains))
-        i = 0
         # continue until the gain accumulated exceeds T
-        while i < len(gains) and (c_gain[i] < self.T):
-            rr_cvec[i] = 1.0
-            i = i + 1
+        rr_cvec = np.logical_and.accumulate(c_gain < self.T, axis=-1)
 
         # COST Constraint
-        p_cvec = np.zeros(len(costs))
-        i = 0
         # continue until the costs accumulated exceeds K
-        while i < len(costs) and (c_cost[i] < self.K):
-            p_cvec[i] = 1.0
-            i = i + 1
+        p_cvec = np.logical_and.accumulate(c_cost < self.K, axis=-1)
 
         # combine the two continuation vectors
-        bpm_cvec = np.zeros(len(costs))
-        i = 0
-        while i < len(costs):
-            if (rr_cvec[i] == 1.0) and (p_cvec[i] == 1.0):
-                bpm_cvec[i] = 1.0
-            i = i + 1
+        bpm_cvec = np.logical_and(rr_cvec, p_cvec).astype(float)
 
         return bpm_cvec
 
@@ -102,6 +91,8 @@ class BPMCWLMetric(CWLMetric):
 
 class BPMDCWLMetric(CWLMetric):
 
+    VECTORIZED = True
+
     def __init__(self, T=1, K=10, hb=1.0, hc=1.0, gain_med=0.5):
         super().__init__()
         self.metric_name = "BPM-Dynamic-T={0}-K={1}-hb={2}-hc={3}".format(T,K,hb,hc)
@@ -129,37 +120,24 @@ class BPMDCWLMetric(CWLMetric):
     def c_vector(self, ranking, worse_case=True):
         gains = ranking.get_gain_vector(worse_case)
         costs = ranking.get_cost_vector(worse_case)
-        c_gain = np.cumsum(gains)
-        c_cost = np.cumsum(costs)
+        c_gain = np.cumsum(gains, axis=-1)
+        c_cost = np.cumsum(costs, axis=-1)
 
         # GAIN Constraint
-        rr_cvec = np.zeros(len(gains))
-        i = 0
-        T = self.T
+        # T is updated after each item, depending on gain[i], so the T at position i is
+        # the running sum of T and the updates from the items before i
+        updates = self.hb * (gains[..., 0:-1] - self.gain_med)
+        start = np.full(gains.shape[:-1] + (1,), float(self.T))
+        T = np.cumsum(np.concatenate((start, updates), axis=-1), axis=-1)
         # continue until the gain accumulated exceeds T
-        while i < len(gains) and (c_gain[i] < T):
-            rr_cvec[i] = 1.0
-            # Now Update T, depending on gain[i]
-            T = T + self.hb * (gains[i] - self.gain_med)
+        rr_cvec = np.logical_and.accumulate(c_gain < T, axis=-1)
 
-            i = i + 1
         # COST Constraint
-        p_cvec = np.zeros(len(costs))
-        i = 0
-        K = self.K
         # continue until the costs accumulated exceeds K
-        while i < len(costs) and (c_cost[i] < K):
-            p_cvec[i] = 1.0
-            # Now Update K, depending on gain[i]
-            T = T + self.hc * (gains[i] - self.gain_med)
-            i = i + 1
+        # (K is held fixed, the updates from the gains are only applied to T)
+        p_cvec = np.logical_and.accumulate(c_cost < self.K, axis=-1)
 
         # combine the two continuation vectors
-        bpm_cvec = np.zeros(len(costs))
-        i = 0
-        while i < len(costs):
-            if (rr_cvec[i] == 1.0) and (p_cvec[i] == 1.0):
-                bpm_cvec[i] = 1.0
-            i = i + 1
+        bpm_cvec = np.logical_and(rr_cvec, p_cvec).astype(float)
 
         return bpm_cvec
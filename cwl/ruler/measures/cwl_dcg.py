@@ -12,6 +12,11 @@ base is the base of the log for the discounting, which is set to 2 by default as
 """
 
 class NDCGCWLMetric(CWLMetric):
+
+    VECTORIZED = True
+    GAIN_DEPENDENT = False
+    COST_DEPENDENT = False
+
     def __init__(self, k):
         super().__init__()
         self.metric_name = "NDCG-k@{0}".format(k)
@@ -34,15 +39,14 @@ class NDCGCWLMetric(CWLMetric):
     def name(self):
         return "NDCG-k@{0}".format(self.k)
 
-    def c_vector(self, ranking, worse_case=True):
+    def effective_depth(self, ranking, worse_case=True):
+        # no items are examined after the k-th
+        return min(self.k, ranking.n)
 
-        cvec = []
-        for i in range(1, ranking.n+1):
-            if i < self.k:
-                cvec.append(math.log(i+1, self.base)/math.log(i+2, self.base))
-            else:
-                cvec.append(0.0)
-
-        cvec = np.array(cvec)
+    def c_vector(self, ranking, worse_case=True):
+        ranks = np.arange(1, ranking.n + 1)
+        discount = np.log(ranks + 1.0) / math.log(self.base)
+        next_discount = np.log(ranks + 2.0) / math.log(self.base)
+        cvec = np.where(ranks < self.k, discount / next_discount, 0.0)
 
         return cvec
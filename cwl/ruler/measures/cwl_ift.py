@@ -27,6 +27,9 @@ IFTGoalRateCWLMetric implements the Goal and Rate variant - which was shown to b
 
 
 class IFTGoalCWLMetric(CWLMetric):
+
+    VECTORIZED = True
+
     def __init__(self, T, b1, R1):
         super().__init__()
         self.metric_name = "IFT-C1-T={0}-b1={1}-R1={2}".format(T,b1,R1)
@@ -49,20 +52,19 @@ class IFTGoalCWLMetric(CWLMetric):
 
     def c_vector(self, ranking, worse_case=True):
         gains = ranking.get_gain_vector(worse_case)
-        c_gains = np.cumsum(gains)
-        cvec = []
-        for i in range(0, len(gains)):
-            c1 = self.c1_func(c_gains[i])
-            cvec.append(c1)
-        cvec = np.array(cvec)
+        c_gains = np.cumsum(gains, axis=-1)
+        cvec = self.c1_func(c_gains)
         return cvec
 
     def c1_func(self, yi):
-        ex = (1.0 + self.b1 * math.pow(math.e, ((self.T-yi) * self.R1)))
-        return 1.0 - math.pow(ex, -1.0)
+        ex = (1.0 + self.b1 * np.power(math.e, ((self.T-yi) * self.R1)))
+        return 1.0 - np.power(ex, -1.0)
 
 
 class IFTRateCWLMetric(CWLMetric):
+
+    VECTORIZED = True
+
     def __init__(self, A, b2,  R2):
         super().__init__()
         self.metric_name = "IFT-C2-A={0}-b2={1}-R2={2}".format(A, b2, R2)
@@ -87,23 +89,21 @@ class IFTRateCWLMetric(CWLMetric):
         gains = ranking.get_gain_vector(worse_case)
         costs = ranking.get_cost_vector(worse_case)
 
-        c_gains = np.cumsum(gains)
-        c_costs = np.cumsum(costs)
-        cvec = []
-        for i in range(0, len(gains)):
-            c2 = self.c2_func(c_gains[i], c_costs[i])
-            cvec.append(c2)
-
-        cvec = np.array(cvec)
+        c_gains = np.cumsum(gains, axis=-1)
+        c_costs = np.cumsum(costs, axis=-1)
+        cvec = self.c2_func(c_gains, c_costs)
 
         return cvec
 
     def c2_func(self, yi, ki):
-        ex = (1.0 + self.b2 * math.pow(math.e, ((self.A - (yi/ki)) * self.R2)))
-        return math.pow(ex, -1.0)
+        ex = (1.0 + self.b2 * np.power(math.e, ((self.A - (yi/ki)) * self.R2)))
+        return np.power(ex, -1.0)
 
 
 class IFTGoalRateCWLMetric(CWLMetric):
+
+    VECTORIZED = True
+
     def __init__(self, T, b1, R1, A, b2,  R2):
         super().__init__()
         self.metric_name = "IFT-C1-C2-T={0}-b1={1}-R1={2}-A={3}-b2={4}-R2={5}".format(T, b1, R1, A, b2, R2)
@@ -132,23 +132,16 @@ class IFTGoalRateCWLMetric(CWLMetric):
     def c_vector(self, ranking, worse_case=True):
         gains = ranking.get_gain_vector(worse_case)
         costs = ranking.get_cost_vector(worse_case)
-        c_gains = np.cumsum(gains)
-        c_costs = np.cumsum(costs)
-        cvec = []
-        for i in range(0, len(gains)):
-
-            c1 = self.c1_func(c_gains[i])
-            c2 = self.c2_func(c_gains[i], c_costs[i])
-            cvec.append(c1*c2)
-
-        cvec = np.array(cvec)
+        c_gains = np.cumsum(gains, axis=-1)
+        c_costs = np.cumsum(costs, axis=-1)
+        cvec = self.c1_func(c_gains) * self.c2_func(c_gains, c_costs)
 
         return cvec
 
     def c2_func(self, yi, ki):
-        ex = (1.0 + self.b2 * math.pow(math.e, ((self.A - (yi/ki)) * self.R2)))
-        return math.pow(ex, -1.0)
+        ex = (1.0 + self.b2 * np.power(math.e, ((self.A - (yi/ki)) * self.R2)))
+        return np.power(ex, -1.0)
 
     def c1_func(self, yi):
-        ex = (1.0 + self.b1 * math.pow(math.e, ((self.T-yi) * self.R1)))
-        return 1.0 - math.pow(ex, -1.0)
+        ex = (1.0 + self.b1 * np.power(math.e, ((self.T-yi) * self.R1)))
+        return 1.0 - np.power(ex, -1.0)
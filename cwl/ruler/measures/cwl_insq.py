@@ -11,6 +11,10 @@ T denotes the desired amount of gain.
 
 class INSQCWLMetric(CWLMetric):
 
+    VECTORIZED = True
+    GAIN_DEPENDENT = False
+    COST_DEPENDENT = False
+
     def __init__(self, T=1.0):
         super().__init__()
         self.metric_name = "INSQ-T={0}    ".format(T)
@@ -32,12 +36,6 @@ class INSQCWLMetric(CWLMetric):
         return "INSQ-T={0}".format(self.T)
 
     def c_vector(self, ranking, worse_case=True):
-        gains = ranking.get_gain_vector(worse_case)
-        cg = np.cumsum(gains)
-        cvec = []
-        for i in range(0, len(cg)):
-            ci = (((i+1.0) + (2.0 * self.T)-1.0) / ((i+1.0) + (2.0 * self.T)))**2.0
-            cvec.append(ci)
-
-        cvec = np.array(cvec)
+        ranks = np.arange(1, ranking.n + 1, dtype=float)
+        cvec = ((ranks + (2.0 * self.T)-1.0) / (ranks + (2.0 * self.T)))**2.0
         return cvec
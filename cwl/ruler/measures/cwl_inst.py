@@ -11,6 +11,8 @@ depending on whether gain is binary (0,1) or graded (0..1.0)
 
 class INSTCWLMetric(CWLMetric):
 
+    VECTORIZED = True
+
     # INST requires gains to be in range [0, 1]
     MINGAIN = 0.0
     MAXGAIN = 1.0
@@ -37,15 +39,21 @@ class INSTCWLMetric(CWLMetric):
     def name(self):
         return "INST-T={0}".format(self.T)
 
+    def tail_ratio(self, ranking, worse_case=True):
+        # past the end of the rankings every item has the padding gain, so if that gain is one, the rank and the
+        # gain found so far both grow by one at each item, and C is constant (per topic) over the padding
+        depth = ranking.get_depth()
+        if np.any(np.asarray(ranking.get_padding_gain(worse_case)) != 1.0) or not 0 < depth < ranking.n - 1:
+            return None
+        c_gains = np.sum(ranking.truncated(depth + 1).get_gain_vector(worse_case), axis=-1)
+        Ti = self.T - c_gains
+        return ((depth + 1.0 + self.T + Ti - 1.0) / (depth + 1.0 + self.T + Ti))**2.0
+
     def c_vector(self, ranking, worse_case=True):
         gains = ranking.get_gain_vector(worse_case)
         self.validate_gain_range(self.MINGAIN, self.MAXGAIN, gains)
-        c_gains = np.cumsum(gains)
-        cvec = []
-        for i in range(0, len(c_gains)):
-            Ti = self.T - c_gains[i]
-            ci = (((i+1.0)+self.T+Ti-1.0) / ((i+1.0)+self.T+Ti))**2.0
-            cvec.append(ci)
-
-        cvec = np.array(cvec)
+        c_gains = np.cumsum(gains, axis=-1)
+        ranks = np.arange(1, gains.shape[-1] + 1, dtype=float)
+        Ti = self.T - c_gains
+        cvec = ((ranks+self.T+Ti-1.0) / (ranks+self.T+Ti))**2.0
         return cvec
@@ -1,11 +1,242 @@
+import copy
 import math
+import sys
 import numpy as np
 import logging
+from collections import OrderedDict
+from cwl.ruler.result_writer import TsvResultWriter
 
 logger = logging.getLogger('cwl')
 
+
+def _geometric_sum(theta, k):
+    """
+    The sum of theta^j for j < k (theta may be an array, i.e. one per case).
+    """
+    theta = np.asarray(theta, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(theta == 1.0, float(k), (1.0 - theta ** k) / (1.0 - theta))
+
+
+def _dot(vec1, vec2):
+    """
+    The dot product of two vectors along their last axis, broadcasting over any leading axes
+    (i.e. the topics of a batch). Stacked matmul gives the same result as np.dot on each row.
+    """
+    return np.matmul(np.expand_dims(vec1, -2), np.expand_dims(vec2, -1))[..., 0, 0]
+
+
+def residual_scores(best, worse):
+    """
+    The residuals, i.e. the scores of the best case less those of the worse case. Where the two only differ by
+    rounding error (e.g. the EC of a gain dependent metric when every item costs the same), the residual is zero,
+    rather than a tiny (or negative zero) number that would be written as -0.0000.
+    """
+    return np.where(np.isclose(best, worse, rtol=1e-12, atol=0.0), 0.0, np.subtract(best, worse))
+
+
+class CWLVectors(object):
+
+    def __init__(self, cvec, gain_vec=None, cost_vec=None, wvec=None):
+        """
+        Bundles the vectors used to score a ranking (or a batch of rankings) with a metric.
+        All vectors run along the last axis, so a batch of rankings gives one row per topic.
+        :param cvec: the C vector probabilities
+        :param gain_vec: the gain vector (with unjudged items resolved)
+        :param cost_vec: the cost vector (with unjudged items resolved)
+        :param wvec: the W vector probabilities, if the metric defines W directly,
+            otherwise W is derived from the C vector.
+        If the gain and cost vectors are not given, only the C/W/L vectors are computed
+        (see with_gains_and_costs).
+        """
+        self.cvec = np.asarray(cvec, dtype=float)
+        # the probability of reaching each rank i.e. the cumulative product of C shifted by one
+        cshift = np.concatenate((np.ones(self.cvec.shape[:-1] + (1,)), self.cvec[..., 0:-1]), axis=-1)
+        self.cum_prod = np.cumprod(cshift, axis=-1)
+        if wvec is None:
+            w1 = np.divide(1.0, np.sum(self.cum_prod, axis=-1, keepdims=True))
+            wvec = np.multiply(self.cum_prod, w1)
+        self.wvec = np.asarray(wvec, dtype=float)
+        self.lvec = np.multiply(self.cum_prod, np.subtract(1.0, self.cvec))
+        # the examination probability (W) that has been dropped by truncating the vectors (see truncated)
+        self.truncation_error = 0.0
+        self.gain_vec = None
+        self.cost_vec = None
+        self.cum_gains = None
+        self.cum_costs = None
+        # the sums over a geometric tail that follows the vectors (see with_tail)
+        self.tail_wvec = None
+        self.tail_lvec = None
+        self.tail_lvec_ranks = None
+        self.tail_gain = None
+        self.tail_cost = None
+        if gain_vec is not None and cost_vec is not None:
+            self._set_gains_and_costs(gain_vec, cost_vec)
+
+    def with_gains_and_costs(self, gain_vec, cost_vec, cum_gains=None, cum_costs=None):
+        """
+        Returns a bundle that shares the C/W/L vectors of this one, but with the given gains and costs
+        (and their cumulative sums, which are computed if not given).
+        """
+        vecs = copy.copy(self)
+        vecs._set_gains_and_costs(gain_vec, cost_vec, cum_gains, cum_costs)
+        return vecs
+
+    def truncated(self, depth):
+        """
+        Returns a bundle holding only the first depth positions of this one (the C/W/L vectors are not re-normalised).
+        The W mass of the positions that are dropped is recorded as the truncation error.
+        """
+        vecs = copy.copy(self)
+        for attr in ['cvec', 'cum_prod', 'wvec', 'lvec', 'gain_vec', 'cost_vec', 'cum_gains', 'cum_costs']:
+            vec = getattr(self, attr)
+            if vec is not None:
+                setattr(vecs, attr, vec[..., 0:depth])
+        vecs.truncation_error = self.truncation_error + np.sum(self.wvec[..., depth:], axis=-1)
+        return vecs
+
+    def with_tail(self, theta, c_last, n, tail_gain, tail_cost):
+        """
+        Returns a bundle for a ranking of depth n, where the first t positions are those of this bundle
+        (t being one less than its length, as the last position is only used to get the C vector at t-1 right)
+        and the positions from t to n-1 form a geometric tail. In the tail, C is theta (and c_last at the
+        last position) and the gains and costs are constant, so the tail is summed in closed form
+        rather than being materialised.
+        :param theta: the C vector probability in the tail
+        :param c_last: the C vector probability at the last position
+        :param n: the depth of the ranking
+        :param tail_gain: the gain of each item in the tail
+        :param tail_cost: the cost of each item in the tail
+        """
+        t = self.cvec.shape[-1] - 1
+        k = n - t
+        vecs = copy.copy(self)
+        for attr in ['cvec', 'cum_prod', 'lvec', 'gain_vec', 'cost_vec', 'cum_gains', 'cum_costs']:
+            setattr(vecs, attr, getattr(self, attr)[..., 0:t])
+        # the probability of reaching the tail, and the sums of theta^j for j < k and j < k-1
+        reach = self.cum_prod[..., t]
+        geo_sum = _geometric_sum(theta, k)
+        geo_sum_last = _geometric_sum(theta, k - 1)
+        theta_last = np.power(theta, k - 1)
+
+        w1 = np.divide(1.0, np.sum(vecs.cum_prod, axis=-1) + reach * geo_sum)
+        vecs.wvec = np.multiply(vecs.cum_prod, np.expand_dims(w1, -1))
+        vecs.tail_wvec = reach * geo_sum * w1
+        # the sum of L over the tail, and the sum of L weighted by the number of tail items up to each position
+        vecs.tail_lvec = reach * (1.0 - c_last * theta_last)
+        vecs.tail_lvec_ranks = reach * (geo_sum_last - (k - 1) * theta_last + (1.0 - c_last) * k * theta_last)
+        vecs.tail_gain = tail_gain
+        vecs.tail_cost = tail_cost
+        return vecs
+
+    def set_read_only(self):
+        for vec in [self.cvec, self.cum_prod, self.wvec, self.lvec]:
+            vec.setflags(write=False)
+        return self
+
+    def _set_gains_and_costs(self, gain_vec, cost_vec, cum_gains=None, cum_costs=None):
+        self.gain_vec = gain_vec
+        self.cost_vec = cost_vec
+        self.cum_gains = np.cumsum(gain_vec, axis=-1) if cum_gains is None else cum_gains
+        self.cum_costs = np.cumsum(cost_vec, axis=-1) if cum_costs is None else cum_costs
+
+
+class CWLVectorCache(object):
+
+    def __init__(self, max_size=256):
+        """
+        A bounded cache of the C/W/L vectors of metrics whose C vector depends only on their parameters
+        and the depth of the ranking (i.e. not on its gains or costs), so they are computed once
+        and shared across topics. Once full, the least recently used vectors are evicted.
+        :param max_size: the maximum number of vector bundles to hold
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._vectors = OrderedDict()
+
+    def get(self, key, make_vectors):
+        """
+        Returns the vectors stored under the key, calling make_vectors to create (and store) them if needed.
+        :param key: a hashable key i.e. (metric class, parameters, n)
+        :param make_vectors: a function with no arguments that returns a CWLVectors object
+        :return: returns a (read only) CWLVectors object
+        """
+        if key in self._vectors:
+            self.hits += 1
+            self._vectors.move_to_end(key)
+            return self._vectors[key]
+
+        self.misses += 1
+        vecs = make_vectors().set_read_only()
+        self._vectors[key] = vecs
+        if len(self._vectors) > self.max_size:
+            self._vectors.popitem(last=False)
+        return vecs
+
+    def clear(self):
+        self._vectors.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._vectors)
+
+
+vector_cache = CWLVectorCache()
+
+
+def score_stacked_vectors(vectors):
+    """
+    Scores the same rankings with many metrics at once, as CWLMetric._do_score does with one metric.
+    The C/W/L vectors of the metrics must not depend on the gains or costs of the rankings, so that
+    their W and L vectors can be stacked into (metrics x ranks) matrices (padded with zeros where a metric
+    stops before the others), and each measurement is one matrix product with the (topics x ranks) matrices
+    of the gains and costs, rather than one product per metric.
+    :param vectors: the vectors of each metric (see CWLMetric.vectors), on the same rankings
+    :return: a (topics x metrics x 5) array of the scores, or (2 x topics x metrics x 5) if the rankings
+    are the worse and best cases stacked
+    """
+    depth = max(vecs.wvec.shape[-1] for vecs in vectors)
+    wvecs = np.zeros((len(vectors), depth))
+    lvecs = np.zeros((len(vectors), depth))
+    for i, vecs in enumerate(vectors):
+        wvecs[i, 0:vecs.wvec.shape[-1]] = vecs.wvec
+        lvecs[i, 0:vecs.lvec.shape[-1]] = vecs.lvec
+    # the gains and costs of the metric that goes deepest (those of the others are their prefixes)
+    deepest = max(vectors, key=lambda vecs: vecs.wvec.shape[-1])
+    expected_utility = np.matmul(deepest.gain_vec, wvecs.T)
+    expected_total_utility = np.matmul(deepest.cum_gains, lvecs.T)
+    # (the costs of both cases may be one shared vector, see Ranking.get_cost_vector, so their products
+    # are broadcast to both cases before the tails are added to each case)
+    expected_cost = np.broadcast_to(np.matmul(deepest.cost_vec, wvecs.T), expected_utility.shape).copy()
+    expected_total_cost = np.broadcast_to(np.matmul(deepest.cum_costs, lvecs.T), expected_utility.shape).copy()
+    expected_items = np.broadcast_to(1.0 / wvecs[:, 0], expected_utility.shape)
+    for i, vecs in enumerate(vectors):
+        if vecs.tail_wvec is not None:
+            # add the sums over the tail (see CWLVectors.with_tail)
+            expected_utility[..., i] += vecs.tail_wvec * vecs.tail_gain
+            expected_total_utility[..., i] += (vecs.tail_lvec * vecs.cum_gains[..., -1]
+                                               + vecs.tail_lvec_ranks * vecs.tail_gain)
+            expected_cost[..., i] += vecs.tail_wvec * vecs.tail_cost
+            expected_total_cost[..., i] += (vecs.tail_lvec * vecs.cum_costs[..., -1]
+                                            + vecs.tail_lvec_ranks * vecs.tail_cost)
+    return np.stack([expected_utility, expected_total_utility, expected_cost, expected_total_cost, expected_items],
+                    axis=-1)
+
+
 class CWLMetric(object):
 
+    # Set to True by metrics whose c_vector (and w_vector) are written as array operations
+    # over the last axis, so that they can score a whole RankingBatch at once.
+    VECTORIZED = False
+
+    # Set to False by metrics whose C vector does not depend on the gains and/or the costs of the ranking.
+    # If it depends on neither (i.e. only on the parameters and ranking.n) then the C/W/L vectors
+    # are computed once and cached across topics (see CWLVectorCache).
+    GAIN_DEPENDENT = True
+    COST_DEPENDENT = True
+
     def __init__(self):
         self.expected_utility = 0.0
         self.expected_cost = 0.0
@@ -20,11 +251,38 @@ class CWLMetric(object):
         self.residuals = False
         self.metric_name = "Undefined"
         self.ranking = None
+        self.batch = None
+        self.batch_scores = None
+        self.batch_residuals = None
+        # scoring stops at the depth past which the probability of examining an item
+        # (the cumulative product of C) is at most epsilon, i.e. where it is zero by default.
+        self.epsilon = 0.0
+        self.truncation_error = 0.0
+        self.batch_truncation_error = None
+        self._truncation_error = 0.0
         self.bibtex = ""
 
     def name(self):
         return self.metric_name
 
+    def params(self):
+        """
+        The parameters of the metric, i.e. the plain attributes that its class sets on top of those of CWLMetric,
+        as a sorted list of name=value, with numbers normalised to floats (so that e.g. T=1 and T=1.0 are the same).
+        Unlike the name of the metric, these tell apart every setting of the metric (e.g. the gain_med of BPM-Dynamic).
+        """
+        state = vars(CWLMetric())
+        params = []
+        for name, value in sorted(vars(self).items()):
+            if name in state:
+                continue
+            if isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_)):
+                value = float(value)
+            elif not isinstance(value, (bool, np.bool_, str)) and value is not None:
+                continue
+            params.append("{0}={1!r}".format(name, value))
+        return params
+
     def c_vector(self, ranking, worse_case=True):
         """
         Create a vector of C probabilities (i.e. probability of continuing from position i to position i+1)
@@ -46,13 +304,7 @@ class CWLMetric(object):
         :param worse_case: Boolean, to denote whether to estimate based on assuming the
         :return: returns the L vector probabilities
         """
-        cvec = self.c_vector(ranking, worse_case)
-        logger.debug("{0} {1} {2} {3}".format(ranking.topic_id, self.name(), "cvec", cvec[0:11]))
-        cshift = np.append(np.array([1.0]), cvec[0:-1])
-        lvec = np.cumprod(cshift)
-        lvec = np.multiply(lvec, (np.subtract(np.ones(len(cvec)), cvec)))
-        logger.debug("{0} {1} {2} {3}".format(ranking.topic_id, self.name(), "lvec", lvec[0:11]))
-        return lvec
+        return self.vectors(ranking, worse_case).lvec
 
     def w_vector(self, ranking, worse_case=True):
         """
@@ -62,15 +314,133 @@ class CWLMetric(object):
         :param worse_case: Boolean, to denote whether to estimate based on assuming the
         :return: returns the W vector probabilities
         """
-        cvec = self.c_vector(ranking, worse_case)
-        cvec = cvec[0:-1]
-        cvec_prod = np.cumprod(cvec)
-        cvec_prod = np.pad(cvec_prod, (1, 0), 'constant', constant_values=1.0)
-        w1 = np.divide(1.0, np.sum(cvec_prod))
-        w_tail = np.multiply(cvec_prod[1:len(cvec_prod)], w1)
-        wvec = np.append(w1, w_tail)
-        logger.debug("{0} {1} {2} {3}".format(ranking.topic_id, self.name(), "wvec", wvec[0:11]))
-        return wvec
+        return self.vectors(ranking, worse_case).wvec
+
+    def effective_depth(self, ranking, worse_case=True):
+        """
+        Returns the depth past which the metric does not examine any items, so that only this prefix
+        of the ranking needs to be scored, e.g. P@k and NDCG@k stop at k.
+        Note: the ranking given to c_vector/w_vector is then truncated to this depth,
+        so a metric should only re-implement this function if its C vector at each position
+        does not depend on the items after it.
+        :param ranking: CWL Ranking object
+        :param worse_case: Boolean, to denote whether to estimate based on assuming the
+        :return: returns the depth (ranking.n by default)
+        """
+        return ranking.n
+
+    def tail_ratio(self, ranking, worse_case=True):
+        """
+        Returns theta if the C vector is a constant theta wherever the gains and costs are constant,
+        i.e. over the padding past the end of the ranking (as for RBP), otherwise None.
+        If so, only the items in the ranking are scored, and the padding up to ranking.n is summed in closed form.
+        :param ranking: CWL Ranking object
+        :param worse_case: Boolean, to denote whether to estimate based on assuming the
+        :return: returns the C vector probability over the padding (an array of one per case, if the cases
+            are stacked), or None
+        """
+        return None
+
+    def vectors(self, ranking, worse_case=True):
+        """
+        Create the bundle of vectors (C, the cumulative product of C, W, L, and the gains and costs
+        with their cumulative sums) that are needed to score the ranking, computing each of them only once.
+        For most metrics, the W and L vectors are derived from the C vector.
+        For metrics that re-implement w_vector (e.g. TBG, U-Measure), W is computed once
+        and the C vector is derived from it (see c_from_w).
+        The vectors stop at the effective depth of the metric, or where the probability of examining
+        an item falls to epsilon, as the items past this depth add (next to) nothing to the measurements.
+        :param ranking: CWL Ranking object
+        :param worse_case: Boolean, to denote whether to estimate based on assuming the
+            worse case, or None for both cases (stacked along a new leading axis, see measure)
+        :return: returns a CWLVectors object
+        """
+        depth = self.effective_depth(ranking, worse_case)
+        if depth < ranking.n:
+            ranking = ranking.truncated(depth)
+        n = ranking.n
+        theta = self.tail_ratio(ranking, worse_case)
+        if theta is not None and 0 < ranking.get_depth() < n - 1:
+            # score the ranking plus one item of padding, and sum the rest of the padding in closed form
+            ranking = ranking.truncated(ranking.get_depth() + 1)
+        else:
+            theta = None
+        if not (self.GAIN_DEPENDENT or self.COST_DEPENDENT):
+            vecs = vector_cache.get(self._vector_cache_key(ranking),
+                                    lambda: self._user_model_vectors(ranking, True))
+        elif worse_case is None and self._case_independent(ranking):
+            # both cases share the same C/W/L vectors
+            vecs = self._user_model_vectors(ranking, True)
+        else:
+            vecs = self._user_model_vectors(ranking, worse_case)
+        ranking_vecs = [ranking.get_gain_vector(worse_case), ranking.get_cost_vector(worse_case),
+                        ranking.get_cumulative_gain_vector(worse_case), ranking.get_cumulative_cost_vector(worse_case)]
+        depth = self._examined_depth(vecs) if theta is None else ranking.n
+        if depth < ranking.n:
+            vecs = vecs.truncated(depth)
+            ranking_vecs = [vec[..., 0:depth] for vec in ranking_vecs]
+        vecs = vecs.with_gains_and_costs(*ranking_vecs)
+        if theta is not None:
+            c_last = 0.0 if self._w_defined() else theta
+            vecs = vecs.with_tail(theta, c_last, n, ranking.get_padding_gain(worse_case),
+                                  ranking.get_padding_cost(worse_case))
+        if logger.isEnabledFor(logging.DEBUG):
+            # (formatting the vectors costs as much as scoring them, so only when they are logged)
+            logger.debug("{0} {1} {2} {3}".format(ranking.topic_id, self.name(), "cvec", vecs.cvec[..., 0:11]))
+            logger.debug("{0} {1} {2} {3}".format(ranking.topic_id, self.name(), "wvec", vecs.wvec[..., 0:11]))
+            logger.debug("{0} {1} {2} {3}".format(ranking.topic_id, self.name(), "lvec", vecs.lvec[..., 0:11]))
+        return vecs
+
+    def _user_model_vectors(self, ranking, worse_case=True):
+        """
+        Creates the C/W/L vectors of the metric (without the gains and costs).
+        """
+        if self._w_defined():
+            wvec = self.w_vector(ranking, worse_case)
+            return CWLVectors(self.c_from_w(wvec), wvec=wvec)
+        return CWLVectors(self.c_vector(ranking, worse_case))
+
+    def _case_independent(self, ranking):
+        """
+        Returns True if the C vector is the same in the worse and best cases,
+        i.e. it depends on neither the gains nor the costs (or the costs are resolved the same in both cases).
+        """
+        return not self.GAIN_DEPENDENT and (not self.COST_DEPENDENT or ranking.max_cost == ranking.min_cost)
+
+    def _w_defined(self):
+        """
+        Returns True if the metric re-implements w_vector, i.e. it is defined by its W vector.
+        """
+        return type(self).w_vector is not CWLMetric.w_vector
+
+    def _examined_depth(self, vecs):
+        """
+        Returns the depth past which the probability of examining an item is at most epsilon (for every topic).
+        """
+        cum_prod = vecs.cum_prod.reshape(-1, vecs.cum_prod.shape[-1])
+        examined = np.nonzero(np.any(cum_prod > self.epsilon, axis=0))[0]
+        if len(examined) == 0:
+            return 1
+        return examined[-1] + 1
+
+    def _vector_cache_key(self, ranking):
+        """
+        The key under which the vectors of a gain and cost independent metric are cached.
+        The metric is keyed by its parameters (see params), as its name may leave some of them out.
+        """
+        return type(self), tuple(self.params()), ranking.n
+
+    def c_from_w(self, wvec):
+        """
+        Derive the C vector from a W vector, i.e. C_i = W_i+1 / W_i (and zero where W_i is zero).
+        The last item has no successor, so its continuation probability is zero.
+        :param wvec: the W vector probabilities
+        :return: returns the C vector probabilities
+        """
+        wvec = np.asarray(wvec, dtype=float)
+        cvec = np.zeros(wvec.shape)
+        np.divide(wvec[..., 1:], wvec[..., 0:-1], out=cvec[..., 0:-1], where=(wvec[..., 0:-1] > 0.0))
+        return cvec
 
     def measure(self, ranking):
         """
@@ -80,8 +450,21 @@ class CWLMetric(object):
         :return: the expected utility per item
         """
         self.ranking = ranking
+        if self.residuals and self.VECTORIZED:
+            # score the worse case (lower bounds) and the best case (upper bounds) together
+            scores = self._do_score_cases(ranking)
+            self.truncation_error = self._truncation_error
+            (self.expected_utility, self.expected_total_utility, self.expected_cost,
+             self.expected_total_cost, self.expected_items) = scores[0]
+            # compute the residual i.e. the difference between the upper and lower bounds
+            (self.residual_expected_utility, self.residual_expected_total_utility, self.residual_expected_cost,
+             self.residual_expected_total_cost, self.residual_expected_items) = residual_scores(scores[1], scores[0])
+            self._log_truncation_error(ranking.topic_id, self.truncation_error)
+            return self.expected_utility
+
         # score based on worse case - lower bounds
         (eu, etu, ec, etc, ei) = self._do_score(ranking, True)
+        self.truncation_error = self._truncation_error
 
         self.expected_utility = eu
         self.expected_total_utility = etu
@@ -92,50 +475,126 @@ class CWLMetric(object):
         if self.residuals:
             # score based on best case - upper bounds
             (eu, etu, ec, etc, ei) = self._do_score(ranking, False)
+            self.truncation_error = max(self.truncation_error, self._truncation_error)
 
             # compute the residual i.e. the difference between the upper and lower bounds
-            self.residual_expected_utility = eu - self.expected_utility
-            self.residual_expected_total_utility = etu - self.expected_total_utility
-            self.residual_expected_cost = ec - self.expected_cost
-            self.residual_expected_total_cost = etc - self.expected_total_cost
-            self.residual_expected_items = ei - self.expected_items
+            (self.residual_expected_utility, self.residual_expected_total_utility, self.residual_expected_cost,
+             self.residual_expected_total_cost, self.residual_expected_items) = residual_scores(
+                [eu, etu, ec, etc, ei], self.get_scores())
+
+        self._log_truncation_error(ranking.topic_id, self.truncation_error)
 
         # return the rate of gain per document
         return self.expected_utility
 
+    def measure_batch(self, batch):
+        """
+        Given a batch of rankings, estimates the CWL measurements for every topic in the batch.
+        If the metric is VECTORIZED, the C/W/L vectors and the measurements are computed for all topics
+        with a few array operations, otherwise each topic is scored in turn (as per measure).
+        :param batch: CWL RankingBatch object
+        :return: a (topics x 5) array of EU, ETU, EC, ETC and ED for each topic in the batch
+        """
+        self.batch = batch
+        self.batch_residuals = None
+        if self.residuals and self.VECTORIZED:
+            # score the worse case (lower bounds) and the best case (upper bounds) together
+            scores = self._do_score_cases(batch)
+            self.batch_scores = scores[0]
+            self.batch_residuals = residual_scores(scores[1], scores[0])
+            self.batch_truncation_error = self._truncation_error
+        else:
+            # score based on worse case - lower bounds
+            self.batch_scores = self._do_score_batch(batch, True)
+            self.batch_truncation_error = self._truncation_error
+            if self.residuals:
+                # score based on best case - upper bounds, and take the difference
+                self.batch_residuals = residual_scores(self._do_score_batch(batch, False), self.batch_scores)
+                self.batch_truncation_error = np.maximum(self.batch_truncation_error, self._truncation_error)
+
+        self._log_truncation_error(batch.topic_id, self.batch_truncation_error)
+        return self.batch_scores
+
+    def _log_truncation_error(self, topic_id, error):
+        if self.epsilon > 0.0:
+            logger.info("{0} {1} max truncation error {2}".format(topic_id, self.name(), np.max(error)))
+
+    def _do_score_cases(self, ranking):
+        """
+        An internal function that scores the worse case and the best case of a ranking (or a batch) in one pass,
+        by stacking the two cases along a new leading axis. Only used by VECTORIZED metrics.
+        :param ranking: CWL Ranking or RankingBatch object
+        :return: a (2 x 5) array of the scores of each case, or (2 x topics x 5) for a batch
+        """
+        if self.tail_ratio(ranking, None) is None and any(self.tail_ratio(ranking, worse_case) is not None
+                                                          for worse_case in [True, False]):
+            # only one of the cases has a closed form tail (e.g. INST, whose C vector is constant over
+            # padding with a gain of one), so the cases are scored apart to let that case stop at the rankings
+            scores = []
+            errors = []
+            for worse_case in [True, False]:
+                scores.append(np.stack(np.broadcast_arrays(*self._do_score(ranking, worse_case)), axis=-1))
+                errors.append(np.broadcast_to(self._truncation_error, scores[-1].shape[:-1]))
+            self._truncation_error = np.maximum(errors[0], errors[1])
+            return np.stack(scores)
+        scores = np.stack(np.broadcast_arrays(*self._do_score(ranking, None)), axis=-1)
+        self._truncation_error = np.max(np.broadcast_to(self._truncation_error, scores.shape[:-1]), axis=0)
+        return scores
+
+    def _do_score_batch(self, batch, worse_case=True):
+        """
+        An internal function that scores each ranking in the batch.
+        :param batch: CWL RankingBatch object
+        :return: a (topics x 5) array of the expected utility per item, etc..
+        """
+        if self.VECTORIZED:
+            scores = np.column_stack(np.broadcast_arrays(*self._do_score(batch, worse_case)))
+            self._truncation_error = np.broadcast_to(self._truncation_error, len(batch))
+            return scores
+        scores = []
+        errors = []
+        for i in range(len(batch)):
+            scores.append(self._do_score(batch.get_ranking(i), worse_case))
+            errors.append(self._truncation_error)
+        self._truncation_error = np.array(errors, dtype=float)
+        return np.array(scores, dtype=float).reshape(-1, 5)
+
     def _do_score(self, ranking, worse_case=True):
         """
         An internal function that handles the scoring of a ranking given the CWL machinery.
+        The vectors are combined along their last axis, so if the metric is VECTORIZED
+        a RankingBatch can be scored in the same way as a single Ranking.
         :param ranking: CWL Ranking object
         :return: the expected utility per item
         :return: returns the expected utility per item, etc..
         """
-        wvec = self.w_vector(ranking, worse_case)
-        lvec = self.l_vector(ranking, worse_case)
-        gain_vec = ranking.get_gain_vector(worse_case)
-        cost_vec = ranking.get_cost_vector(worse_case)
-        cum_gains = np.cumsum(gain_vec)
-        cum_costs = np.cumsum(cost_vec)
-        expected_utility = np.sum(np.dot(wvec, gain_vec))
-        expected_total_utility = np.sum(np.dot(lvec, cum_gains))
-        expected_cost = np.sum(np.dot(wvec, cost_vec))
-        expected_total_cost = np.sum(np.dot(lvec, cum_costs))
-        expected_items = 1.0 / wvec[0]
+        vecs = self.vectors(ranking, worse_case)
+        self._truncation_error = vecs.truncation_error
+        expected_utility = _dot(vecs.wvec, vecs.gain_vec)
+        expected_total_utility = _dot(vecs.lvec, vecs.cum_gains)
+        expected_cost = _dot(vecs.wvec, vecs.cost_vec)
+        expected_total_cost = _dot(vecs.lvec, vecs.cum_costs)
+        expected_items = 1.0 / vecs.wvec[..., 0]
+        if vecs.tail_wvec is not None:
+            # add the sums over the tail (see CWLVectors.with_tail)
+            expected_utility = expected_utility + vecs.tail_wvec * vecs.tail_gain
+            expected_total_utility = (expected_total_utility + vecs.tail_lvec * vecs.cum_gains[..., -1]
+                                      + vecs.tail_lvec_ranks * vecs.tail_gain)
+            expected_cost = expected_cost + vecs.tail_wvec * vecs.tail_cost
+            expected_total_cost = (expected_total_cost + vecs.tail_lvec * vecs.cum_costs[..., -1]
+                                   + vecs.tail_lvec_ranks * vecs.tail_cost)
         return expected_utility, expected_total_utility, expected_cost, expected_total_cost, expected_items
 
     def report(self):
+        """
+        Prints the measurements of the previously measured ranking (see ruler.result_writer.TsvResultWriter).
+        """
+        residual_scores = None
         if self.residuals:
-            print("{0}\t{1}\t{2:.4f}\t{3:.4f}\t{4:.4f}\t{5:.4f}\t{6:.4f}\t{7:.4f}\t{8:.4f}\t{9:.4f}\t{10:.4f}\t{11:.4f}".format(
-                self.ranking.topic_id, self.name(), self.expected_utility, self.expected_total_utility,
-                self.expected_cost, self.expected_total_cost, self.expected_items,
-                self.residual_expected_utility, self.residual_expected_total_utility,
-                self.residual_expected_cost, self.residual_expected_total_cost, self.residual_expected_items
-            ))
-        else:
-            print("{0}\t{1}\t{2:.4f}\t{3:.4f}\t{4:.4f}\t{5:.4f}\t{6:.4f}".format(
-                self.ranking.topic_id, self.name(), self.expected_utility, self.expected_total_utility,
-                self.expected_cost, self.expected_total_cost, self.expected_items,
-            ))
+            residual_scores = np.array([[self.get_residual_scores()]], dtype=float)
+        writer = TsvResultWriter(sys.stdout, [self.name()], self.residuals)
+        writer.write_batch([self.ranking.topic_id], np.array([[self.get_scores()]], dtype=float), residual_scores)
+        writer.close()
 
     def csv(self):
         return ("{0},{1:.3f},{2:.3f},{3:.3f},{4:.3f},{5:.3f}".format(
@@ -154,6 +613,13 @@ class CWLMetric(object):
          self.expected_items]
         return scores
 
+    def get_residual_scores(self):
+        """
+        :return: list with the residual of each measurement for the previously measured ranking
+        """
+        return [self.residual_expected_utility, self.residual_expected_total_utility,
+                self.residual_expected_cost, self.residual_expected_total_cost, self.residual_expected_items]
+
     def _pad_vector(self, vec1, n, val):
         """
         Pads vector 1 up to size n, with the value val
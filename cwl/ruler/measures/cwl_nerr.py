@@ -17,6 +17,8 @@ NRReq11 runs to full depth according to the parameter T (akin to INST).
 # Option One (Equation 8)
 class NERReq8CWLMetric(CWLMetric):
 
+    VECTORIZED = True
+
     # NERReq8 requires gains to be in range [0, 1]
     MINGAIN = 0.0
     MAXGAIN = 1.0
@@ -37,20 +39,23 @@ class NERReq8CWLMetric(CWLMetric):
         }
         """
 
+    def effective_depth(self, ranking, worse_case=True):
+        # no items are examined after the k-th
+        return min(self.k, ranking.n)
+
     def c_vector(self, ranking, worse_case=True):
         gains = ranking.get_gain_vector(worse_case)
         self.validate_gain_range(self.MINGAIN, self.MAXGAIN, gains)
-        cvec = np.zeros(len(gains))
-        i = 0
-        while i < len(gains) and i < self.k - 1: 
-          cvec[i] = 1 - gains[i]
-          i = i + 1
-        return np.array(cvec)
+        ranks = np.arange(1, gains.shape[-1] + 1)
+        cvec = np.where(ranks < self.k, 1 - gains, 0.0)
+        return cvec
 
 
 # Option Two (Equation 9)
 class NERReq9CWLMetric(CWLMetric):
 
+    VECTORIZED = True
+
     # NERReq9 requires gains to be in range [0, 1]
     MINGAIN = 0.0
     MAXGAIN = 1.0
@@ -71,21 +76,23 @@ class NERReq9CWLMetric(CWLMetric):
         }
         """
 
+    def effective_depth(self, ranking, worse_case=True):
+        # no items are examined after the k-th
+        return min(self.k, ranking.n)
+
     def c_vector(self, ranking, worse_case=True):
         gains = ranking.get_gain_vector(worse_case)
         self.validate_gain_range(self.MINGAIN, self.MAXGAIN, gains)
-        cvec = np.zeros(len(gains))
-        i = 0
-        while i < len(gains) and i < self.k - 1: 
-          rank = i + 1
-          cvec[i] = (1.0*rank/(rank+1.0)) * (1.0-gains[i])
-          i = i + 1
-        return np.array(cvec)
+        ranks = np.arange(1, gains.shape[-1] + 1)
+        cvec = np.where(ranks < self.k, (1.0*ranks/(ranks+1.0)) * (1.0-gains), 0.0)
+        return cvec
 
 
 # Option Three (Equation 10)
 class NERReq10CWLMetric(CWLMetric):
 
+    VECTORIZED = True
+
     # NERReq10 requires gains to be in range [0, 1]
     MINGAIN = 0.0
     MAXGAIN = 1.0
@@ -109,17 +116,15 @@ class NERReq10CWLMetric(CWLMetric):
     def c_vector(self, ranking, worse_case=True):
         gains = ranking.get_gain_vector(worse_case)
         self.validate_gain_range(self.MINGAIN, self.MAXGAIN, gains)
-        cvec = np.zeros(len(gains))
-        i = 0
-        while i < len(gains):
-          cvec[i] = self.phi * (1 - gains[i])
-          i = i + 1
-        return np.array(cvec)
+        cvec = self.phi * (1 - gains)
+        return cvec
 
 
 # Option Four (Equation 11)
 class NERReq11CWLMetric(CWLMetric):
 
+    VECTORIZED = True
+
     # NERReq11 requires gains to be in range [0, 1]
     MINGAIN = 0.0
     MAXGAIN = 1.0
@@ -143,10 +148,6 @@ class NERReq11CWLMetric(CWLMetric):
     def c_vector(self, ranking, worse_case=True):
         gains = ranking.get_gain_vector(worse_case)
         self.validate_gain_range(self.MINGAIN, self.MAXGAIN, gains)
-        cvec = np.zeros(len(gains))
-        i = 0
-        while i < len(gains):
-          rank = i + 1
-          cvec[i] = (((rank + (2.0 * self.T)-1.0) / (rank + (2.0 * self.T)))**2.0) * (1.0-gains[i])
-          i = i + 1
-        return np.array(cvec)
+        ranks = np.arange(1, gains.shape[-1] + 1)
+        cvec = (((ranks + (2.0 * self.T)-1.0) / (ranks + (2.0 * self.T)))**2.0) * (1.0-gains)
+        return cvec
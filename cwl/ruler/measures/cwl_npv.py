@@ -15,6 +15,10 @@ as a how much searchers discount the future value for an alternative perspective
 
 class NPVCWLMetric(CWLMetric):
 
+    VECTORIZED = True
+    GAIN_DEPENDENT = False
+    COST_DEPENDENT = False
+
     def __init__(self, rate=0.1):
         super().__init__()
         self.metric_name = "NPV-r@{0}".format(rate)
@@ -32,7 +36,9 @@ class NPVCWLMetric(CWLMetric):
     def name(self):
         return "NPV-r@{0}".format(self.rate)
 
+    def tail_ratio(self, ranking, worse_case=True):
+        return 1.0/(1.0+self.rate)
+
     def c_vector(self, ranking, worse_case=True):
-        gains = ranking.get_gain_vector(worse_case)
-        cvec = np.dot(np.ones(len(gains)), (1.0/(1.0+self.rate)))
+        cvec = np.full(ranking.n, 1.0/(1.0+self.rate))
         return cvec
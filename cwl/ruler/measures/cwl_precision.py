@@ -17,6 +17,10 @@ P@k was used much later more widely in the 1990s through TREC.
 
 class PrecisionCWLMetric(CWLMetric):
 
+    VECTORIZED = True
+    GAIN_DEPENDENT = False
+    COST_DEPENDENT = False
+
     def __init__(self, k=10):
         super().__init__()
         self.metric_name = "P@{0}".format(k)
@@ -33,7 +37,10 @@ class PrecisionCWLMetric(CWLMetric):
     def name(self):
         return "P@{0}".format(self.k)
 
+    def effective_depth(self, ranking, worse_case=True):
+        # no items are examined after the k-th
+        return min(self.k, ranking.n)
+
     def c_vector(self, ranking, worse_case=True):
-        cvec = np.ones(self.k-1)
-        cvec = self._pad_vector(cvec, ranking.n, 0.0)
+        cvec = np.where(np.arange(1, ranking.n + 1) < self.k, 1.0, 0.0)
         return cvec
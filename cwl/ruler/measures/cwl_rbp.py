@@ -16,6 +16,10 @@ and RBP is also related to Time Biased Gain (see cwl_tbg.TBGCWLMetric)
 
 class RBPCWLMetric(CWLMetric):
 
+    VECTORIZED = True
+    GAIN_DEPENDENT = False
+    COST_DEPENDENT = False
+
     def __init__(self, theta=0.9):
         #CWLMetric.__init__(self)
         super().__init__()
@@ -39,6 +43,9 @@ class RBPCWLMetric(CWLMetric):
     def name(self):
         return "RBP@{0}".format(self.theta)
 
+    def tail_ratio(self, ranking, worse_case=True):
+        return float(self.theta)
+
     def c_vector(self, ranking, worse_case=True):
-        cvec = np.dot(np.ones(ranking.n), self.theta)
+        cvec = np.full(ranking.n, float(self.theta))
         return cvec
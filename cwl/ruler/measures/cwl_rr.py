@@ -8,6 +8,8 @@ Reciprocal Rank (RR) - From TREC-5 in 1996 by Kantor and Voorhees
 
 class RRCWLMetric(CWLMetric):
 
+    VECTORIZED = True
+
     def __init__(self):
         super().__init__()
         self.metric_name = "RR"
@@ -26,17 +28,27 @@ class RRCWLMetric(CWLMetric):
     def name(self):
         return "RR"
 
+    def effective_depth(self, ranking, worse_case=True):
+        # no items are examined after the first item with gain (in any of the topics)
+        # (only the items of the rankings are looked at, as past them every item has the padding gain)
+        depth = ranking.get_depth()
+        padding = np.asarray(ranking.get_padding_gain(worse_case))
+        first = np.where(padding > 0, min(depth + 1, ranking.n), ranking.n)
+        if depth > 0:
+            found = ranking.truncated(depth).get_gain_vector(worse_case) > 0
+            first = np.where(np.any(found, axis=-1), np.argmax(found, axis=-1) + 1, first)
+        return int(np.max(first))
+
+    def tail_ratio(self, ranking, worse_case=True):
+        # past the end of the rankings every item has the padding gain, so C is zero from the first item of the
+        # padding if that gain is positive, and one otherwise (one per case, if the cases are stacked);
+        # a topic whose ranking has an item with gain never reaches the padding, so its C there does not matter
+        return np.where(np.asarray(ranking.get_padding_gain(worse_case)) > 0, 0.0, 1.0)
+
     def c_vector(self, ranking, worse_case=True):
         gains = ranking.get_gain_vector(worse_case)
-        cvec = np.zeros(len(gains))
-        i = 0
-        found_gain = False
-        while i < len(gains) and not found_gain:
-            if (gains[i] > 0):
-                found_gain = True
-            else:
-                cvec[i] = 1.0
-            i = i + 1
+        # continue until the first item with gain is found
+        cvec = np.logical_and.accumulate(np.logical_not(gains > 0), axis=-1).astype(float)
 
         return cvec
 
@@ -24,6 +24,10 @@ note that when beta = 1.0 and k = k, then user model is equivalent to the P@k us
 
 class SETCWLMetric(CWLMetric):
 
+    VECTORIZED = True
+    GAIN_DEPENDENT = False
+    COST_DEPENDENT = False
+
     def __init__(self, beta=0.5, k=10):
         super().__init__()
         self.k = k
@@ -47,17 +51,14 @@ class SETCWLMetric(CWLMetric):
         return "SET-k@{0}-b@{1}".format(self.k, self.beta)
 
     def _weight(self, i):
-        return math.pow(i + 1, self.beta) - math.pow(i, self.beta)
-
-    def c_vector(self, ranking, worse_case=True):
+        return np.power(i + 1.0, self.beta) - np.power(i, self.beta)
 
-        cvec = []
-        for i in range(1, ranking.n + 1):
-            if i < self.k:
-                cvec.append(self._weight(i+1)/self._weight(i))
-            else:
-                cvec.append(0.0)
+    def effective_depth(self, ranking, worse_case=True):
+        # no items are examined after the k-th
+        return min(self.k, ranking.n)
 
-        cvec = np.array(cvec)
+    def c_vector(self, ranking, worse_case=True):
+        ranks = np.arange(1, ranking.n + 1, dtype=float)
+        cvec = np.where(ranks < self.k, self._weight(ranks + 1.0) / self._weight(ranks), 0.0)
 
         return cvec
@@ -22,6 +22,10 @@ TODO(): Consider implementing duplicate sensitive qrel handler that would be dup
 """
 
 class TBGCWLMetric(CWLMetric):
+
+    VECTORIZED = True
+    GAIN_DEPENDENT = False
+
     def __init__(self, halflife=224):
         super().__init__()
         self.metric_name = "TBG-H@{0} ".format(halflife)
@@ -44,37 +48,26 @@ class TBGCWLMetric(CWLMetric):
     def name(self):
         return "TBG-H@{0} ".format(self.halflife)
 
-    def c_vector(self, ranking, worse_case=True):
-        wvec = self.w_vector(ranking, worse_case)
-        cvec = []
-        for i in range(0, len(wvec)-1):
-            if wvec[i] > 0.0:
-                cvec.append( wvec[i+1]/ wvec[i])
-            else:
-                cvec.append(0.0)
-
-        cvec.append(0.0)
-        cvec = np.array(cvec)
+    def tail_ratio(self, ranking, worse_case=True):
+        # past the end of the ranking every item has the same cost, so the weight decays geometrically
+        return np.power(2.0, -ranking.get_padding_cost(worse_case) / self.halflife)
 
-        return cvec
+    def c_vector(self, ranking, worse_case=True):
+        # the C vector is derived from the W vector, which defines this metric
+        return self.c_from_w(self.w_vector(ranking, worse_case))
 
     def w_vector(self, ranking, worse_case=True):
         costs = ranking.get_cost_vector(worse_case)
-        wvec = []
-        c_costs = np.cumsum(costs)
-        start = 0.0
-
-        norm = self.integral_decay(0.0)
-        wvec.append(norm)
+        c_costs = np.cumsum(costs, axis=-1)
 
-        for i in range(0, len(c_costs)-1):
-            weight_i = self.integral_decay(c_costs[i])
-            norm = norm + weight_i
-            wvec.append(weight_i)
+        # the weight of item i decays with the time spent before reaching it
+        start = np.zeros(costs.shape[:-1] + (1,))
+        wvec = self.integral_decay(np.concatenate((start, c_costs[..., 0:-1]), axis=-1))
+        norm = np.sum(wvec, axis=-1, keepdims=True)
 
-        wvec = np.divide(np.array(wvec), norm)
+        wvec = np.divide(wvec, norm)
         return wvec
 
     def integral_decay(self, x):
         h = self.halflife
-        return (h * (2.0 ** (-x/h))) / math.log(2.0, math.e)
+        return (h * np.power(2.0, (-x/h))) / math.log(2.0, math.e)
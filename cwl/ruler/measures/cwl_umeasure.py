@@ -16,6 +16,10 @@ Note that if costs are in terms of characters - then the EC and ETC will then be
 """
 
 class UMeasureCWLMetric(CWLMetric):
+
+    VECTORIZED = True
+    GAIN_DEPENDENT = False
+
     def __init__(self, L=1000):
         super().__init__()
         self.metric_name = "U-L@{0} ".format(L)
@@ -38,37 +42,23 @@ class UMeasureCWLMetric(CWLMetric):
         return "U-L@{0} ".format(self.L)
 
     def c_vector(self, ranking, worse_case=True):
-        wvec = self.w_vector(ranking, worse_case)
-        cvec = []
-        for i in range(0, len(wvec)-1):
-            if wvec[i] > 0.0:
-                cvec.append(wvec[i+1] / wvec[i])
-            else:
-                cvec.append(0.0)
-
-        cvec.append(0.0)
-        cvec = np.array(cvec)
-        return cvec
+        # the C vector is derived from the W vector, which defines this metric
+        return self.c_from_w(self.w_vector(ranking, worse_case))
 
     def w_vector(self, ranking, worse_case=True):
-        wvec = []
         # to get the positions, cumulative sum the costs..
         # costs are assumed to length of each document
         costs = ranking.get_cost_vector(worse_case)
-        c_costs = np.cumsum(costs)
-        start = 0
-        norm = 0.0
-        for i in range(0, len(c_costs)-1):
-            weight_i = self.pos_decay(start)
-            start = c_costs[i]
-            wvec.append(weight_i)
-            norm = norm + weight_i
-        wvec.append(0.0)
+        c_costs = np.cumsum(costs, axis=-1)
+        # item i starts at the position where item i-1 ended, and the last item has no weight
+        start = np.zeros(costs.shape[:-1] + (1,))
+        wvec = self.pos_decay(np.concatenate((start, c_costs[..., 0:-2]), axis=-1))
+        norm = np.sum(wvec, axis=-1, keepdims=True)
+        wvec = np.concatenate((wvec, np.zeros(costs.shape[:-1] + (1,))), axis=-1)
 
         # now normalize the wvec to sum to one.
-        wvec = np.divide(np.array(wvec), norm)
+        wvec = np.divide(wvec, norm)
         return wvec
 
-
     def pos_decay(self, pos):
-        return max(0.0, (1.0 - (pos / self.L)))
+        return np.maximum(0.0, (1.0 - (pos / self.L)))
@@ -0,0 +1,84 @@
+import importlib
+import inspect
+import os
+
+# the package of the metric modules
+MEASURES_PACKAGE = "cwl.ruler.measures"
+# the module (of ruler.measures) of each class of metric that can be named in a metrics file,
+# which is only imported when one of its metrics is first named
+METRIC_MODULES = {
+    "APCWLMetric": "cwl_ap",
+    "TrAPCWLMetric": "cwl_ap",
+    "BPMCWLMetric": "cwl_bpm",
+    "BPMDCWLMetric": "cwl_bpm",
+    "NDCGCWLMetric": "cwl_dcg",
+    "IFTGoalCWLMetric": "cwl_ift",
+    "IFTRateCWLMetric": "cwl_ift",
+    "IFTGoalRateCWLMetric": "cwl_ift",
+    "INSQCWLMetric": "cwl_insq",
+    "INSTCWLMetric": "cwl_inst",
+    "NERReq8CWLMetric": "cwl_nerr",
+    "NERReq9CWLMetric": "cwl_nerr",
+    "NERReq10CWLMetric": "cwl_nerr",
+    "NERReq11CWLMetric": "cwl_nerr",
+    "NPVCWLMetric": "cwl_npv",
+    "PrecisionCWLMetric": "cwl_precision",
+    "RBPCWLMetric": "cwl_rbp",
+    "RRCWLMetric": "cwl_rr",
+    "SETCWLMetric": "cwl_set",
+    "TBGCWLMetric": "cwl_tbg",
+    "UMeasureCWLMetric": "cwl_umeasure",
+}
+
+# the classes of the metrics looked up so far, and those of the modules that are not in METRIC_MODULES
+# (which are found once per process, see discover_metric_classes)
+_metric_classes = {}
+_discovered_classes = None
+
+
+def discover_metric_classes():
+    """
+    Imports the modules of the measures directory that are not in METRIC_MODULES (e.g. of a metric that has
+    been added to the directory, but not to the registry), the first time it is called.
+    :return: a dict of the classes of the metrics (the subclasses of CWLMetric) defined in those modules, by name
+    """
+    global _discovered_classes
+    if _discovered_classes is None:
+        from cwl.ruler.measures.cwl_metrics import CWLMetric
+        registered = set(METRIC_MODULES.values())
+        measures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "measures")
+        classes = {}
+        for f in sorted(os.listdir(measures_path)):
+            module_name = os.path.splitext(f)[0]
+            if f.endswith(".py") and not f.startswith("__init__") and module_name not in registered:
+                module = importlib.import_module("{0}.{1}".format(MEASURES_PACKAGE, module_name))
+                for name, obj in inspect.getmembers(module, inspect.isclass):
+                    if issubclass(obj, CWLMetric) and obj is not CWLMetric and obj.__module__ == module.__name__:
+                        classes[name] = obj
+        _discovered_classes = classes
+    return _discovered_classes
+
+
+def get_metric_class(class_name):
+    """
+    Looks up the class of a metric by its name, importing its module if it is the first metric of the module.
+    :param class_name: the name of the class (e.g. RBPCWLMetric)
+    :return: the class
+    """
+    if class_name not in _metric_classes:
+        if class_name in METRIC_MODULES:
+            module = importlib.import_module("{0}.{1}".format(MEASURES_PACKAGE, METRIC_MODULES[class_name]))
+            _metric_classes[class_name] = getattr(module, class_name)
+        elif class_name in discover_metric_classes():
+            _metric_classes[class_name] = discover_metric_classes()[class_name]
+        else:
+            raise NameError("The class {0} could not be found.".format(class_name))
+    return _metric_classes[class_name]
+
+
+def metric_classes():
+    """
+    :return: the list of the names and classes of all of the metrics (which imports all of their modules)
+    """
+    names = sorted(set(METRIC_MODULES) | set(discover_metric_classes()))
+    return [(name, get_metric_class(name)) for name in names]
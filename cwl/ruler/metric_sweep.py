@@ -0,0 +1,75 @@
+import decimal
+import numpy as np
+from cwl.ruler.measures.cwl_metrics import residual_scores, score_stacked_vectors
+
+
+def sweep_values(text):
+    """
+    Expands the sweep of a parameter in the metrics file, i.e. start:stop:step, into its values, from start up to
+    and including stop (if it is a whole number of steps from start), e.g. 0.05:0.95:0.05 gives
+    0.05, 0.10, ..., 0.95. The values are decimal, so they are not subject to the rounding of floats.
+    :param text: start:stop:step
+    :return: the list of the values (as text, with the same number of decimal places as the sweep)
+    """
+    try:
+        (start, stop, step) = [decimal.Decimal(part.strip()) for part in text.split(":")]
+    except (ValueError, decimal.InvalidOperation):
+        raise ValueError("The sweep {0} is not start:stop:step".format(text))
+    if step <= 0 or stop < start:
+        raise ValueError("The sweep {0} needs a positive step, and a stop of at least its start".format(text))
+    n = int((stop - start) / step) + 1
+    return [str(start + i * step) for i in range(n)]
+
+
+class MetricSweep(object):
+
+    def __init__(self, metrics):
+        """
+        A family of metrics of the same class, which differ in the value of one parameter
+        (e.g. RBP with theta from 0.05 to 0.95, from RBPCWLMetric(0.05:0.95:0.05) in the metrics file).
+        If the C/W/L vectors of the metrics depend only on their parameters (e.g. RBP, INSQ, P@k and NDCG@k),
+        each metric makes its (cached) vectors as usual, but they are then scored together, as a (values x ranks)
+        matrix times the (topics x ranks) matrices of the gains and costs of the batch (see score_stacked_vectors).
+        Otherwise (e.g. INST and TBG, whose C vector differs from topic to topic) the metrics are scored one by one,
+        as they would be without the sweep.
+        :param metrics: the metrics (each of which holds its own measurements, as if it were scored alone)
+        """
+        self.metrics = metrics
+
+    def stacked(self):
+        """
+        :return: True if the metrics are scored together
+        """
+        metric = self.metrics[0]
+        return len(self.metrics) > 1 and metric.VECTORIZED and not (metric.GAIN_DEPENDENT or metric.COST_DEPENDENT)
+
+    def measure_batch(self, batch):
+        """
+        Measures every topic in the batch (ruler.ranking.RankingBatch) with each metric of the sweep.
+        """
+        if not self.stacked():
+            for metric in self.metrics:
+                metric.measure_batch(batch)
+            return
+        # (with the residuals, the worse and best cases are scored together, as VECTORIZED metrics do)
+        residuals = self.metrics[0].residuals
+        worse_case = None if residuals else True
+        # the gains and costs are resolved once for the whole batch, so the metrics that stop early
+        # (e.g. NDCG@k, which truncate the batch) share their prefixes rather than each resolving them again
+        for get_vector in [batch.get_gain_vector, batch.get_cost_vector, batch.get_cumulative_gain_vector,
+                           batch.get_cumulative_cost_vector]:
+            get_vector(worse_case)
+        vectors = [metric.vectors(batch, worse_case) for metric in self.metrics]
+        scores = score_stacked_vectors(vectors)
+        for i, (metric, vecs) in enumerate(zip(self.metrics, vectors)):
+            metric.batch = batch
+            truncation_error = np.broadcast_to(vecs.truncation_error, scores.shape[:-2])
+            if residuals:
+                metric.batch_scores = scores[0, :, i]
+                metric.batch_residuals = residual_scores(scores[1, :, i], scores[0, :, i])
+                metric.batch_truncation_error = np.max(truncation_error, axis=0)
+            else:
+                metric.batch_scores = scores[:, i]
+                metric.batch_residuals = None
+                metric.batch_truncation_error = truncation_error
+            metric._log_truncation_error(batch.topic_id, metric.batch_truncation_error)
@@ -1,13 +1,19 @@
+import copy
 import numpy as np
 
 
 class Ranking(object):
 
+    __slots__ = ['topic_id', '_gains', '_costs', 'total_qrel_gain', 'total_qrel_rels', 'max_gain', 'min_gain',
+                 'max_cost', 'min_cost', 'n', '_vectors']
+
     def __init__(self, topic_id, gains, costs, max_gain=1.0, min_gain=0.0, max_cost=1.0, min_cost=1.0, max_n=1000):
         """
         The ranking object encapsulates the data about the items in the ranked list.
         The gains and costs vectors should only be accessed through the two getter methods
         as these will construct the list of gains and costs upto MAX_N and handle any unjudged items
+        (with worse_case=None, the getters return the worse and best cases stacked together).
+        The resolved vectors are made once per ranking (and depth), and are shared as read only arrays.
         :param topic_id: a string to denote the topic
         :param gains: a vector of floats to represent the gain associated with each item in the list
         :param costs: a vector of floats to represent the cost of each item in the list
@@ -17,25 +23,54 @@ class Ranking(object):
         :param min_cost: float that is greater than zero (no free lunches)
         """
         self.topic_id = topic_id
-        self._gains = gains
-        self._costs = costs
-        self.total_qrel_gain = 0.0
-        self.total_qrel_rels = 0.0
+        self._gains = np.asarray(gains, dtype=float)
+        self._costs = np.asarray(costs, dtype=float)
         self.max_gain = max_gain
         self.min_gain = min_gain
         self.max_cost = max_cost
         self.min_cost = min_cost
         self.n = max_n
+        self._vectors = {}
         # Calculates a lower bound on the total gain and total relevant items
         # For metrics like AP to be computed accurately, these values need to be
         # manually set after creating the ranking i.e. set w.r.t the QRELs file
         # As the QRELs file has all the KNOWN relevant items.
-        for g in gains:
-            if g > 0.0:
-                self.total_qrel_gain += g
-                self.total_qrel_rels += 1.0
+        relevant = self._gains > 0.0
+        self.total_qrel_gain = float(np.sum(self._gains[relevant]))
+        self.total_qrel_rels = float(np.count_nonzero(relevant))
 
     def get_gain_vector(self, worse_case=True):
+        return self._shared_vector("gains", worse_case, self._resolve_gains)
+
+    def get_cost_vector(self, worse_case=True):
+        return self._shared_vector("costs", worse_case, self._resolve_costs)
+
+    def get_cumulative_gain_vector(self, worse_case=True):
+        return self._shared_vector("cum_gains", worse_case, lambda wc: np.cumsum(self.get_gain_vector(wc), axis=-1))
+
+    def get_cumulative_cost_vector(self, worse_case=True):
+        return self._shared_vector("cum_costs", worse_case, lambda wc: np.cumsum(self.get_cost_vector(wc), axis=-1))
+
+    def _shared_vector(self, name, worse_case, make_vector):
+        """
+        Returns the (read only) vector stored under the name and case for the current depth (n),
+        making it with make_vector(worse_case) on first use.
+        """
+        key = (name, worse_case, self.n)
+        if key not in self._vectors:
+            stacked = self._vectors.get((name, None, self.n))
+            # if both cases have been made, then each case is a view of them (or of the one they share)
+            if worse_case is not None and stacked is not None:
+                vec = stacked[0 if worse_case else -1]
+            else:
+                vec = make_vector(worse_case)
+                vec.setflags(write=False)
+            self._vectors[key] = vec
+        return self._vectors[key]
+
+    def _resolve_gains(self, worse_case):
+        if worse_case is None:
+            return self._stack_cases(self.get_gain_vector)
         # pad out the vector to size n
         # convert all NaNs to min (worse case) or max (best case)
         if worse_case:
@@ -47,7 +82,9 @@ class Ranking(object):
             gains[np.isnan(gains)] = self.max_gain
             return gains
 
-    def get_cost_vector(self, worse_case=True):
+    def _resolve_costs(self, worse_case):
+        if worse_case is None:
+            return self._stack_costs()
         # pad out the vector to size n
         # convert all NaNs to max (worse case) or min (best case)
         if worse_case:
@@ -59,7 +96,27 @@ class Ranking(object):
             costs[np.isnan(costs)] = self.min_cost
             return costs
 
+    def get_padding_gain(self, worse_case=True):
+        if worse_case is None:
+            return self._stack_cases(self.get_padding_gain)
+        # the gain of the items past the end of the ranking
+        return self.min_gain if worse_case else self.max_gain
+
+    def get_padding_cost(self, worse_case=True):
+        if worse_case is None:
+            return self._stack_cases(self.get_padding_cost)
+        # the cost of the items past the end of the ranking
+        return self.max_cost if worse_case else self.min_cost
+
+    def get_depth(self):
+        """
+        :return: the number of items in the ranking (up to n), past which the gain and cost vectors are padded
+        """
+        return min(len(self._gains), self.n)
+
     def get_total_gain(self, worse_case=True):
+        if worse_case is None:
+            return self._stack_cases(self.get_total_gain)
         if worse_case:
             return self.total_qrel_gain
         else:
@@ -67,9 +124,13 @@ class Ranking(object):
             return max(np.sum(self.get_gain_vector(worse_case)), self.total_qrel_gain)
 
     def get_total_cost(self, worse_case=True):
+        if worse_case is None:
+            return self._stack_cases(self.get_total_cost)
         return np.sum(self.get_cost_vector(worse_case))
 
     def get_total_rels(self, worse_case=True):
+        if worse_case is None:
+            return self._stack_cases(self.get_total_rels)
         if worse_case:
             return self.total_qrel_rels
         else:
@@ -79,6 +140,22 @@ class Ranking(object):
             gains[gains > 0.0] = 1.0
             return max(np.sum(gains), self.total_qrel_rels)
 
+    def _stack_cases(self, getter):
+        """
+        Stacks the worse case (first) and the best case (second) along a new leading axis,
+        so both cases can be scored together i.e. when worse_case=None.
+        """
+        return np.stack([np.asarray(getter(True), dtype=float), np.asarray(getter(False), dtype=float)])
+
+    def _stack_costs(self):
+        """
+        Stacks the costs of both cases, unless they resolve the same (i.e. max_cost equals min_cost),
+        in which case the cases share one vector, along a leading axis of one that broadcasts over them.
+        """
+        if self.max_cost == self.min_cost:
+            return self.get_cost_vector(True)[np.newaxis]
+        return self._stack_cases(self.get_cost_vector)
+
     def _pad_trunc_vector(self, vec1, n, val):
         """
         Pads vector 1 up to size n, with the value val
@@ -87,11 +164,24 @@ class Ranking(object):
         :param val: the value to be inserted if padding is required
         :return: the padded vector
         """
-        if len(vec1) < n:
-            vec1 = np.pad(vec1, (0, n-len(vec1)), 'constant', constant_values=val)
-        else:
-            vec1 = vec1[0:n]
-        return np.array(vec1)
+        padded = np.full(n, val, dtype=float)
+        m = min(len(vec1), n)
+        padded[0:m] = vec1[0:m]
+        return padded
+
+    def truncated(self, depth):
+        """
+        Returns a copy of the ranking that only goes down to the given depth (i.e. with n=depth).
+        The totals w.r.t. the qrels are unchanged.
+        :param depth: the new depth of the ranking
+        :return: ruler.ranking.Ranking
+        """
+        ranking = copy.copy(self)
+        ranking.n = depth
+        # the prefixes of the resolved vectors are still valid
+        ranking._vectors = dict(((name, worse_case, depth), vec[..., 0:depth])
+                                for (name, worse_case, n), vec in self._vectors.items() if n == self.n)
+        return ranking
 
     def report(self):
         if self.show_report:
@@ -100,28 +190,225 @@ class Ranking(object):
             print(self.topic_id, self.costs[:10])
 
 
+class RankingBatch(object):
+
+    def __init__(self, rankings):
+        """
+        The ranking batch object stacks the rankings of many topics into two (topics x depth) matrices,
+        one for gains and one for costs, so that metrics can be computed across all topics at once.
+        The matrices only go as deep as the longest ranking, as every row is padding past it; the getters
+        pad the rows up to n when they are asked for, which most metrics avoid (see CWLMetric.vectors).
+        It offers the same getters as Ranking, but they return one row per topic
+        (and the totals return one value per topic).
+        Unjudged items and the padding past the end of each ranking are stored as NaNs,
+        which are resolved to the min or max gain/cost in exactly the same way as Ranking does.
+        :param rankings: a list of ruler.ranking.Ranking objects, which must share the same
+            gain and cost bounds and the same n
+        """
+        first = rankings[0]
+        self.topic_ids = [r.topic_id for r in rankings]
+        self.topic_id = "{0}..{1}".format(self.topic_ids[0], self.topic_ids[-1])
+        self.max_gain = first.max_gain
+        self.min_gain = first.min_gain
+        self.max_cost = first.max_cost
+        self.min_cost = first.min_cost
+        self.n = first.n
+        self.depths = np.array([min(len(r._gains), self.n) for r in rankings], dtype=int)
+        width = int(np.max(self.depths))
+        self._gains = np.full((len(rankings), width), np.nan)
+        self._costs = np.full((len(rankings), width), np.nan)
+        self.total_qrel_gain = np.zeros(len(rankings))
+        self.total_qrel_rels = np.zeros(len(rankings))
+        for i, r in enumerate(rankings):
+            self._gains[i, 0:self.depths[i]] = r._gains[0:self.depths[i]]
+            self._costs[i, 0:self.depths[i]] = r._costs[0:self.depths[i]]
+            self.total_qrel_gain[i] = r.total_qrel_gain
+            self.total_qrel_rels[i] = r.total_qrel_rels
+        # the resolved gain and cost vectors are shared by all the metrics, so they are only made once
+        self._vectors = {}
+
+    def __len__(self):
+        return len(self.topic_ids)
+
+    def get_gain_vector(self, worse_case=True):
+        return self._shared_vector(("gains", worse_case), self._resolve_gains)
+
+    def get_cost_vector(self, worse_case=True):
+        return self._shared_vector(("costs", worse_case), self._resolve_costs)
+
+    def get_cumulative_gain_vector(self, worse_case=True):
+        return self._shared_vector(("cum_gains", worse_case),
+                                   lambda wc: np.cumsum(self.get_gain_vector(wc), axis=-1))
+
+    def get_cumulative_cost_vector(self, worse_case=True):
+        return self._shared_vector(("cum_costs", worse_case),
+                                   lambda wc: np.cumsum(self.get_cost_vector(wc), axis=-1))
+
+    def _shared_vector(self, key, make_vector):
+        """
+        Returns the (read only) vector stored under the key, making it with make_vector(worse_case) on first use.
+        """
+        if key not in self._vectors:
+            stacked = self._vectors.get((key[0], None))
+            # if both cases have been made, then each case is a view of them (or of the one they share)
+            if key[1] is not None and stacked is not None:
+                vec = stacked[0 if key[1] else -1]
+            else:
+                vec = make_vector(key[1])
+            vec.setflags(write=False)
+            self._vectors[key] = vec
+        return self._vectors[key]
+
+    def _resolve_gains(self, worse_case):
+        # convert all NaNs (unjudged and padding) to min (worse case) or max (best case)
+        return self._resolve(self._gains, self.get_padding_gain(worse_case))
+
+    def _resolve_costs(self, worse_case):
+        if worse_case is None:
+            return self._stack_costs()
+        # convert all NaNs (unjudged and padding) to max (worse case) or min (best case)
+        return self._resolve(self._costs, self.get_padding_cost(worse_case))
+
+    def _resolve(self, values, padding, padded=True):
+        """
+        Resolves the NaNs of the stored values to the padding value (of each case, if they are stacked).
+        :param padded: whether the rows are padded up to n, or only go as deep as the longest ranking
+        """
+        padding = np.asarray(padding, dtype=float)
+        padding = padding.reshape(padding.shape[:-1] + (1, 1))
+        values = values[:, 0:self.n]
+        resolved = np.where(np.isnan(values), padding, values)
+        if not padded or values.shape[1] == self.n:
+            return resolved
+        vec = np.empty(resolved.shape[:-1] + (self.n,))
+        vec[..., 0:values.shape[1]] = resolved
+        vec[..., values.shape[1]:] = padding
+        return vec
+
+    def _padded_sum(self, values, padding):
+        """
+        The sum of each (resolved) row up to n, without padding the rows.
+        """
+        padding = np.asarray(padding, dtype=float)
+        resolved = self._resolve(values, padding, padded=False)
+        return np.sum(resolved, axis=-1) + (self.n - resolved.shape[-1]) * padding.reshape(padding.shape[:-1] + (1,))
+
+    def get_padding_gain(self, worse_case=True):
+        if worse_case is None:
+            return self._stack_cases(self.get_padding_gain)[:, np.newaxis]
+        # the gain of the items past the end of the rankings
+        return self.min_gain if worse_case else self.max_gain
+
+    def get_padding_cost(self, worse_case=True):
+        if worse_case is None:
+            return self._stack_cases(self.get_padding_cost)[:, np.newaxis]
+        # the cost of the items past the end of the rankings
+        return self.max_cost if worse_case else self.min_cost
+
+    def get_depth(self):
+        """
+        :return: the number of items in the longest ranking (up to n), past which all the rows are padded
+        """
+        return min(int(np.max(self.depths)), self.n)
+
+    def get_total_gain(self, worse_case=True):
+        if worse_case is None:
+            return self._stack_cases(self.get_total_gain)
+        if worse_case:
+            return self.total_qrel_gain
+        else:
+            return np.maximum(self._padded_sum(self._gains, self.max_gain), self.total_qrel_gain)
+
+    def get_total_cost(self, worse_case=True):
+        if worse_case is None:
+            return self._stack_cases(self.get_total_cost)
+        return self._padded_sum(self._costs, self.get_padding_cost(worse_case))
+
+    def get_total_rels(self, worse_case=True):
+        if worse_case is None:
+            return self._stack_cases(self.get_total_rels)
+        if worse_case:
+            return self.total_qrel_rels
+        else:
+            # convert gain values to rel values
+            rels = np.where(self._gains > 0.0, 1.0, self._gains)
+            return np.maximum(self._padded_sum(rels, 1.0 if self.max_gain > 0.0 else self.max_gain),
+                              self.total_qrel_rels)
+
+    def _stack_cases(self, getter):
+        """
+        Stacks the worse case (first) and the best case (second) along a new leading axis,
+        so both cases can be scored together i.e. when worse_case=None.
+        """
+        return np.stack([np.asarray(getter(True), dtype=float), np.asarray(getter(False), dtype=float)])
+
+    def _stack_costs(self):
+        """
+        Stacks the costs of both cases, unless they resolve the same (i.e. max_cost equals min_cost),
+        in which case the cases share one vector, along a leading axis of one that broadcasts over them.
+        """
+        if self.max_cost == self.min_cost:
+            return self.get_cost_vector(True)[np.newaxis]
+        return self._stack_cases(self.get_cost_vector)
+
+    def get_ranking(self, i):
+        """
+        Returns the i-th topic of the batch as a Ranking object
+        :param i: the row of the batch
+        :return: ruler.ranking.Ranking
+        """
+        depth = self.depths[i]
+        ranking = Ranking(self.topic_ids[i], self._gains[i, 0:depth], self._costs[i, 0:depth], self.max_gain,
+                          self.min_gain, self.max_cost, self.min_cost, self.n)
+        ranking.total_qrel_gain = self.total_qrel_gain[i]
+        ranking.total_qrel_rels = self.total_qrel_rels[i]
+        return ranking
+
+    def truncated(self, depth):
+        """
+        Returns a copy of the batch that only goes down to the given depth (i.e. with n=depth).
+        :param depth: the new depth of the batch
+        :return: ruler.ranking.RankingBatch
+        """
+        batch = copy.copy(self)
+        batch.n = depth
+        batch._gains = self._gains[:, 0:depth]
+        batch._costs = self._costs[:, 0:depth]
+        batch.depths = np.minimum(self.depths, depth)
+        # the prefixes of the resolved vectors are still valid
+        batch._vectors = dict((key, vec[..., 0:depth]) for key, vec in self._vectors.items())
+        return batch
+
+
 class RankingMaker(object):
     """
     This helper class builds Rankings
     """
+
+    __slots__ = ['topic_id', 'gain_handler', 'cost_lookup', 'total_qrel_gain', 'total_qrel_rels', '_gains', '_costs',
+                 '_size', 'max_gain', 'min_gain', 'max_cost', 'min_cost', 'show_report', 'max_n']
+
     def __init__(self, topic_id, gain_handler, cost_dict=None, max_gain=1.0, min_gain=0.0, max_cost=1.0, min_cost=1.0, max_n=1000):
         """
         Iteratively builds up the ranked list of items (via the add function) then returns the final ranking
         by calling get_ranking
         :param topic_id: (string) represents the topic id - should match the topic id in the results file
-        :param gain_handler: seeker.trec_qrel_handler.TrecQrelHandler
+        :param gain_handler: seeker.trec_qrel_handler.TrecQrelHandler (or seeker.trec_qrel_index.TrecQrelIndex)
         :param cost_dict: a dictionary containing the element_type (key) and cost (float, value).
         :param max_gain: if an item is unjudged, when worse_case=False, then set gain to max_gain
         :param max_cost: if an item is unjudged, when worse_case=True, then set cost to max_cost
         :param min_cost: if an item is unjudged, when worse_case=False, then set the cost to min_cost
+        :param max_n: the depth of the ranking, items added past this depth are not kept (as they are never scored)
         """
         self.topic_id = topic_id
         self.gain_handler = gain_handler
         self.cost_lookup = cost_dict
         self.total_qrel_gain = 0.0
         self.total_qrel_rels = 0.0
-        self._gains = []
-        self._costs = []
+        # the buffers grow (geometrically) as items are added, up to max_n
+        self._gains = np.empty(min(max_n, 64), dtype=float)
+        self._costs = np.empty(min(max_n, 64), dtype=float)
+        self._size = 0
         self.max_gain = max_gain
         self.min_gain = min_gain
         self.max_cost = max_cost
@@ -130,16 +417,50 @@ class RankingMaker(object):
         self.max_n = max_n
 
     def add(self, doc_id, element_type):
+        if self._size >= self.max_n:
+            return
+        self._reserve(self._size + 1)
         gain = self.gain_handler.get_value_if_exists(self.topic_id, doc_id)
         # if the item is not judged, then insert a NaN value for the gain
         # the Ranking object will resolve the NaN value as a min or max gain
         if gain is None:
-            self._gains.append(np.nan)
+            self._gains[self._size] = np.nan
+        else:
+            self._gains[self._size] = gain
+
+        self._costs[self._size] = self._get_cost(doc_id, element_type)
+        self._size += 1
+
+    def add_all(self, doc_ids, element_types):
+        """
+        Adds a list of items to the ranking, looking up their gains all at once (see get_values_if_exist).
+        :param doc_ids: a list of doc ids
+        :param element_types: the list of the element types of the items
+        """
+        k = min(len(doc_ids), self.max_n - self._size)
+        if k <= 0:
+            return
+        start = self._size
+        self._reserve(start + k)
+        self._size += k
+        # NaN values are unjudged items, which are resolved by the Ranking object
+        self._gains[start:self._size] = self.gain_handler.get_values_if_exist(self.topic_id, doc_ids[:k])
+        if self.cost_lookup is None:
+            self._costs[start:self._size] = np.nan
         else:
-            self._gains.append(gain)
+            get_cost = self.cost_lookup.get
+            self._costs[start:self._size] = [get_cost(element_type, np.nan) for element_type in element_types[:k]]
 
-        cost = self._get_cost(doc_id, element_type)
-        self._costs.append(cost)
+    def _reserve(self, size):
+        """
+        Grows the buffers (to at least double their size, up to max_n) if they hold fewer than size items.
+        """
+        if size > len(self._gains):
+            capacity = min(self.max_n, max(size, 2 * len(self._gains)))
+            for name in ['_gains', '_costs']:
+                buffer = np.empty(capacity, dtype=float)
+                buffer[0:self._size] = getattr(self, name)[0:self._size]
+                setattr(self, name, buffer)
 
     def _get_cost(self, doc_id, element_type):
         """
@@ -162,7 +483,8 @@ class RankingMaker(object):
         Creates and returns a Ranking given the gains and costs added to the ranked lists.
         :return: ruler.ranking.Ranking
         """
-        ranking = Ranking(self.topic_id, self._gains, self._costs, self.max_gain, self.min_gain, self.max_cost, self.min_cost, self.max_n)
+        # (the items are copied, so the ranking does not keep the spare room of the buffers alive)
+        ranking = Ranking(self.topic_id, self._gains[0:self._size].copy(), self._costs[0:self._size].copy(), self.max_gain, self.min_gain, self.max_cost, self.min_cost, self.max_n)
         ranking.total_qrel_rels = self.gain_handler.get_total_rels(self.topic_id)
         ranking.total_qrel_gain = self.gain_handler.get_total_gains(self.topic_id)
         return ranking
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# the version of the cache, which is part of every key, so that a change in what is stored invalidates the cache
+CACHE_VERSION = 1
+# the number of bytes hashed at once
+DIGEST_BLOCK_SIZE = 1 << 20
+
+
+def file_digest(filename):
+    """
+    :return: the (hex) SHA-256 digest of the contents of the file
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for data in iter(lambda: f.read(DIGEST_BLOCK_SIZE), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def make_key(*parts):
+    """
+    :return: the (hex) SHA-256 digest of the parts (str, or lists of str), each of which is kept apart from the next
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        text = part if isinstance(part, str) else "\x1f".join(part)
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        """
+        An on-disk cache of the measurements of each topic, and of the list of the topics of each run,
+        addressed by the content of their inputs (see make_key), in a SQLite database in the cache_dir.
+        The measurements of a topic are keyed by the ranking of the topic, along with (see cwl_eval.cache_key)
+        the digests of the qrels and cost files, the metrics and the options, so a run that has changed in only
+        a few topics is only measured for those. The list of the topics of a run is keyed by the digest of the
+        result file, so an unchanged run is not even read. Once the size of the entries exceeds max_bytes,
+        those used least recently are evicted.
+        :param cache_dir: the directory of the cache (which is made if it does not exist)
+        :param max_bytes: the size of the cache (of the measurements and lists of topics it stores)
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        # (the timeout lets other processes that share the cache finish their writes, and the cache may be
+        # used from more than one thread, e.g. the thread that feeds the tasks of a worker pool, one at a time)
+        self.db = sqlite3.connect(os.path.join(cache_dir, "cwl_cache.sqlite"), timeout=60.0, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.execute("CREATE TABLE IF NOT EXISTS topics (key TEXT PRIMARY KEY, scores BLOB, size INTEGER, "
+                        "last_used REAL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS runs (key TEXT PRIMARY KEY, topic_ids TEXT, topic_keys TEXT, "
+                        "size INTEGER, last_used REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS topics_last_used ON topics (last_used)")
+        self.db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_topics(self, keys, n_metrics):
+        """
+        Looks up the measurements of topics, marking those found as used.
+        :param keys: the keys of the topics
+        :param n_metrics: the number of metrics
+        :return: a dict of the (metrics x columns) array of the measurements (and residuals) of each key found
+        """
+        with self.lock:
+            found = {}
+            unique = list(set(keys))
+            # (in chunks, as there is a limit on the number of parameters of a query)
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = self.db.execute("SELECT key, scores FROM topics WHERE key IN ({0})".format(
+                    ",".join("?" * len(chunk))), chunk)
+                for key, scores in rows:
+                    found[key] = np.frombuffer(scores, dtype=float).reshape(n_metrics, -1)
+            if found:
+                now = time.time()
+                self.db.executemany("UPDATE topics SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+            return found
+
+    def put_topics(self, keys, values):
+        """
+        :param keys: the keys of the topics
+        :param values: a (topics x metrics x columns) array of the measurements (and residuals) of each topic
+        """
+        with self.lock:
+            now = time.time()
+            rows = []
+            for key, value in zip(keys, np.asarray(values, dtype=float)):
+                data = value.tobytes()
+                rows.append((key, data, len(data) + len(key), now))
+            self.db.executemany("INSERT OR REPLACE INTO topics VALUES (?, ?, ?, ?)", rows)
+
+    def get_run(self, key):
+        """
+        :return: the lists of the topic ids and of the keys of the topics of the run, or None if it is not cached
+        """
+        with self.lock:
+            row = self.db.execute("SELECT topic_ids, topic_keys FROM runs WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE runs SET last_used = ? WHERE key = ?", (time.time(), key))
+            # (the topic ids are separated by newlines, which cannot be in a topic id)
+            return row[0].split("\n") if row[0] else [], row[1].split("\n") if row[1] else []
+
+    def put_run(self, key, topic_ids, topic_keys):
+        topic_ids = "\n".join(topic_ids)
+        topic_keys = "\n".join(topic_keys)
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)",
+                            (key, topic_ids, topic_keys, len(topic_ids) + len(topic_keys) + len(key), time.time()))
+
+    def size(self):
+        """
+        :return: the size (in bytes) of the entries of the cache
+        """
+        return sum(self.db.execute("SELECT COALESCE(SUM(size), 0) FROM {0}".format(table)).fetchone()[0]
+                   for table in ["topics", "runs"])
+
+    def evict(self):
+        """
+        Evicts the entries (of both topics and runs) that were used least recently, until the size of the cache
+        is within max_bytes. The runs whose topics have been evicted are found to be out of date when they are
+        next looked up (and are then read again).
+        """
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+        # (entries used at the same time are evicted in the order they were added)
+        rows = self.db.execute("SELECT 'topics', key, size, last_used, rowid FROM topics UNION ALL "
+                               "SELECT 'runs', key, size, last_used, rowid FROM runs "
+                               "ORDER BY last_used, rowid").fetchall()
+        evicted = {"topics": [], "runs": []}
+        for table, key, size, last_used, rowid in rows:
+            if excess <= 0:
+                break
+            evicted[table].append((key,))
+            excess -= size
+        for table, keys in evicted.items():
+            self.db.executemany("DELETE FROM {0} WHERE key = ?".format(table), keys)
+
+    def close(self):
+        """
+        Writes the entries added to the cache, after evicting those used least recently if it is too large.
+        """
+        with self.lock:
+            self.evict()
+            self.db.commit()
+            self.db.close()
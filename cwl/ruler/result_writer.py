@@ -0,0 +1,274 @@
+import csv
+import io
+import json
+import numpy as np
+
+# the names of the five measurements of each metric, and of their residuals
+MEASUREMENT_NAMES = ["EU", "ETU", "EC", "ETC", "ED"]
+RESIDUAL_NAMES = ["Res" + name for name in MEASUREMENT_NAMES]
+# the topic id of the rows of the means over all topics
+SUMMARY_TOPIC_ID = "all"
+# the topic ids of the rows of the bounds of the bootstrap intervals of the means (see ruler.bootstrap)
+INTERVAL_TOPIC_IDS = ["all:pct-lo", "all:pct-hi", "all:bca-lo", "all:bca-hi"]
+
+
+def format_rows(template, columns):
+    """
+    Formats many rows at once, by %-formatting the template of a row repeated once per row,
+    which is much faster than formatting (or printing) each row in turn.
+    :param template: the %-format of a row, with one field per column (e.g. "%s\t%.4f\n")
+    :param columns: the columns of the rows (lists, or numpy arrays), which are all the same length
+    :return: the formatted rows (str)
+    """
+    n_rows = len(columns[0])
+    values = [None] * (n_rows * len(columns))
+    for j, column in enumerate(columns):
+        values[j::len(columns)] = column.tolist() if isinstance(column, np.ndarray) else column
+    return (template * n_rows) % tuple(values)
+
+
+class ResultWriter(object):
+
+    # the extension of the files written by the writer, and whether they are binary
+    extension = ""
+    binary = False
+
+    def __init__(self, out, metric_names, residuals=False, col_names=False, label_runs=False,
+                 buffer_size=1 << 20):
+        """
+        Writes the measurements of batches of topics (see CWLRuler.measurements). Each row holds the
+        measurements of one metric for one topic, with the rows of a topic together (in the order of the metrics).
+        The rows of a whole batch are formatted at once, and are written in blocks of (at least) buffer_size
+        characters, rather than row by row.
+        :param out: the file to write to (which is not closed by the writer)
+        :param metric_names: the names of the metrics
+        :param residuals: whether the residuals are written
+        :param col_names: whether the names of the columns are written first (if the format has a header)
+        :param label_runs: whether each row is labelled with the run id
+        :param buffer_size: the number of characters that are buffered before they are written
+        """
+        self.out = out
+        self.metric_names = list(metric_names)
+        self.residuals = residuals
+        self.col_names = col_names
+        self.label_runs = label_runs
+        self.buffer_size = buffer_size
+        self._parts = []
+        self._size = 0
+
+    def column_names(self):
+        names = ["Topic", "Metric"] + MEASUREMENT_NAMES + (RESIDUAL_NAMES if self.residuals else [])
+        return (["Run"] + names) if self.label_runs else names
+
+    def write_header(self):
+        pass
+
+    def write_batch(self, topic_ids, scores, residual_scores=None, run_id=None):
+        """
+        Writes the measurements of a batch of topics.
+        :param topic_ids: the list of the topic ids
+        :param scores: a (topics x metrics x 5) array of EU, ETU, EC, ETC and ED
+        :param residual_scores: a (topics x metrics x 5) array of the residuals (if the residuals are written)
+        :param run_id: the run id (if rows are labelled with the run id)
+        """
+        if len(topic_ids):
+            self._write(self.format_batch(*self._columns(topic_ids, scores, residual_scores, run_id)))
+
+    def write_summary(self, summary, run_id=None):
+        """
+        Writes the means of the measurements over all the topics of a run (see ruler.measurement_summary),
+        as a row for each metric with the topic id "all" (as trec_eval does).
+        :param summary: ruler.measurement_summary.MeasurementSummary
+        :param run_id: the run id (if rows are labelled with the run id)
+        """
+        if summary.count:
+            residual_scores = summary.residual_mean[np.newaxis] if self.residuals else None
+            self.write_batch([SUMMARY_TOPIC_ID], summary.mean[np.newaxis], residual_scores, run_id)
+
+    def write_intervals(self, intervals, residual_intervals=None, run_id=None):
+        """
+        Writes the bootstrap confidence intervals of the means of the measurements (see ruler.bootstrap),
+        as rows for each metric with the topic ids all:pct-lo, all:pct-hi, all:bca-lo and all:bca-hi.
+        :param intervals: a (4 x metrics x 5) array of the bounds of the percentile and BCa intervals
+        :param residual_intervals: a (4 x metrics x 5) array of those of the residuals (if the residuals are written)
+        :param run_id: the run id (if rows are labelled with the run id)
+        """
+        self.write_batch(INTERVAL_TOPIC_IDS, intervals, residual_intervals, run_id)
+
+    def format_batch(self, labels, values):
+        """
+        :param labels: the columns of the labels of the rows (the run id, topic id and metric name, as lists)
+        :param values: a (rows x measurements) array of the measurements (and residuals) of each row
+        :return: the formatted rows
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def read_rows(cls, f):
+        """
+        Reads back the rows of a file written by the writer (without run ids), e.g. to patch its measurements.
+        :param f: the file (opened in binary mode if the format is binary)
+        :return: the lists of the topic id and metric name of each row,
+        and the (rows x measurements) array of the measurements (and residuals) of each row
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _split_rows(rows):
+        rows = [row for row in rows if row]
+        if rows and rows[0][0] == "Topic":
+            # (the column names)
+            rows = rows[1:]
+        values = np.array([row[2:] for row in rows], dtype=float).reshape(len(rows), -1)
+        return [row[0] for row in rows], [row[1] for row in rows], values
+
+    def _columns(self, topic_ids, scores, residual_scores=None, run_id=None):
+        n_metrics = len(self.metric_names)
+        labels = [[topic_id for topic_id in topic_ids for _ in range(n_metrics)], self.metric_names * len(topic_ids)]
+        if self.label_runs:
+            labels.insert(0, [run_id] * len(labels[0]))
+        values = np.asarray(scores, dtype=float)
+        if self.residuals:
+            values = np.concatenate((values, np.asarray(residual_scores, dtype=float)), axis=-1)
+        return labels, values.reshape(len(labels[0]), -1)
+
+    def _write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._parts:
+            self.out.write("".join(self._parts))
+            self._parts = []
+            self._size = 0
+
+    def close(self):
+        """
+        Writes anything that is still buffered (the file itself is left open).
+        """
+        self.flush()
+
+
+class TsvResultWriter(ResultWriter):
+    """
+    The tab separated format of cwl-eval, with the measurements to four decimal places.
+    """
+    extension = ".cwl"
+
+    def write_header(self):
+        if self.col_names:
+            self._write("\t".join(self.column_names()) + "\n")
+
+    def format_batch(self, labels, values):
+        template = "%s\t" * len(labels) + "\t".join(["%.4f"] * values.shape[1]) + "\n"
+        return format_rows(template, labels + list(values.T))
+
+    @classmethod
+    def read_rows(cls, f):
+        return cls._split_rows(line.rstrip("\n").split("\t") for line in f)
+
+
+class CsvResultWriter(ResultWriter):
+    """
+    Comma separated values (quoted where needed), with the measurements at full precision.
+    The rows are formatted a batch at a time, as for tsv, but the repr of each float (the shortest string that
+    reads back as the same float) takes about twice as long as %.4f, so this format is about half as fast as tsv.
+    """
+    extension = ".csv"
+
+    def write_header(self):
+        if self.col_names:
+            self._write(",".join(self.column_names()) + "\n")
+
+    def format_batch(self, labels, values):
+        template = "%s," * len(labels) + ",".join(["%r"] * values.shape[1]) + "\n"
+        return format_rows(template, [self._quoted(column) for column in labels] + list(values.T))
+
+    @classmethod
+    def read_rows(cls, f):
+        return cls._split_rows(csv.reader(f))
+
+    def _quoted(self, column):
+        # (only the distinct labels are quoted, as there are few of them)
+        quoted = {}
+        for label in set(column):
+            line = io.StringIO()
+            csv.writer(line, lineterminator="").writerow([label])
+            quoted[label] = line.getvalue()
+        return [quoted[label] for label in column]
+
+
+class JsonlResultWriter(ResultWriter):
+    """
+    JSON Lines, i.e. a JSON object per row, keyed by the column names, with the measurements at full precision
+    (which, as for csv, makes this format about half as fast as tsv).
+    """
+    extension = ".jsonl"
+
+    def format_batch(self, labels, values):
+        names = self.column_names()
+        if not np.all(np.isfinite(values)):
+            # (json writes NaN and Infinity, which the repr of a float does not)
+            rows = zip(zip(*labels), values.tolist())
+            return "".join(json.dumps(dict(zip(names, list(label) + row))) + "\n" for label, row in rows)
+        keys = [json.dumps(name) for name in names]
+        template = ("{" + ", ".join(key + ": %s" for key in keys[:len(labels)]) + ", "
+                    + ", ".join(key + ": %r" for key in keys[len(labels):]) + "}\n")
+        return format_rows(template, [self._quoted(column) for column in labels] + list(values.T))
+
+    def _quoted(self, column):
+        quoted = {label: json.dumps(label) for label in set(column)}
+        return [quoted[label] for label in column]
+
+    @classmethod
+    def read_rows(cls, f):
+        rows = [json.loads(line) for line in f if line.strip()]
+        names = [name for name in MEASUREMENT_NAMES + RESIDUAL_NAMES if rows and name in rows[0]]
+        values = np.array([[row[name] for name in names] for row in rows], dtype=float).reshape(len(rows), -1)
+        return [row["Topic"] for row in rows], [row["Metric"] for row in rows], values
+
+
+class NpzResultWriter(ResultWriter):
+    """
+    A NumPy .npz file (see numpy.load) with an array per column, which is written when the writer is closed.
+    """
+    extension = ".npz"
+    binary = True
+
+    def __init__(self, out, metric_names, residuals=False, col_names=False, label_runs=False,
+                 buffer_size=1 << 20):
+        super(NpzResultWriter, self).__init__(out, metric_names, residuals, col_names, label_runs, buffer_size)
+        self._labels = []
+        self._values = []
+
+    def write_batch(self, topic_ids, scores, residual_scores=None, run_id=None):
+        if len(topic_ids):
+            (labels, values) = self._columns(topic_ids, scores, residual_scores, run_id)
+            self._labels.append(labels)
+            self._values.append(values)
+
+    def close(self):
+        names = self.column_names()
+        n_labels = len(names) - len(MEASUREMENT_NAMES) * (2 if self.residuals else 1)
+        columns = {}
+        for j, name in enumerate(names[:n_labels]):
+            columns[name] = np.array([label for labels in self._labels for label in labels[j]], dtype=str)
+        values = np.concatenate(self._values) if self._values else np.zeros((0, len(names) - n_labels))
+        for j, name in enumerate(names[n_labels:]):
+            columns[name] = values[:, j]
+        np.savez(self.out, **columns)
+        self._labels = []
+        self._values = []
+
+    @classmethod
+    def read_rows(cls, f):
+        with np.load(f) as columns:
+            names = [name for name in MEASUREMENT_NAMES + RESIDUAL_NAMES if name in columns.files]
+            values = np.stack([columns[name] for name in names], axis=1) if names else np.zeros((0, 0))
+            return columns["Topic"].tolist(), columns["Metric"].tolist(), values
+
+
+RESULT_WRITERS = {"tsv": TsvResultWriter, "csv": CsvResultWriter, "jsonl": JsonlResultWriter,
+                  "npz": NpzResultWriter}
@@ -0,0 +1,229 @@
+import math
+import numpy as np
+
+# the number of permutations whose statistics are computed at once (see permutation_test)
+PERMUTATION_BLOCK = 1 << 12
+# the largest number of topics for which the exact distribution of the Wilcoxon statistic is used
+WILCOXON_EXACT_MAX = 50
+CORRECTIONS = ["holm", "bonferroni", "none"]
+
+
+def _betainc(a, b, x):
+    """
+    The regularized incomplete beta function I_x(a, b), by its continued fraction (as in Numerical Recipes).
+    """
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    if x > (a + 1.0) / (a + b + 2.0):
+        # the continued fraction converges quickly below this point, so use the symmetry of the function
+        return 1.0 - _betainc(b, a, 1.0 - x)
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x)) / a
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    f = d
+    for i in range(2, 400):
+        m = i // 2
+        if i % 2:
+            numerator = -((a + m) * (a + b + m) * x) / ((a + 2.0 * m) * (a + 2.0 * m + 1.0))
+        else:
+            numerator = (m * (b - m) * x) / ((a + 2.0 * m - 1.0) * (a + 2.0 * m))
+        d = 1.0 + numerator * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + numerator / c
+        c = c if abs(c) > tiny else tiny
+        f *= c * d
+        if abs(c * d - 1.0) < 1e-15:
+            break
+    return front * f
+
+
+def _normal_sf(z):
+    """
+    The probability that a standard normal variable is greater than z.
+    """
+    return 0.5 * math.erfc(z / math.sqrt(2.0))
+
+
+def _columns(differences):
+    differences = np.asarray(differences, dtype=float)
+    return differences.reshape(len(differences), -1)
+
+
+def t_test(differences):
+    """
+    The paired (two-sided) t-test of each column of differences (i.e. of the measurements of two runs on each topic).
+    :param differences: a (topics x columns) array of the differences between the runs
+    :return: the p-value of each column (NaN where there are fewer than two topics)
+    """
+    d = _columns(differences)
+    n = len(d)
+    p_values = np.full(d.shape[1], np.nan)
+    if n < 2:
+        return p_values
+    mean = np.mean(d, axis=0)
+    sd = np.std(d, axis=0, ddof=1)
+    for j in range(d.shape[1]):
+        if sd[j] == 0.0:
+            # every difference is the same
+            p_values[j] = 1.0 if mean[j] == 0.0 else 0.0
+        else:
+            t = mean[j] / (sd[j] / math.sqrt(n))
+            df = n - 1.0
+            p_values[j] = _betainc(df / 2.0, 0.5, df / (df + t * t))
+    return p_values
+
+
+def _ranks(values):
+    """
+    The ranks (from one) of the values, with tied values given the average of their ranks.
+    """
+    (unique, inverse, counts) = np.unique(values, return_inverse=True, return_counts=True)
+    ends = np.cumsum(counts)
+    return (ends - (counts - 1) / 2.0)[inverse], counts
+
+
+def _wilcoxon_exact_sf(n, w):
+    """
+    The probability that the Wilcoxon signed rank statistic of n topics (without ties) is at least w,
+    from the number of subsets of the ranks 1..n with each sum.
+    """
+    counts = np.zeros(n * (n + 1) // 2 + 1)
+    counts[0] = 1.0
+    for rank in range(1, n + 1):
+        counts[rank:] = counts[rank:] + counts[:-rank].copy()
+    return float(np.sum(counts[int(math.ceil(w)):]) / 2.0 ** n)
+
+
+def wilcoxon_test(differences):
+    """
+    The (two-sided) Wilcoxon signed rank test of each column of differences. As in R and scipy, topics with
+    no difference are dropped. The exact distribution of the statistic is used for up to WILCOXON_EXACT_MAX topics
+    (if there are no ties), otherwise its normal approximation (with the variance corrected for ties).
+    :param differences: a (topics x columns) array of the differences between the runs
+    :return: the p-value of each column (NaN where every difference is zero)
+    """
+    d = _columns(differences)
+    p_values = np.full(d.shape[1], np.nan)
+    for j in range(d.shape[1]):
+        column = d[:, j][d[:, j] != 0.0]
+        n = len(column)
+        if n == 0:
+            continue
+        (ranks, counts) = _ranks(np.abs(column))
+        w_plus = float(np.sum(ranks[column > 0.0]))
+        w = max(w_plus, n * (n + 1) / 2.0 - w_plus)
+        if n <= WILCOXON_EXACT_MAX and np.all(counts == 1):
+            p_values[j] = min(1.0, 2.0 * _wilcoxon_exact_sf(n, w))
+        else:
+            mean = n * (n + 1) / 4.0
+            variance = n * (n + 1) * (2 * n + 1) / 24.0 - np.sum(counts ** 3 - counts) / 48.0
+            p_values[j] = 1.0 if variance <= 0.0 else min(1.0, 2.0 * _normal_sf((w - mean) / math.sqrt(variance)))
+    return p_values
+
+
+def sign_blocks(n_topics, n_permutations, seed=0, block_size=PERMUTATION_BLOCK):
+    """
+    Generates the random signs of the permutations (i.e. which of the two runs each topic is swapped between),
+    in blocks of block_size permutations, so that all the permutations are never held at once.
+    The same seed gives the same signs, so every column (and every pair of runs) is tested on the same permutations.
+    :return: yields (permutations x topics) arrays of +1 and -1
+    """
+    rng = np.random.RandomState(seed)
+    for start in range(0, n_permutations, block_size):
+        n = min(block_size, n_permutations - start)
+        yield rng.randint(0, 2, size=(n, n_topics)).astype(float) * 2.0 - 1.0
+
+
+def permutation_test(differences, n_permutations=10000, seed=0):
+    """
+    The paired (two-sided) randomization test of each column of differences: the mean difference is compared
+    with the mean differences when the runs are swapped on a random subset of the topics.
+    All the columns are tested at once, as a (permutations x topics) matrix of signs times
+    the (topics x columns) matrix of differences.
+    :param differences: a (topics x columns) array of the differences between the runs
+    :param n_permutations: the number of random permutations
+    :param seed: the seed of the random permutations
+    :return: the p-value of each column, i.e. the proportion of the permutations (counting the observed one)
+    with a mean difference at least as large (in magnitude) as the observed one
+    """
+    d = _columns(differences)
+    n = len(d)
+    if n == 0:
+        return np.full(d.shape[1], np.nan)
+    observed = np.abs(np.mean(d, axis=0))
+    # (allows for rounding in the sums of the permutations)
+    threshold = observed - 1e-12 * np.maximum(1.0, observed)
+    at_least = np.zeros(d.shape[1])
+    for signs in sign_blocks(n, n_permutations, seed):
+        at_least += np.sum(np.abs(np.matmul(signs, d)) / n >= threshold, axis=0)
+    return (at_least + 1.0) / (n_permutations + 1.0)
+
+
+def correct(p_values, correction="holm"):
+    """
+    Corrects the p-values of a family of comparisons for multiple comparisons.
+    :param p_values: the p-values of the comparisons (NaN p-values are left out of the family)
+    :param correction: holm, bonferroni or none
+    :return: the corrected p-values
+    """
+    p_values = np.asarray(p_values, dtype=float)
+    if correction not in CORRECTIONS:
+        raise ValueError("Unknown correction {0} (expected one of {1})".format(correction, ", ".join(CORRECTIONS)))
+    tested = ~np.isnan(p_values)
+    m = np.count_nonzero(tested)
+    corrected = p_values.copy()
+    if correction == "none" or m == 0:
+        return corrected
+    if correction == "bonferroni":
+        corrected[tested] = np.minimum(1.0, p_values[tested] * m)
+        return corrected
+    # holm: the i-th smallest p-value is multiplied by m - i, and the p-values are kept in the same order
+    p = p_values[tested]
+    order = np.argsort(p, kind="mergesort")
+    adjusted = np.minimum(1.0, np.maximum.accumulate(p[order] * (m - np.arange(m))))
+    p[order] = adjusted
+    corrected[tested] = p
+    return corrected
+
+
+def paired_tests(differences, n_permutations=10000, seed=0):
+    """
+    :param differences: a (topics x columns) array of the differences between two runs
+    :return: the p-values of the t-test, the Wilcoxon test and the permutation test of each column
+    """
+    return t_test(differences), wilcoxon_test(differences), permutation_test(differences, n_permutations, seed)
+
+
+def _paired_tests_task(task):
+    return paired_tests(*task)
+
+
+def compare_runs(run_scores, pairs, n_permutations=10000, seed=0, correction="holm", pool=None, n_chunks=1):
+    """
+    Compares pairs of runs with paired tests (see paired_tests) of each column of their measurements.
+    :param run_scores: a list of the (topics x columns) arrays of the measurements of each run, on the same topics
+    :param pairs: a list of the pairs of runs (as indexes into run_scores) to compare
+    :param n_permutations: the number of random permutations of the permutation test
+    :param seed: the seed of the random permutations (which are the same for every pair)
+    :param correction: the correction of the p-values for the number of pairs that are compared
+    (holm, bonferroni or none), for each column and test
+    :param pool: a multiprocessing pool, across which the columns are split into n_chunks chunks (or None)
+    :param n_chunks: the number of chunks of columns for each pair
+    :return: the (pairs x columns) arrays of the p-values of the t-test, Wilcoxon and permutation tests
+    """
+    n_columns = run_scores[0].shape[1] if run_scores else 0
+    chunks = np.array_split(np.arange(n_columns), max(1, min(n_chunks, n_columns)))
+    tasks = [((run_scores[b] - run_scores[a])[:, chunk], n_permutations, seed) for a, b in pairs for chunk in chunks]
+    results = pool.map(_paired_tests_task, tasks) if pool is not None else map(_paired_tests_task, tasks)
+    p_values = np.zeros((3, len(pairs), n_columns))
+    for i, tests in enumerate(results):
+        (pair, chunk) = divmod(i, len(chunks))
+        p_values[:, pair, chunks[chunk]] = tests
+    for test in range(3):
+        for column in range(n_columns):
+            p_values[test, :, column] = correct(p_values[test, :, column], correction)
+    return p_values[0], p_values[1], p_values[2]
@@ -0,0 +1,208 @@
+import bz2
+import gzip
+import lzma
+import queue
+import sys
+import threading
+import numpy as np
+
+BLOCK_SIZE = 1 << 16
+# marks the end of each line when the lines of a block are split together
+END_OF_LINE = "\x00"
+# the filename that stands for stdin
+STDIN = "-"
+# the magic bytes that start a compressed file, and the function that opens it for decompression
+COMPRESSION = [(b"\x1f\x8b", gzip.open), (b"BZh", bz2.open), (b"\xfd7zXZ\x00", lzma.open)]
+
+
+def is_stdin(filename):
+    return filename == STDIN
+
+
+def is_compressed(filename):
+    """
+    Checks whether the file is compressed with gzip, bzip2 or xz (from its first bytes).
+    """
+    with open(filename, "rb") as f:
+        magic = f.read(6)
+    return any(magic.startswith(prefix) for prefix, _ in COMPRESSION)
+
+
+class ReadAhead(object):
+
+    def __init__(self, f, block_size=BLOCK_SIZE, depth=8):
+        """
+        Reads a file in a background thread, up to depth blocks ahead, so that reading (e.g. decompressing,
+        which releases the GIL) overlaps with the parsing of the blocks already read.
+        Errors in reading are raised when the block would have been read.
+        :param f: the (binary) file to read
+        :param block_size: the number of bytes to read at once
+        :param depth: the number of blocks that can be waiting to be parsed
+        """
+        self.f = f
+        self.block_size = block_size
+        self.blocks = queue.Queue(depth)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        try:
+            while True:
+                data = self.f.read(self.block_size)
+                if not self._put(data) or not data:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        # (gives up once the reader has been closed, rather than waiting for room forever)
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read(self):
+        """
+        :return: the next block (bytes), which is empty at the end of the file
+        """
+        item = self.blocks.get()
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def read_chunks(filename, block_size=BLOCK_SIZE):
+    """
+    Reads a file (or stdin if the filename is -) in chunks of block_size bytes.
+    Files compressed with gzip, bzip2 or xz are detected (from their first bytes), whatever they are called,
+    and are decompressed as they are read, in a background thread (see ReadAhead).
+    :param filename: the file to read
+    :param block_size: the number of bytes to read at once
+    :return: yields the chunks of the (decompressed) file (bytes)
+    """
+    f = sys.stdin.buffer if is_stdin(filename) else open(filename, "rb")
+    try:
+        magic = f.peek(6)[:6]
+        open_compressed = next((c for prefix, c in COMPRESSION if magic.startswith(prefix)), None)
+        if open_compressed is None:
+            for data in iter(lambda: f.read(block_size), b""):
+                yield data
+            return
+        with open_compressed(f) as cf:
+            reader = ReadAhead(cf, block_size)
+            try:
+                for data in iter(reader.read, b""):
+                    yield data
+            finally:
+                reader.close()
+    finally:
+        if not is_stdin(filename):
+            f.close()
+
+
+def read_blocks(filename, block_size=BLOCK_SIZE):
+    """
+    Reads a file in blocks of (about) block_size bytes, each of which ends at the end of a line.
+    The file may be compressed, or be stdin (see read_chunks).
+    :param filename: the file to read
+    :param block_size: the number of bytes to read at once
+    :return: yields the line number of the first line of each block, and the block (bytes)
+    """
+    line_number = 1
+    rest = b""
+    for data in read_chunks(filename, block_size):
+        data = rest + data
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            rest = data
+            continue
+        block = data[:end]
+        rest = data[end:]
+        yield line_number, block
+        line_number += block.count(b"\n")
+    if rest:
+        yield line_number, rest
+
+
+def malformed_line_error(filename, line_number, n_columns):
+    return ValueError("Malformed line in {0} (expected {1} tab/space separated columns): line {2}".format(
+        filename, n_columns, line_number))
+
+
+def split_columns(block, n_columns, first_line=1, filename="", extra_columns=False):
+    """
+    Splits the columns of all the lines in a block at once. Columns may be separated by any mix of
+    tabs and spaces, and blank lines are skipped.
+    :param block: the block of lines (bytes)
+    :param n_columns: the number of columns of each line
+    :param first_line: the line number of the first line in the block (for reporting malformed lines)
+    :param filename: the name of the file of the block (for reporting malformed lines)
+    :param extra_columns: if True, lines may have more than n_columns columns (which are dropped)
+    :return: the line numbers of the (non blank) lines, and the list of the n_columns columns (lists of str)
+    """
+    text = block.decode("utf-8")
+    if not text.endswith("\n"):
+        text += "\n"
+    n_lines = text.count("\n")
+    # split all of the lines together, with a marker at the end of each line, so that if
+    # every line has n_columns columns, every (n_columns + 1)th item is a marker
+    items = text.replace("\n", " " + END_OF_LINE + "\n").split()
+    if len(items) == n_lines * (n_columns + 1) and items[n_columns::n_columns + 1].count(END_OF_LINE) == n_lines:
+        line_numbers = np.arange(first_line, first_line + n_lines)
+        return line_numbers, [items[c::n_columns + 1] for c in range(n_columns)]
+
+    # otherwise (with blank lines, extra columns or malformed lines), split the lines one at a time
+    line_numbers = []
+    rows = []
+    for i, line in enumerate(text.split("\n")):
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) < n_columns or (len(parts) > n_columns and not extra_columns):
+            raise malformed_line_error(filename, first_line + i, n_columns)
+        line_numbers.append(first_line + i)
+        rows.append(parts[:n_columns])
+    columns = [list(column) for column in zip(*rows)] if rows else [[] for _ in range(n_columns)]
+    return np.array(line_numbers, dtype=np.int64), columns
+
+
+def read_columns(filename, n_columns, extra_columns=False, block_size=BLOCK_SIZE, display_name=None):
+    """
+    Reads a tab/space separated file in large blocks, and splits the columns of each block at once
+    (rather than line by line). Malformed lines are reported with their line numbers (as a ValueError).
+    :param filename: the file to read
+    :param n_columns: the number of columns of each line
+    :param extra_columns: if True, lines may have more than n_columns columns (which are dropped)
+    :param block_size: the number of bytes to read at once
+    :param display_name: the name of the file in the reports of malformed lines (the filename if None)
+    :return: yields the line numbers and the columns of the lines of each block (see split_columns)
+    """
+    display_name = filename if display_name is None else display_name
+    for first_line, block in read_blocks(filename, block_size):
+        line_numbers, columns = split_columns(block, n_columns, first_line, display_name, extra_columns)
+        if len(line_numbers):
+            yield line_numbers, columns
+
+
+def to_floats(values, line_numbers, filename="", name="value"):
+    """
+    Converts a column of strings to a list of floats, reporting the line number of any that are not numbers.
+    """
+    try:
+        return list(map(float, values))
+    except ValueError:
+        for value, line_number in zip(values, line_numbers):
+            try:
+                float(value)
+            except ValueError:
+                raise ValueError("Malformed line in {0}: line {1}: the {2} ({3}) is not a number".format(
+                    filename, line_number, name, value))
+        raise
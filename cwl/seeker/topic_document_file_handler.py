@@ -1,11 +1,21 @@
 import numpy as np
 from cwl.seeker.common_helpers import file_exists
 from cwl.seeker.common_helpers import AutoVivification
+from cwl.seeker.column_file_reader import read_columns, to_floats
 
 
 class TopicDocumentFileHandler(object):
+    # the number of columns of each line, and which of them are the topic, document and value
+    n_columns = 3
+    value_columns = (0, 1, 2)
+
     def __init__(self, filename=None):
         self.data = AutoVivification()
+        # the topic and doc ids interned to integers, with the (sorted) doc ids and values of each topic,
+        # for looking up lists of docs at once (see get_values_if_exist), which is rebuilt when a value changes
+        self._topic_ids = None
+        self._doc_ids = None
+        self._topic_values = None
         if filename:
             self.read_file(filename)
 
@@ -23,16 +33,29 @@ class TopicDocumentFileHandler(object):
         # outputs the topic document and value in a specific way.
         return "%s %s %d\n" % (topic, doc, self.data[topic][doc])
 
+    def _put_in_columns(self, line_numbers, columns, filename=""):
+        # handles the columns of a block of lines (see seeker.column_file_reader.read_columns)
+        (topic_column, doc_column, value_column) = self.value_columns
+        values = to_floats(columns[value_column], line_numbers, filename)
+        for topic, doc, value in zip(columns[topic_column], columns[doc_column], values):
+            self.data[topic][doc] = value
+
     def read_file(self, filename):
         if file_exists(filename):
-            infile = open(filename, "r")
-            while infile:
-                line = infile.readline()
-                if not line:
-                    infile.close()
-                    break
-                else:
-                    self._put_in_line(line)
+            # the file is read in blocks, where the columns of all of the lines in a block are split at once
+            for line_numbers, columns in read_columns(filename, self.n_columns, extra_columns=True):
+                self._put_in_columns(line_numbers, columns, filename)
+            self._intern_ids()
+
+    def read_dict(self, topic_docs):
+        """
+        Adds the values held in memory, as a dict of the docs of each topic, e.g. {topic: {doc: value}}
+        (a later value of a doc replaces an earlier one, as with read_file).
+        """
+        for topic, docs in topic_docs.items():
+            for doc, value in docs.items():
+                self.data[str(topic)][str(doc)] = float(value)
+        self._intern_ids()
 
     def save_file(self, filename, append=False):
         if append:
@@ -50,6 +73,7 @@ class TopicDocumentFileHandler(object):
     def put_value(self, topic, doc, value):
         if topic and doc:
             self.data[topic][doc] = float(value)
+            self._topic_values = None
 
     def get_value(self, topic, doc):
         if topic not in self.data:
@@ -69,6 +93,52 @@ class TopicDocumentFileHandler(object):
         else:
             return None
 
+    def _intern_ids(self):
+        """
+        Interns the topic and doc ids to dense integers, and stores the (sorted) integer doc ids of each topic,
+        along with their values, so that get_values_if_exist can look up a list of docs with one search.
+        """
+        self._topic_ids = {}
+        self._doc_ids = {}
+        self._topic_values = []
+        for topic, docs in self.data.items():
+            doc_ids = []
+            values = []
+            for doc, value in docs.items():
+                # skips the empty entries that get_value leaves for docs that are not judged
+                if isinstance(value, dict):
+                    continue
+                doc_ids.append(self._doc_ids.setdefault(doc, len(self._doc_ids)))
+                values.append(value)
+            doc_ids = np.array(doc_ids, dtype=np.int64)
+            order = np.argsort(doc_ids)
+            self._topic_ids[topic] = len(self._topic_values)
+            self._topic_values.append((doc_ids[order], np.array(values, dtype=float)[order]))
+
+    def get_values_if_exist(self, topic, docs):
+        """
+        Looks up the values of a list of docs for the topic at once.
+        :param topic: the topic id
+        :param docs: a list of doc ids
+        :return: a numpy array of the values of the docs, with NaN for those that do not exist
+        """
+        if self._topic_values is None:
+            self._intern_ids()
+        values = np.full(len(docs), np.nan)
+        t = self._topic_ids.get(topic)
+        if t is None or len(docs) == 0:
+            return values
+        (topic_doc_ids, topic_values) = self._topic_values[t]
+        if len(topic_doc_ids) == 0:
+            return values
+        # docs that are not judged for any topic are -1, which is never found
+        get_doc_id = self._doc_ids.get
+        doc_ids = np.fromiter((get_doc_id(doc, -1) for doc in docs), dtype=np.int64, count=len(docs))
+        positions = np.minimum(np.searchsorted(topic_doc_ids, doc_ids), len(topic_doc_ids) - 1)
+        found = topic_doc_ids[positions] == doc_ids
+        values[found] = topic_values[positions[found]]
+        return values
+
     def get_doc_list(self, topic):
         if self.data[topic]:
             return self.data[topic]
@@ -88,12 +158,14 @@ class TopicDocumentFileHandler(object):
 
     def add_topic_doc(self, topic, doc, value):
         self.data[topic][doc] = value
+        self._topic_values = None
 
     def inc_topic_doc(self, topic, doc, value=1.0):
         if self.data[topic][doc]:
             self.data[topic][doc] = self.data[topic][doc] + value
         else:
             self.data[topic][doc] = value
+        self._topic_values = None
 
     def __str__(self):
         return 'TOPICS READ IN: ' + str(len(self.data))
@@ -0,0 +1,81 @@
+import numpy as np
+from cwl.seeker.column_file_reader import read_columns, to_floats
+
+
+def read_judgements(qrel_file):
+    """
+    Reads the judgements of a TREC qrel file, without building the lookups of a TrecQrelHandler,
+    as they are only compared with those of another version of the qrels (see changed_topics).
+    A later judgement of a doc replaces an earlier one, as with TrecQrelHandler.
+    :param qrel_file: TREC formatted qrel file (which may be compressed, or - for stdin)
+    :return: a dict of the dict of the gain of each judged doc of each topic
+    """
+    judgements = {}
+    for line_numbers, (topics, _, docs, gains) in read_columns(qrel_file, 4, extra_columns=True):
+        for topic, doc, gain in zip(topics, docs, to_floats(gains, line_numbers, qrel_file, "gain")):
+            judgements.setdefault(topic, {})[doc] = gain
+    return judgements
+
+
+def topic_judgements(qrh, topic):
+    """
+    :param qrh: seeker.trec_qrel_handler.TrecQrelHandler or seeker.trec_qrel_index.TrecQrelIndex
+    :return: a dict of the gain of each judged doc of the topic
+    """
+    docs = list(qrh.get_doc_list(topic))
+    gains = qrh.get_values_if_exist(topic, docs)
+    # (skips the docs that are listed, but not judged, e.g. those left by TrecQrelHandler.get_value)
+    return dict((doc, gain) for doc, gain in zip(docs, gains.tolist()) if not np.isnan(gain))
+
+
+def _judged(docs):
+    # (drops the docs that are looked up, but not judged, which TrecQrelHandler.get_value leaves as empty dicts)
+    return dict((doc, gain) for doc, gain in docs.items() if not isinstance(gain, dict))
+
+
+def _topic_judgements(qrels, topic):
+    if isinstance(qrels, dict):
+        return qrels.get(topic, {})
+    if hasattr(qrels, "data"):
+        # (the dicts of a TrecQrelHandler are compared as they are, which is much faster)
+        return qrels.data[topic] if topic in qrels.data else {}
+    return topic_judgements(qrels, topic)
+
+
+def changed_topics(previous, current):
+    """
+    Finds the topics whose judgements differ between two versions of the qrels
+    (i.e. with docs that are judged in only one of them, or whose gains differ).
+    :param previous: the previous qrels (TrecQrelHandler, TrecQrelIndex, or the judgements of read_judgements)
+    :param current: the current qrels
+    :return: the set of the ids of the topics that have changed
+    """
+    topics = set()
+    for qrels in [previous, current]:
+        topics.update(qrels.keys() if isinstance(qrels, dict) else qrels.get_topic_list())
+    changed = set()
+    for topic in topics:
+        (before, after) = (_topic_judgements(previous, topic), _topic_judgements(current, topic))
+        if before != after and _judged(before) != _judged(after):
+            changed.add(topic)
+    return changed
+
+
+def apply_qrel_delta(qrh, delta_file):
+    """
+    Applies the judgements of a delta file (a TREC qrel file of the judgements that are new or have changed since
+    the qrels were made) to the qrels, where each judgement of the delta file replaces that of the qrels.
+    :param qrh: the qrels (seeker.trec_qrel_handler.TrecQrelHandler, as a qrel index cannot be changed)
+    :param delta_file: TREC formatted qrel file (which may be compressed, or - for stdin)
+    :return: the set of the ids of the topics whose judgements have changed
+    """
+    if not hasattr(qrh, "read_dict"):
+        raise ValueError("A qrel delta file cannot be applied to a qrel index (compile the updated qrel file instead)")
+    delta = read_judgements(delta_file)
+    changed = set()
+    for topic, judgements in delta.items():
+        previous = _topic_judgements(qrh, topic)
+        if any(previous.get(doc) != gain for doc, gain in judgements.items()):
+            changed.add(topic)
+    qrh.read_dict(delta)
+    return changed
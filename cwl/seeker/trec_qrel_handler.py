@@ -4,6 +4,8 @@ from cwl.seeker.topic_document_file_handler import TopicDocumentFileHandler
 
 
 class TrecQrelHandler(TopicDocumentFileHandler):
+    n_columns = 4
+    value_columns = (0, 2, 3)
 
     def __init__(self, filename=None):
         super(TrecQrelHandler, self).__init__(filename)
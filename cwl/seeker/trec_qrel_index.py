@@ -0,0 +1,245 @@
+import argparse
+import mmap
+import struct
+import numpy as np
+from cwl.seeker.column_file_reader import is_stdin, read_columns, to_floats
+
+# The layout of a qrel index file (all little endian, and each section starts on an 8 byte boundary):
+#   header: magic, version, number of topics, number of judgements, bytes of topic ids, width of the doc ids
+#   topic id offsets (uint64, topics + 1), topic ids (utf-8, sorted)
+#   judgement offsets of each topic (uint64, topics + 1)
+#   total gain of each topic (float64, topics), number of relevant items of each topic (float64, topics)
+#   doc ids (utf-8, null padded to the width of the longest, sorted within each topic)
+#   gains (float32, judgements)
+# The doc ids have a fixed width so that those of a topic can be searched as a numpy array.
+MAGIC = b"CWLQRELS"
+VERSION = 2
+HEADER = struct.Struct("<8sI4xQQQQ")
+
+
+def _padding(n):
+    return b"\0" * (-n % 8)
+
+
+def _offsets(ids):
+    offsets = np.zeros(len(ids) + 1, dtype="<u8")
+    np.cumsum([len(i) for i in ids], out=offsets[1:])
+    return offsets
+
+
+def is_qrel_index(filename):
+    """
+    Checks whether the file is a qrel index (see compile_qrel_index), rather than a TREC qrel file.
+    """
+    if is_stdin(filename):
+        return False
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def compile_qrel_index(qrel_file, index_file):
+    """
+    Compiles a TREC qrel file (Topic Iteration Document Judgement) into a binary index that
+    TrecQrelIndex can open without parsing. As with TrecQrelHandler, a later judgement of a document
+    replaces an earlier one. The gains are stored as float32, the totals of each topic as float64.
+    :param qrel_file: TREC formatted qrel file (which may be compressed, or - for stdin)
+    :param index_file: the file to save the index to
+    """
+    qrels = {}
+    for line_numbers, (topics, _, docs, judgements) in read_columns(qrel_file, 4, extra_columns=True):
+        for topic, doc, judgement in zip(topics, docs, to_floats(judgements, line_numbers, qrel_file, "gain")):
+            qrels.setdefault(topic, {})[doc] = judgement
+
+    topics = sorted(qrels, key=lambda t: t.encode("utf-8"))
+    topic_ids = [t.encode("utf-8") for t in topics]
+    doc_ids = []
+    gains = []
+    topic_starts = [0]
+    total_gains = []
+    total_rels = []
+    for topic in topics:
+        judgements = qrels[topic]
+        for doc, gain in sorted((d.encode("utf-8"), g) for d, g in judgements.items()):
+            doc_ids.append(doc)
+            gains.append(gain)
+        topic_starts.append(len(doc_ids))
+        total_gains.append(sum(judgements.values()))
+        total_rels.append(float(sum(1 for g in judgements.values() if g > 0.0)))
+
+    topic_blob = b"".join(topic_ids)
+    doc_width = max([len(doc) for doc in doc_ids] + [1])
+    doc_blob = np.array(doc_ids, dtype="S{}".format(doc_width)).tobytes()
+    with open(index_file, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(topic_ids), len(doc_ids), len(topic_blob), doc_width))
+        f.write(_offsets(topic_ids).tobytes())
+        f.write(topic_blob + _padding(len(topic_blob)))
+        f.write(np.array(topic_starts, dtype="<u8").tobytes())
+        f.write(np.array(total_gains, dtype="<f8").tobytes())
+        f.write(np.array(total_rels, dtype="<f8").tobytes())
+        f.write(doc_blob + _padding(len(doc_blob)))
+        gain_bytes = np.array(gains, dtype="<f4").tobytes()
+        f.write(gain_bytes + _padding(len(gain_bytes)))
+
+
+class _TopicIds(object):
+    """
+    The (sorted) topic ids in the index as a sequence of bytes.
+    """
+
+    def __init__(self, mm, offsets, start):
+        self.mm = mm
+        self.offsets = offsets
+        self.start = start
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.mm[self.start + int(self.offsets[i]):self.start + int(self.offsets[i + 1])]
+
+
+class TrecQrelIndex(object):
+
+    def __init__(self, filename):
+        """
+        Opens a qrel index (see compile_qrel_index) with mmap, and provides the same lookups as TrecQrelHandler.
+        Only the topic ids are read in, so opening the index takes next to no time,
+        and the pages of the index are shared by all of the processes that open it.
+        Note that the gains are float32, so non-integer gains may differ slightly from those of TrecQrelHandler.
+        :param filename: the qrel index file
+        """
+        self.filename = filename
+        self._open()
+
+    def _open(self):
+        with open(self.filename, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, n_topics, n_judgements, topic_bytes, doc_width) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a qrel index (version {})".format(self.filename, VERSION))
+
+        offset = HEADER.size
+
+        def section(dtype, count):
+            nonlocal offset
+            array = np.frombuffer(self._mm, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes + len(_padding(array.nbytes))
+            return array
+
+        topic_offsets = section("<u8", n_topics + 1)
+        topic_ids = _TopicIds(self._mm, topic_offsets, offset)
+        offset += topic_bytes + len(_padding(topic_bytes))
+        self._topic_starts = section("<u8", n_topics + 1)
+        self._total_gains = section("<f8", n_topics)
+        self._total_rels = section("<f8", n_topics)
+        self._doc_ids = section("S{}".format(doc_width), n_judgements)
+        self._gains = section("<f4", n_judgements)
+        self._topics = {topic_ids[i].decode("utf-8"): i for i in range(n_topics)}
+
+    def __getstate__(self):
+        # the index is opened again (rather than copied) in other processes
+        return {"filename": self.filename}
+
+    def __setstate__(self, state):
+        self.filename = state["filename"]
+        self._open()
+
+    def _find(self, topic, doc):
+        """
+        :return: the position of the judgement of the document for the topic, or None if it is not judged
+        """
+        i = self._topics.get(topic)
+        if i is None:
+            return None
+        lo = int(self._topic_starts[i])
+        hi = int(self._topic_starts[i + 1])
+        key = doc.encode("utf-8")
+        j = lo + int(np.searchsorted(self._doc_ids[lo:hi], key))
+        if j < hi and self._doc_ids[j] == key:
+            return j
+        return None
+
+    def get_value(self, topic, doc):
+        j = self._find(topic, doc)
+        if j is None:
+            return 0.0
+        return float(self._gains[j])
+
+    def get_value_if_exists(self, topic, doc):
+        j = self._find(topic, doc)
+        if j is None:
+            return None
+        return float(self._gains[j])
+
+    def get_values_if_exist(self, topic, docs):
+        """
+        Looks up the values of a list of docs for the topic at once.
+        :param topic: the topic id
+        :param docs: a list of doc ids
+        :return: a numpy array of the values of the docs, with NaN for those that do not exist
+        """
+        values = np.full(len(docs), np.nan)
+        i = self._topics.get(topic)
+        if i is None or len(docs) == 0:
+            return values
+        lo = int(self._topic_starts[i])
+        hi = int(self._topic_starts[i + 1])
+        if lo == hi:
+            return values
+        # the doc ids of the topic are sorted, and contain no null bytes, so sort the same as numpy bytes
+        # (a query doc that is longer than the width of the index sorts after, and differs from, its prefix)
+        topic_docs = self._doc_ids[lo:hi]
+        query = np.array([doc.encode("utf-8") for doc in docs], dtype=bytes)
+        positions = np.minimum(np.searchsorted(topic_docs, query), hi - lo - 1)
+        found = topic_docs[positions] == query
+        values[found] = self._gains[lo + positions[found]]
+        return values
+
+    def get_topic_list(self):
+        return list(self._topics)
+
+    def get_doc_list(self, topic):
+        i = self._topics.get(topic)
+        if i is None:
+            return []
+        docs = self._doc_ids[int(self._topic_starts[i]):int(self._topic_starts[i + 1])]
+        return [doc.decode("utf-8") for doc in docs.tolist()]
+
+    def get_total_gains(self, topic):
+        i = self._topics.get(topic)
+        if i is None:
+            return 0.0
+        return float(self._total_gains[i])
+
+    def get_total_rels(self, topic):
+        i = self._topics.get(topic)
+        if i is None:
+            return 0.0
+        return float(self._total_rels[i])
+
+    def validate_gains(self, min_gain=0.0, max_gain=1.0):
+        """
+        Checks to ensure that all gains are between min_gain and max_gain (at the float32 precision of the gains).
+        """
+        if len(self._gains) == 0:
+            return
+        gain = self._gains.max()
+        if gain > np.float32(max_gain):
+            raise ValueError("Detected a gain value ({})  greater than the maximum ({}).\n"
+                             "Please check your input gain file".format(float(gain), max_gain))
+        gain = self._gains.min()
+        if gain < np.float32(min_gain):
+            raise ValueError("Detected a gain value ({}) less than minimum ({}).\n "
+                             "Please check your input gain file.".format(float(gain), min_gain))
+
+    def __str__(self):
+        return 'TOPICS READ IN: ' + str(len(self._topics))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Compiles a TREC qrel file into a qrel index for cwl-eval")
+    arg_parser.add_argument("qrel_file", help="TREC formatted qrel file. Four column tab/space sep file with fields:"
+                                              " topic_id unused doc_id gain")
+    arg_parser.add_argument("index_file", help="The file to save the qrel index to.")
+    args = arg_parser.parse_args()
+    compile_qrel_index(args.qrel_file, args.index_file)
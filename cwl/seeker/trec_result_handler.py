@@ -20,6 +20,8 @@ def process_trec_line(line):
 
 
 class TrecResultHandler(TopicDocumentFileHandler):
+    n_columns = 6
+    value_columns = (0, 2, 4)
 
     def __init__(self, filename=None):
         super(TrecResultHandler, self).__init__(filename)
@@ -0,0 +1,293 @@
+import heapq
+import itertools
+import operator
+import os
+import shutil
+import tempfile
+from cwl.seeker.column_file_reader import BLOCK_SIZE, is_stdin, read_blocks, read_columns, to_floats, split_columns
+
+
+def topic_runs(block):
+    """
+    Finds the runs of lines of the same topic in a block of lines, without splitting every line.
+    From the start of a run, the last line of the topic within the next step bytes is found (doubling the step
+    while that is the last line of the step), and the run extends to it if there are as many lines up to it
+    as there are lines that start with the topic_id (otherwise, the run is extended line by line).
+    :param block: the block of lines (bytes)
+    :return: yields the topic_id (bytes) of each run of lines
+    """
+    n = len(block)
+    pos = 0
+    while pos < n:
+        end = block.find(b"\n", pos) + 1 or n
+        parts = block[pos:end].split(None, 1)
+        if not parts:
+            pos = end
+            continue
+        topic_id = parts[0]
+        prefix = block[pos:pos + len(topic_id) + 1]
+        if not prefix.startswith(topic_id) or prefix[-1:] not in (b" ", b"\t"):
+            # the line starts with whitespace (so is a run of its own)
+            yield topic_id
+            pos = end
+            continue
+        key = b"\n" + prefix
+        step = 1024
+        while end < n:
+            hi = min(end + step, n)
+            hi = block.find(b"\n", hi - 1) + 1 or n
+            last = block.rfind(key, end - 1, hi - 1)
+            if last < 0:
+                break
+            last = block.find(b"\n", last + 1) + 1 or n
+            if block.count(key, end - 1, last - 1) != block.count(b"\n", end - 1, last - 1):
+                # the topic appears again after another topic
+                while block.startswith(key, end - 1):
+                    end = block.find(b"\n", end) + 1 or n
+                break
+            end = last
+            if last < hi:
+                break
+            step *= 2
+        yield topic_id
+        pos = end
+
+
+class DescendingDocId(object):
+    """
+    Wraps a doc id so that doc ids sort in descending order (for the tie breaks of the merge).
+    """
+    __slots__ = ['doc_id']
+
+    def __init__(self, doc_id):
+        self.doc_id = doc_id
+
+    def __lt__(self, other):
+        return self.doc_id > other.doc_id
+
+    def __eq__(self, other):
+        return self.doc_id == other.doc_id
+
+
+class TrecResultSorter(object):
+
+    def __init__(self, max_lines=1000000, temp_dir=None, block_size=BLOCK_SIZE):
+        """
+        Groups the lines of a TREC results file by topic, and orders the items of each topic by score,
+        breaking ties on the doc id, both in descending order (as trec_eval does). The rank column is ignored.
+        The topics are kept in the order in which they first appear in the file.
+        If the lines of each topic are already together, the file is read topic by topic,
+        and only the topics whose items are out of order are sorted (so sorted files are just read through).
+        Otherwise, the file is sorted in chunks of max_lines lines, and if there is more than one chunk,
+        the sorted chunks are written to temporary files and merged (i.e. an external merge sort).
+        The file is read in blocks of block_size bytes (see seeker.column_file_reader).
+        A compressed file is read as it is decompressed, without a temporary file (so if its topics are grouped,
+        it is decompressed twice, once to check the topic ids and once to read the topics).
+        Stdin can only be read once, so it is copied to a temporary file as the topic ids are checked,
+        and the topics are then read from the temporary file.
+        :param max_lines: the number of lines that are sorted in memory at once
+        :param temp_dir: the directory in which to write the sorted chunks (the system default if None)
+        :param block_size: the number of bytes to read at once
+        """
+        self.max_lines = max_lines
+        self.temp_dir = temp_dir
+        self.block_size = block_size
+
+    def topics(self, results_file):
+        """
+        :param results_file: TREC formatted results file (which may be compressed, or - for stdin)
+        :return: yields the topic_id, and the lists of the doc_ids and element_types of the items of each topic,
+        in order
+        """
+        if is_stdin(results_file):
+            return self._spooled_topics(results_file)
+        if self.is_grouped(results_file):
+            return self._grouped_topics(results_file)
+        return self._sorted_topics(results_file)
+
+    def is_grouped(self, results_file, spool=None):
+        """
+        Checks whether the lines of each topic are together in the results file (only reading the topic ids).
+        :param spool: if given, a (binary) file to which the whole of the results file is copied as it is read
+        """
+        seen = set()
+        curr_topic_id = None
+        grouped = True
+        for first_line, block in read_blocks(results_file, self.block_size):
+            if spool is not None:
+                spool.write(block)
+            if not grouped:
+                continue
+            for topic_id in topic_runs(block):
+                if topic_id != curr_topic_id:
+                    if topic_id in seen:
+                        grouped = False
+                        break
+                    seen.add(topic_id)
+                    curr_topic_id = topic_id
+            if not grouped and spool is None:
+                break
+        return grouped
+
+    def _spooled_topics(self, results_file):
+        (fd, spool_file) = tempfile.mkstemp(prefix="cwl_spool_", dir=self.temp_dir)
+        try:
+            with os.fdopen(fd, "wb") as spool:
+                grouped = self.is_grouped(results_file, spool)
+            if grouped:
+                topics = self._grouped_topics(spool_file, results_file)
+            else:
+                topics = self._sorted_topics(spool_file, results_file)
+            for topic in topics:
+                yield topic
+        finally:
+            os.remove(spool_file)
+
+    def _segments(self, results_file, display_name=None):
+        """
+        Reads the results file in blocks.
+        :param display_name: the name of the results file in the reports of malformed lines
+        :return: yields the topic_id, and the lists of the doc_ids, element_types and scores,
+        of each run of lines of the same topic in each block
+        """
+        display_name = results_file if display_name is None else display_name
+        for line_numbers, columns in read_columns(results_file, 6, block_size=self.block_size,
+                                                  display_name=display_name):
+            for segment in self._column_segments(line_numbers, columns, display_name):
+                yield segment
+
+    def _column_segments(self, line_numbers, columns, display_name):
+        """
+        :return: yields the topic_id, and the lists of the doc_ids, element_types and scores,
+        of each run of lines of the same topic in the columns of a block
+        """
+        (topic_ids, element_types, doc_ids, ranks, scores, run_ids) = columns
+        scores = to_floats(scores, line_numbers, display_name, "score")
+        changes = itertools.compress(itertools.count(1), map(operator.ne, topic_ids[1:], topic_ids))
+        bounds = [0] + list(changes) + [len(topic_ids)]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield topic_ids[start], doc_ids[start:end], element_types[start:end], scores[start:end]
+
+    def topics_in_memory(self, data, display_name="results"):
+        """
+        Groups and orders the items of a results file that is held in memory (e.g. one sent to cwl-eval serve)
+        as topics does, without reading or writing any files.
+        :param data: the lines of a TREC formatted results file (bytes)
+        :param display_name: the name of the results in the reports of malformed lines
+        :return: yields the topic_id, and the lists of the doc_ids and element_types of the items of each topic,
+        in order
+        """
+        line_numbers, columns = split_columns(data, 6, 1, display_name)
+        # the segments of each topic, in order of first appearance
+        topics = {}
+        segments = self._column_segments(line_numbers, columns, display_name) if len(line_numbers) else []
+        for segment in segments:
+            topics.setdefault(segment[0], []).append(segment)
+        for topic_id, segments in topics.items():
+            yield self._ordered(topic_id, segments)
+
+    def _grouped_topics(self, results_file, display_name=None):
+        curr_topic_id = None
+        segments = []
+        for segment in self._segments(results_file, display_name):
+            if segment[0] != curr_topic_id:
+                if curr_topic_id is not None:
+                    yield self._ordered(curr_topic_id, segments)
+                curr_topic_id = segment[0]
+                segments = []
+            segments.append(segment)
+        if curr_topic_id is not None:
+            yield self._ordered(curr_topic_id, segments)
+
+    def _ordered(self, topic_id, segments):
+        """
+        Orders the items of a topic (from one or more segments) by score and doc id (descending),
+        unless they are already in order.
+        """
+        if len(segments) == 1:
+            (_, doc_ids, element_types, scores) = segments[0]
+        else:
+            doc_ids = [doc_id for segment in segments for doc_id in segment[1]]
+            element_types = [element_type for segment in segments for element_type in segment[2]]
+            scores = [score for segment in segments for score in segment[3]]
+
+        if not any(map(operator.lt, scores, scores[1:])):
+            ties = itertools.compress(itertools.count(), map(operator.eq, scores, scores[1:]))
+            if all(doc_ids[i] >= doc_ids[i + 1] for i in ties):
+                return topic_id, doc_ids, element_types
+        order = sorted(range(len(doc_ids)), key=doc_ids.__getitem__, reverse=True)
+        order.sort(key=lambda i: -scores[i])
+        return topic_id, [doc_ids[i] for i in order], [element_types[i] for i in order]
+
+    def _sorted_topics(self, results_file, display_name=None):
+        # the items of each topic (in order of first appearance) since the last chunk was written,
+        # where each item is the doc_id, element_type and the negated score (so that items sort in ascending order)
+        topics = {}
+        n_items = 0
+        chunk_dir = None
+        chunk_files = []
+        display_name = results_file if display_name is None else display_name
+        try:
+            for line_numbers, columns in read_columns(results_file, 6, block_size=self.block_size,
+                                                      display_name=display_name):
+                # (a chunk is only written if there are more lines to read)
+                if n_items >= self.max_lines:
+                    if chunk_dir is None:
+                        chunk_dir = tempfile.mkdtemp(prefix="cwl_sort_", dir=self.temp_dir)
+                    chunk_files.append(self._write_chunk(topics, chunk_dir, len(chunk_files)))
+                    topics = {topic_id: [] for topic_id in topics}
+                    n_items = 0
+                (topic_ids, element_types, doc_ids, ranks, scores, run_ids) = columns
+                scores = to_floats(scores, line_numbers, display_name, "score")
+                for topic_id, item in zip(topic_ids, zip(doc_ids, element_types, map(operator.neg, scores))):
+                    items = topics.get(topic_id)
+                    if items is None:
+                        items = topics[topic_id] = []
+                    items.append(item)
+                n_items += len(topic_ids)
+
+            if not chunk_files:
+                for topic_id, items in topics.items():
+                    self._sort_items(items)
+                    yield topic_id, [item[0] for item in items], [item[1] for item in items]
+                return
+
+            # merge the chunks (including the items not yet written), which are sorted by topic index then item
+            topic_ids = list(topics)
+            chunks = [self._chunk_items(topics)] + [self._read_chunk(f) for f in chunk_files]
+            merged = heapq.merge(*chunks, key=lambda item: (item[0], item[3], DescendingDocId(item[1])))
+            for index, items in itertools.groupby(merged, key=operator.itemgetter(0)):
+                items = list(items)
+                yield topic_ids[index], [item[1] for item in items], [item[2] for item in items]
+        finally:
+            if chunk_dir is not None:
+                shutil.rmtree(chunk_dir, ignore_errors=True)
+
+    def _sort_items(self, items):
+        # by score, then by doc_id (both descending)
+        items.sort(key=operator.itemgetter(0), reverse=True)
+        items.sort(key=operator.itemgetter(2))
+
+    def _chunk_items(self, topics):
+        """
+        :return: yields the index of the topic, and the doc_id, element_type and negated score, of each item
+        in order (by topic index, then score and doc_id)
+        """
+        for index, items in enumerate(topics.values()):
+            self._sort_items(items)
+            for doc_id, element_type, score in items:
+                yield index, doc_id, element_type, score
+
+    def _write_chunk(self, topics, chunk_dir, i):
+        chunk_file = os.path.join(chunk_dir, "chunk{0}".format(i))
+        with open(chunk_file, "w") as cf:
+            for item in self._chunk_items(topics):
+                # (repr writes the score so that it is read back exactly)
+                cf.write("{0} {1} {2} {3!r}\n".format(*item))
+        return chunk_file
+
+    def _read_chunk(self, chunk_file):
+        with open(chunk_file, "r") as cf:
+            for line in cf:
+                (index, doc_id, element_type, score) = line.split()
+                yield int(index), doc_id, element_type, float(score)
@@ -0,0 +1,55 @@
+import unittest
+import sys
+import numpy as np
+sys.path.insert(0,'./')
+
+from cwl.ruler.bootstrap import resample_counts, bootstrap_means, bootstrap_intervals
+
+
+class TestBootstrap(unittest.TestCase):
+
+    def setUp(self):
+        self.values = np.random.RandomState(1).exponential(1.0, size=(40, 3))
+
+    def test_means_are_those_of_the_resamples(self):
+        counts = np.concatenate(list(resample_counts(40, 100, seed=3, block_size=30)))
+        self.assertEqual(counts.shape, (100, 40))
+        self.assertTrue(np.all(np.sum(counts, axis=1) == 40))
+        means = bootstrap_means(self.values, 100, seed=3)
+        self.assertTrue(np.allclose(means, np.matmul(counts, self.values) / 40.0))
+        # the same seed gives the same resamples
+        self.assertTrue(np.array_equal(means, bootstrap_means(self.values, 100, seed=3)))
+        self.assertFalse(np.array_equal(means, bootstrap_means(self.values, 100, seed=4)))
+
+    def test_intervals_of_a_normal_sample(self):
+        values = np.random.RandomState(2).normal(0.5, 1.0, size=(400, 1))
+        intervals = bootstrap_intervals(values, 4000)[:, 0]
+        (mean, se) = (np.mean(values), np.std(values) / np.sqrt(400))
+        # (both are close to the normal interval, as the sample is large and not skewed)
+        for lower, upper in [intervals[0:2], intervals[2:4]]:
+            self.assertAlmostEqual(lower, mean - 1.96 * se, delta=0.2 * se)
+            self.assertAlmostEqual(upper, mean + 1.96 * se, delta=0.2 * se)
+        narrower = bootstrap_intervals(values, 4000, confidence=0.5)[:, 0]
+        self.assertTrue(narrower[0] > intervals[0] and narrower[1] < intervals[1])
+
+    def test_bca_interval_follows_the_skew(self):
+        intervals = bootstrap_intervals(self.values, 4000)
+        self.assertEqual(intervals.shape, (4, 3))
+        mean = np.mean(self.values, axis=0)
+        self.assertTrue(np.all(intervals[0] < mean) and np.all(intervals[1] > mean))
+        # the means of an exponential sample are skewed to the right, and so the BCa interval is shifted to the right
+        self.assertTrue(np.all(intervals[2] > intervals[0]) and np.all(intervals[3] > intervals[1]))
+
+    def test_intervals_keep_the_shape_of_the_measurements(self):
+        values = np.zeros((10, 2, 5))
+        values[:, 1, :] = np.arange(10)[:, np.newaxis]
+        intervals = bootstrap_intervals(values, 200)
+        self.assertEqual(intervals.shape, (4, 2, 5))
+        # every resample of a constant has the same mean
+        self.assertTrue(np.all(intervals[:, 0, :] == 0.0))
+        self.assertTrue(np.all(intervals[:, 1, :] < 9.0) and np.all(intervals[:, 1, :] > 0.0))
+        self.assertTrue(np.all(np.isnan(bootstrap_intervals(np.zeros((0, 2)), 200))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import bz2
+import gzip
+import io
+import lzma
+import os
+import shutil
+import sys
+import tempfile
+sys.path.insert(0,'./')
+
+from cwl.seeker.column_file_reader import read_blocks, read_columns, to_floats
+
+
+class TestColumnFileReader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_file(self, text):
+        filename = os.path.join(self.tmp_dir, "columns")
+        with open(filename, "w") as f:
+            f.write(text)
+        return filename
+
+    def read_all(self, filename, n_columns, **kwargs):
+        line_numbers = []
+        rows = []
+        for block_line_numbers, columns in read_columns(filename, n_columns, **kwargs):
+            line_numbers.extend(block_line_numbers.tolist())
+            rows.extend(zip(*columns))
+        return line_numbers, rows
+
+    def test_mixed_tabs_and_spaces(self):
+        filename = self.write_file("T1 Q0\tD1 1\n\nT1\t\tQ0  D2 2\r\n  T2 Q0 D3 3")
+        expected = [("T1", "Q0", "D1", "1"), ("T1", "Q0", "D2", "2"), ("T2", "Q0", "D3", "3")]
+        for block_size in [4, 1 << 20]:
+            self.assertEqual(self.read_all(filename, 4, block_size=block_size), ([1, 3, 4], expected))
+
+    def test_malformed_lines_are_reported(self):
+        filename = self.write_file("T1 Q0 D1 1\nT1 Q0 D2 2 X\nT1 Q0 D3\n")
+        with self.assertRaisesRegex(ValueError, "line 2$"):
+            self.read_all(filename, 4)
+        with self.assertRaisesRegex(ValueError, "line 3$"):
+            self.read_all(filename, 4, extra_columns=True)
+        # where the missing and the extra columns add up
+        filename = self.write_file("T1 Q0 D1\nT1 Q0 D2 2 X\n")
+        with self.assertRaisesRegex(ValueError, "line 1$"):
+            self.read_all(filename, 4)
+
+    def test_extra_columns_are_dropped(self):
+        filename = self.write_file("T1 Q0 D1 1\nT1 Q0 D2 2 X\n")
+        self.assertEqual(self.read_all(filename, 4, extra_columns=True),
+                         ([1, 2], [("T1", "Q0", "D1", "1"), ("T1", "Q0", "D2", "2")]))
+
+    def test_compressed_files_are_decompressed(self):
+        text = "".join("T{0} Q0 D{1} 1\n".format(i % 7, i) for i in range(5000))
+        expected = self.read_all(self.write_file(text), 4)
+        for compress in [gzip.compress, bz2.compress, lzma.compress]:
+            filename = os.path.join(self.tmp_dir, "columns.z")
+            with open(filename, "wb") as f:
+                f.write(compress(text.encode("utf-8")))
+            self.assertEqual(self.read_all(filename, 4, block_size=1000), expected)
+            # stopping part way through the file stops the decompression
+            blocks = read_blocks(filename, 100)
+            next(blocks)
+            blocks.close()
+
+    def test_errors_in_decompression_are_raised(self):
+        filename = os.path.join(self.tmp_dir, "columns.gz")
+        with open(filename, "wb") as f:
+            f.write(gzip.compress(b"T1 Q0 D1 1\n" * 1000)[:-4])
+        with self.assertRaises(EOFError):
+            self.read_all(filename, 4)
+
+    def test_stdin(self):
+        stdin = sys.stdin
+        try:
+            sys.stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(gzip.compress(b"T1 Q0 D1 1\n"))))
+            self.assertEqual(self.read_all("-", 4), ([1], [("T1", "Q0", "D1", "1")]))
+        finally:
+            sys.stdin = stdin
+
+    def test_values_that_are_not_numbers_are_reported(self):
+        self.assertEqual(to_floats(["1", "2.5"], [1, 2]), [1.0, 2.5])
+        with self.assertRaisesRegex(ValueError, "line 7: the score \\(x\\)"):
+            to_floats(["1", "x"], [3, 7], name="score")
+
+
+if __name__ == '__main__':
+    unittest.main()
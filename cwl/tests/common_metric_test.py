@@ -1,9 +1,16 @@
 import unittest
 import sys
+import numpy as np
 #sys.path.insert(0, '../')
 
 from cwl.ruler.measures.cwl_precision import PrecisionCWLMetric
-from cwl.ruler.ranking import Ranking
+from cwl.ruler.measures.cwl_rbp import RBPCWLMetric
+from cwl.ruler.measures.cwl_tbg import TBGCWLMetric
+from cwl.ruler.measures.cwl_rr import RRCWLMetric
+from cwl.ruler.measures.cwl_npv import NPVCWLMetric
+from cwl.ruler.measures.cwl_inst import INSTCWLMetric
+from cwl.ruler.measures.cwl_metrics import CWLVectors, CWLVectorCache, vector_cache
+from cwl.ruler.ranking import Ranking, RankingBatch
 
 
 class TestPrecision(unittest.TestCase):
@@ -55,7 +62,192 @@ class TestPrecision(unittest.TestCase):
 
 
 
+class TestCWLVectors(unittest.TestCase):
 
+    def setUp(self):
+        self.ranking = Ranking("T1", [1., 0., 0.5, 1., 0.0], [1., 2., 1., 3., 1.], max_n=5)
+
+    def test_bundle_is_consistent(self):
+        """
+        Test that the W and L vectors in the bundle are derived from the C vector.
+        """
+        vecs = RBPCWLMetric(0.5).vectors(self.ranking)
+        self.assertAlmostEqual(np.sum(vecs.wvec), 1.0)
+        self.assertAlmostEqual(vecs.wvec[1] / vecs.wvec[0], 0.5)
+        self.assertAlmostEqual(vecs.lvec[0], 0.5)
+        self.assertEqual(vecs.cum_gains[3], 2.5)
+        self.assertEqual(vecs.cum_costs[3], 7.0)
+
+    def test_w_defined_metric_computes_w_once(self):
+        """
+        Test that a metric defined by its W vector (TBG) derives C without recomputing W.
+        """
+        tbg = TBGCWLMetric(22)
+        calls = []
+        w_vector = tbg.w_vector
+
+        def counting_w_vector(ranking, worse_case=True):
+            calls.append(worse_case)
+            return w_vector(ranking, worse_case)
+
+        tbg.w_vector = counting_w_vector
+        vecs = tbg.vectors(self.ranking)
+        self.assertEqual(len(calls), 1)
+        self.assertAlmostEqual(vecs.cvec[0], vecs.wvec[1] / vecs.wvec[0])
+        self.assertEqual(vecs.cvec[-1], 0.0)
+
+
+class TestCWLVectorCache(unittest.TestCase):
+
+    def setUp(self):
+        vector_cache.clear()
+        self.ranking1 = Ranking("T1", [1.0, 0.0, 1.0], [1.0, 2.0, 3.0], max_n=3)
+        self.ranking2 = Ranking("T2", [0.0, 1.0], [2.0, 1.0], max_n=3)
+
+    def test_independent_metric_reuses_vectors(self):
+        """
+        Test that the C/W/L vectors of a gain and cost independent metric are computed once across topics,
+        while the gains and costs still come from each ranking.
+        """
+        rbp = RBPCWLMetric(0.5)
+        vecs1 = rbp.vectors(self.ranking1)
+        vecs2 = rbp.vectors(self.ranking2)
+        self.assertEqual(vector_cache.misses, 1)
+        self.assertEqual(vector_cache.hits, 1)
+        self.assertIs(vecs1.wvec, vecs2.wvec)
+        self.assertFalse(vecs1.wvec.flags.writeable)
+        self.assertEqual(vecs2.cum_gains[1], 1.0)
+        self.assertEqual(vecs2.cum_costs[1], 3.0)
+        # a metric with different parameters, or a different depth, has its own vectors
+        RBPCWLMetric(0.8).vectors(self.ranking1)
+        rbp.vectors(Ranking("T3", [1.0], [1.0], max_n=10))
+        self.assertEqual(vector_cache.misses, 3)
+
+    def test_metrics_with_the_same_name_have_their_own_vectors(self):
+        """
+        Test that metrics whose names leave out their parameters do not share cached vectors.
+        """
+        class RoundedRBPCWLMetric(RBPCWLMetric):
+            def name(self):
+                return "RBP@{0:.1f}".format(self.theta)
+
+        rbp1 = RoundedRBPCWLMetric(0.51)
+        rbp2 = RoundedRBPCWLMetric(0.54)
+        self.assertEqual(rbp1.name(), rbp2.name())
+        self.assertAlmostEqual(rbp1.vectors(self.ranking1).cvec[0], 0.51)
+        self.assertAlmostEqual(rbp2.vectors(self.ranking1).cvec[0], 0.54)
+        self.assertEqual(vector_cache.misses, 2)
+
+    def test_dependent_metric_is_not_cached(self):
+        TBGCWLMetric(22).vectors(self.ranking1)
+        self.assertEqual(len(vector_cache), 0)
+
+    def test_cache_is_bounded(self):
+        cache = CWLVectorCache(max_size=2)
+        for n in [3, 4, 5, 3]:
+            cache.get(n, lambda: CWLVectors(np.ones(n)))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.misses, 4)
+
+    def test_scores_unchanged(self):
+        p = PrecisionCWLMetric(2)
+        self.assertAlmostEqual(p.measure(self.ranking1), 0.5)
+        self.assertAlmostEqual(p.measure(self.ranking2), 0.5)
+        self.assertAlmostEqual(p.measure(self.ranking1), 0.5)
+        self.assertEqual(vector_cache.misses, 1)
+
+
+class TestEffectiveDepth(unittest.TestCase):
+
+    def setUp(self):
+        self.ranking = Ranking("T1", [0.0, 0.0, 1.0, 0.0, 1.0], [1.0, 2.0, 3.0, 4.0, 5.0], max_n=1000)
+
+    def test_metrics_stop_at_their_depth(self):
+        """
+        Test that P@k stops at k, and RR stops at the first item with gain, without changing the measurements.
+        """
+        self.assertEqual(len(PrecisionCWLMetric(2).vectors(self.ranking).wvec), 2)
+        self.assertEqual(len(RRCWLMetric().vectors(self.ranking).wvec), 3)
+        rr = RRCWLMetric()
+        rr.measure(self.ranking)
+        self.assertAlmostEqual(rr.expected_utility, 1.0 / 3.0)
+        self.assertAlmostEqual(rr.expected_total_cost, 6.0)
+        self.assertEqual(rr.truncation_error, 0.0)
+
+    def test_epsilon(self):
+        """
+        Test that with epsilon, scoring stops where the probability of examining an item falls below it,
+        and that the truncation error is the W mass that was dropped.
+        """
+        ranking = Ranking("T1", [0.0, 0.0, 1.0, 0.0, 1.0] + [0.0] * 995, [1.0] * 1000, max_n=1000)
+        rbp = RBPCWLMetric(0.5)
+        rbp.measure(ranking)
+        self.assertEqual(rbp.truncation_error, 0.0)
+        eu = rbp.expected_utility
+
+        rbp.epsilon = 0.01
+        vecs = rbp.vectors(ranking)
+        self.assertEqual(len(vecs.wvec), 7)
+        self.assertAlmostEqual(vecs.truncation_error, 0.5 ** 7)
+        rbp.measure(ranking)
+        self.assertAlmostEqual(rbp.expected_utility, eu)
+        self.assertAlmostEqual(rbp.truncation_error, 0.5 ** 7)
+
+    def test_batch(self):
+        """
+        Test that a batch stops at the deepest effective depth of its topics.
+        """
+        ranking2 = Ranking("T2", [1.0], [1.0], max_n=1000)
+        batch = RankingBatch([self.ranking, ranking2])
+        rr = RRCWLMetric()
+        self.assertEqual(rr.vectors(batch).wvec.shape, (2, 3))
+        scores = rr.measure_batch(batch)
+        self.assertAlmostEqual(scores[0, 0], 1.0 / 3.0)
+        self.assertAlmostEqual(scores[1, 0], 1.0)
+        self.assertEqual(list(rr.batch_truncation_error), [0.0, 0.0])
+
+
+class TestPaddedTail(unittest.TestCase):
+
+    def setUp(self):
+        self.rankings = [
+            Ranking("T1", [1.0, np.nan, 0.5, 0.0, 1.0], [2.0, 1.0, np.nan, 3.0, 1.0], max_cost=4.0, min_cost=0.5),
+            Ranking("T2", [0.0, 1.0], [1.0, 1.0], max_cost=4.0, min_cost=0.5),
+        ]
+
+    def metrics(self):
+        return [RBPCWLMetric(0.9), RBPCWLMetric(1.0), NPVCWLMetric(0.1), TBGCWLMetric(22), RRCWLMetric(),
+                INSTCWLMetric(1.0), INSTCWLMetric(2.5)]
+
+    def full_depth(self, metric):
+        # score the padding item by item, rather than in closed form
+        metric.tail_ratio = lambda ranking, worse_case=True: None
+        return metric
+
+    def test_tail_matches_full_depth(self):
+        """
+        Test that summing the padding in closed form gives the same measurements (and residuals).
+        """
+        for n in [5, 6, 1000]:
+            for metric, full in zip(self.metrics(), [self.full_depth(m) for m in self.metrics()]):
+                metric.residuals = full.residuals = True
+                for ranking in self.rankings:
+                    ranking.n = n
+                    metric.measure(ranking)
+                    full.measure(ranking)
+                    for a, b in zip(metric.get_scores(), full.get_scores()):
+                        self.assertAlmostEqual(a, b, places=9, msg="{0} n={1}".format(metric.name(), n))
+                    self.assertAlmostEqual(metric.residual_expected_total_cost, full.residual_expected_total_cost)
+                batch = RankingBatch(self.rankings)
+                np.testing.assert_allclose(metric.measure_batch(batch), full.measure_batch(batch), rtol=1e-9)
+                np.testing.assert_allclose(metric.batch_residuals, full.batch_residuals, rtol=1e-9, atol=1e-12)
+
+    def test_only_ranked_items_are_scored(self):
+        ranking = self.rankings[0]
+        ranking.n = 100000
+        vecs = RBPCWLMetric(0.9).vectors(ranking)
+        self.assertEqual(len(vecs.wvec), 5)
+        self.assertAlmostEqual(np.sum(vecs.wvec) + vecs.tail_wvec, 1.0)
 
 
 if __name__ == '__main__':
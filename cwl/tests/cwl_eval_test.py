@@ -0,0 +1,240 @@
+import unittest
+import contextlib
+import gzip
+import io
+import logging
+import lzma
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+sys.path.insert(0,'./')
+
+from cwl import cwl_eval
+from cwl.ruler.cwl_ruler import CWLRuler
+from cwl.ruler.measures.cwl_bpm import BPMDCWLMetric
+from cwl.seeker.trec_qrel_index import compile_qrel_index
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestCWLEval(unittest.TestCase):
+
+    def setUp(self):
+        # cwl_eval.main logs to cwl.log in the current directory
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        self.qrel_file = os.path.join(TEST_DIR, "qrel_file")
+        self.result_file = os.path.join(TEST_DIR, "result_file")
+
+    def tearDown(self):
+        logger = logging.getLogger('cwl')
+        for handler in list(logger.handlers):
+            handler.close()
+            logger.removeHandler(handler)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def run_main(self, results_file=None, gain_file=None, **kwargs):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            cwl_eval.main(results_file or self.result_file, gain_file or self.qrel_file, residuals=True, **kwargs)
+        return out.getvalue()
+
+    def copy_result_file(self, run_id):
+        results_file = os.path.join(self.tmp_dir, run_id)
+        shutil.copy(self.result_file, results_file)
+        return results_file
+
+    def test_output_matches_the_original_implementation(self):
+        """
+        Test that the measurements and residuals of every metric are those written by the original implementation
+        (residuals_output), apart from residuals that only differ from zero by rounding error, which it wrote
+        as -0.0000 and are now written as 0.0000.
+        """
+        output = self.run_main(metrics_file=os.path.join(TEST_DIR, "all_metrics_file"))
+        with open(os.path.join(TEST_DIR, "residuals_output")) as rf:
+            expected = rf.read()
+        rows = [line.split("\t") for line in output.splitlines()]
+        expected_rows = [line.split("\t") for line in expected.splitlines()]
+        self.assertEqual(len(rows), len(expected_rows))
+        for row, expected_row in zip(rows, expected_rows):
+            self.assertEqual(row[:7], expected_row[:7])
+            for value, expected_value in zip(row[7:], expected_row[7:]):
+                self.assertIn(value, [expected_value, expected_value.replace("-0.0000", "0.0000")], row[:2])
+
+    def test_read_in_topics(self):
+        topics = list(cwl_eval.read_in_topics(self.result_file))
+        self.assertEqual([topic_id for topic_id, doc_ids, element_types in topics], ["T1", "T2", "T3"])
+        self.assertEqual((topics[0][1][0], topics[0][2][0]), ("D1", "E2"))
+
+    def test_workers_match_sequential_run(self):
+        """
+        Test that measuring batches of topics in worker processes gives the same output, in the same order.
+        """
+        sequential = self.run_main(batch_size=1)
+        parallel = self.run_main(batch_size=1, workers=2)
+        self.assertTrue(len(sequential) > 0)
+        self.assertEqual(sequential, parallel)
+
+    def test_qrel_index_matches_qrel_file(self):
+        compile_qrel_index(self.qrel_file, "qrel_index")
+        self.assertEqual(self.run_main(), self.run_main(gain_file="qrel_index"))
+
+    def test_compressed_files_match_plain_files(self):
+        with open(self.result_file, "rb") as rf, gzip.open("run.gz", "wb") as gf:
+            gf.write(rf.read())
+        with open(self.qrel_file, "rb") as qf, lzma.open("qrels.xz", "wb") as xf:
+            xf.write(qf.read())
+        self.assertEqual(self.run_main("run.gz", "qrels.xz"), self.run_main())
+        self.assertEqual(cwl_eval.get_run_id("runs/run.gz"), "run")
+
+    def test_runs_are_labelled_with_run_id(self):
+        """
+        Test that the measurements of each run match those of the run on its own, labelled with the run id.
+        """
+        single = self.run_main()
+        self.copy_result_file("runA")
+        self.copy_result_file("runB")
+        multi = self.run_main(os.path.join(self.tmp_dir, "run*"), col_names=True)
+        lines = multi.splitlines(True)
+        self.assertTrue(lines[0].startswith("Run\tTopic\tMetric"))
+        expected = ["runA\t" + line for line in single.splitlines(True)]
+        expected += ["runB\t" + line for line in single.splitlines(True)]
+        self.assertEqual(lines[1:], expected)
+        self.assertEqual(multi, self.run_main([os.path.join(self.tmp_dir, "run*")], col_names=True, workers=2))
+
+    def test_runs_are_saved_to_output_dir(self):
+        single = self.run_main()
+        results_files = [self.copy_result_file("runA"), self.copy_result_file("runB")]
+        self.assertEqual(self.run_main(results_files, output_dir="out", batch_size=1, workers=2), "")
+        for run_id in ["runA", "runB"]:
+            with open(os.path.join("out", run_id + ".cwl")) as rf:
+                self.assertEqual(rf.read(), single)
+
+    def test_all_rows_are_the_means_over_the_topics(self):
+        lines = [line.split("\t") for line in self.run_main(summary=True).splitlines()]
+        all_rows = [line for line in lines if line[0] == "all"]
+        topic_rows = [line for line in lines if line[0] != "all"]
+        # (the "all" rows are only written when asked for)
+        self.assertEqual(self.run_main(), "".join("\t".join(row) + "\n" for row in topic_rows))
+        self.assertEqual(len(topic_rows), 3 * len(all_rows))
+        for j, row in enumerate(all_rows):
+            values = np.array([line[2:] for line in topic_rows[j::len(all_rows)]], dtype=float)
+            self.assertTrue(np.allclose(np.array(row[2:], dtype=float), np.mean(values, axis=0), atol=1e-4))
+        summary = self.run_main(summary_only=True)
+        self.assertEqual(summary, "".join("\t".join(row) + "\n" for row in all_rows))
+
+    def test_bootstrap_intervals_follow_the_all_rows(self):
+        lines = [line.split("\t") for line in self.run_main(bootstrap=500, summary_only=True).splitlines()]
+        all_rows = [line for line in lines if line[0] == "all"]
+        self.assertEqual([line[0] for line in lines],
+                         ["all"] * len(all_rows) + [topic_id for topic_id in ["all:pct-lo", "all:pct-hi", "all:bca-lo",
+                                                                              "all:bca-hi"] for _ in all_rows])
+        values = np.array([line[2:] for line in lines], dtype=float).reshape(5, len(all_rows), -1)
+        self.assertTrue(np.all(values[1] <= values[0]) and np.all(values[0] <= values[2]))
+        self.assertTrue(np.all(values[3] <= values[4]))
+        # the intervals are the same with the same seed
+        self.assertEqual(self.run_main(bootstrap=500, summary_only=True, workers=2),
+                         "".join("\t".join(line) + "\n" for line in lines))
+
+    def test_cached_topics_are_not_measured_again(self):
+        def last_cache_line():
+            with open("cwl.log") as f:
+                return [line.strip() for line in f if line.startswith("Cache:")][-1]
+
+        cache_dir = os.path.join(self.tmp_dir, "cache")
+        expected = self.run_main(batch_size=2)
+        self.assertEqual(self.run_main(batch_size=2, cache_dir=cache_dir), expected)
+        self.assertEqual(last_cache_line(), "Cache: 0 topics were cached, and 3 were measured")
+        self.assertEqual(self.run_main(batch_size=2, cache_dir=cache_dir, workers=2), expected)
+        self.assertEqual(last_cache_line(), "Cache: 3 topics were cached, and 0 were measured")
+        # a run that differs from the cached one in one topic only has that topic measured
+        changed_file = os.path.join(self.tmp_dir, "changed")
+        with open(self.result_file) as f, open(changed_file, "w") as out:
+            out.write("".join(line.replace("T3", "T4") for line in f))
+        self.assertEqual(self.run_main(changed_file, batch_size=2, cache_dir=cache_dir),
+                         self.run_main(changed_file, batch_size=2))
+        self.assertEqual(last_cache_line(), "Cache: 2 topics were cached, and 1 were measured")
+        # with other options, nothing is cached
+        self.assertEqual(self.run_main(cache_dir=cache_dir, max_n=5), self.run_main(max_n=5))
+
+    def test_cache_key_covers_every_parameter_of_the_metrics(self):
+        """
+        Test that metrics of the same name, but with other parameters, are cached apart (and that T=1 is T=1.0).
+        """
+        def key(metric):
+            return cwl_eval.cache_key(self.qrel_file, None, CWLRuler(None, False, metrics=[metric]), 0.0, {})
+
+        self.assertEqual(BPMDCWLMetric().name(), BPMDCWLMetric(gain_med=0.3).name())
+        self.assertNotEqual(key(BPMDCWLMetric()), key(BPMDCWLMetric(gain_med=0.3)))
+        self.assertEqual(key(BPMDCWLMetric(T=1)), key(BPMDCWLMetric(T=1.0)))
+
+    def test_changed_qrels_are_measured_again(self):
+        def read(filename):
+            with open(filename) as f:
+                return f.read()
+
+        def changed_qrels(name, *judgements):
+            qrels = read(self.qrel_file)
+            for old, new in judgements:
+                qrels = qrels.replace(old, new)
+            filename = os.path.join(self.tmp_dir, name)
+            with open(filename, "w") as f:
+                f.write(qrels)
+            return filename
+
+        def last_measured_line():
+            return [line.strip() for line in read("cwl.log").splitlines() if "measured again" in line][-1]
+
+        results_files = [self.copy_result_file("runA")]
+        options = dict(output_format="csv", bootstrap=50)
+        self.run_main(results_files, output_dir="out", **options)
+        # only the judgement of D6 for T2 changes
+        qrel_file = changed_qrels("qrels2", ("T2   00  D6   0", "T2   00  D6   1"))
+        self.run_main(results_files, qrel_file, output_dir="out", previous_qrels=self.qrel_file, **options)
+        self.assertTrue(last_measured_line().endswith("1 of 3 topics were measured again"))
+        self.run_main(results_files, qrel_file, output_dir="fresh", **options)
+        self.assertEqual(read(os.path.join("out", "runA.csv")), read(os.path.join("fresh", "runA.csv")))
+
+        # the judgements of a delta file replace those of the gain file (and T1 D1 is unchanged)
+        delta_file = os.path.join(self.tmp_dir, "delta")
+        with open(delta_file, "w") as f:
+            f.write("T3 0 D4 1\nT1 0 D1 1\n")
+        self.run_main(results_files, qrel_file, output_dir="out", qrels_delta=delta_file, **options)
+        self.assertTrue(last_measured_line().endswith("1 of 3 topics were measured again"))
+        qrel_file = changed_qrels("qrels3", ("T2   00  D6   0", "T2   00  D6   1"),
+                                  ("T3   00  D4   0", "T3   00  D4   1"))
+        self.run_main(results_files, qrel_file, output_dir="fresh", **options)
+        self.assertEqual(read(os.path.join("out", "runA.csv")), read(os.path.join("fresh", "runA.csv")))
+
+    def test_runs_are_compared(self):
+        results_files = [self.copy_result_file("runA"), self.copy_result_file("runB"), self.copy_result_file("runC")]
+        rows = [line.split("\t") for line in self.run_main(results_files, compare=True, col_names=True).splitlines()]
+        self.assertEqual(rows[0][0:3], ["RunA", "RunB", "Metric"])
+        # the first run is compared with each of the others, and identical runs do not differ
+        self.assertEqual(sorted(set((row[0], row[1]) for row in rows[1:])), [("runA", "runB"), ("runA", "runC")])
+        self.assertTrue(all(row[7] == "0.0000" and row[-1] == "1" for row in rows[1:]))
+        rows = self.run_main(results_files, compare=True, all_pairs=True, workers=2).splitlines()
+        self.assertEqual(len(rows), 3 * len(self.run_main(summary_only=True).splitlines()))
+
+    def test_output_formats(self):
+        """
+        Test that each format holds the same measurements as the default (tsv) format.
+        """
+        single = [line.split("\t") for line in self.run_main().splitlines()]
+        rows = [line.split(",") for line in self.run_main(output_format="csv", col_names=True).splitlines()]
+        self.assertEqual(rows[0][0:3], ["Topic", "Metric", "EU"])
+        self.assertEqual(len(rows), len(single) + 1)
+        for row, expected in zip(rows[1:], single):
+            self.assertEqual(row[0:2], expected[0:2])
+            self.assertEqual(["{0:.4f}".format(float(value)) for value in row[2:]], expected[2:])
+        self.run_main([self.copy_result_file("runA")], output_dir="out", output_format="npz")
+        arrays = np.load(os.path.join("out", "runA.npz"))
+        self.assertEqual(arrays["Metric"].tolist(), [row[1] for row in single])
+
+
+if __name__ == '__main__':
+    unittest.main()
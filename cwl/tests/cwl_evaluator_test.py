@@ -0,0 +1,113 @@
+import unittest
+import contextlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from cwl import cwl_eval
+from cwl.cwl_evaluator import CWLEvaluator, measurement_records
+from cwl.ruler.measures.cwl_rbp import RBPCWLMetric
+from cwl.ruler.measures.cwl_precision import PrecisionCWLMetric
+from cwl.seeker.trec_result_sorter import TrecResultSorter
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestCWLEvaluator(unittest.TestCase):
+
+    def setUp(self):
+        self.qrels = {}
+        with open(os.path.join(TEST_DIR, "qrel_file")) as f:
+            for line in f:
+                parts = line.split()
+                if parts:
+                    self.qrels.setdefault(parts[0], {})[parts[2]] = float(parts[3])
+        self.costs = cwl_eval.read_in_cost_file(os.path.join(TEST_DIR, "cost_file"))
+        self.rankings = dict((topic_id, (doc_ids, element_types)) for topic_id, doc_ids, element_types
+                             in TrecResultSorter().topics(os.path.join(TEST_DIR, "result_file")))
+
+    def run_main(self):
+        # cwl_eval.main logs to cwl.log in the current directory
+        cwd = os.getcwd()
+        tmp_dir = tempfile.mkdtemp()
+        os.chdir(tmp_dir)
+        out = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(out):
+                cwl_eval.main(os.path.join(TEST_DIR, "result_file"), os.path.join(TEST_DIR, "qrel_file"),
+                              os.path.join(TEST_DIR, "cost_file"), residuals=True, output_format="csv")
+        finally:
+            logger = logging.getLogger('cwl')
+            for handler in list(logger.handlers):
+                handler.close()
+                logger.removeHandler(handler)
+            os.chdir(cwd)
+            shutil.rmtree(tmp_dir)
+        return [line.split(",") for line in out.getvalue().splitlines() if not line.startswith("all,")]
+
+    def test_evaluate_matches_cwl_eval(self):
+        evaluator = CWLEvaluator(self.qrels, costs=self.costs, residuals=True)
+        records = evaluator.evaluate(self.rankings)
+        rows = self.run_main()
+        self.assertEqual(len(records), len(rows))
+        self.assertEqual(list(records["topic"]), [row[0] for row in rows])
+        self.assertEqual(list(records["metric"]), [row[1] for row in rows])
+        for j, name in enumerate(["EU", "ETU", "EC", "ETC", "ED", "ResEU", "ResETU", "ResEC", "ResETC", "ResED"]):
+            self.assertEqual(list(records[name]), [float(row[2 + j]) for row in rows])
+
+    def test_setup_is_reused(self):
+        evaluator = CWLEvaluator(self.qrels, metrics=[PrecisionCWLMetric(2), RBPCWLMetric(0.5)], batch_size=1)
+        first = evaluator.evaluate(self.rankings)
+        second = evaluator.evaluate(self.rankings)
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(evaluator.metric_names(), ["P@2", "RBP@0.5"])
+        self.assertEqual(evaluator.summary.count, len(self.rankings))
+        np.testing.assert_allclose(evaluator.summary.mean[:, 0],
+                                   [np.mean(first["EU"][first["metric"] == name]) for name in ["P@2", "RBP@0.5"]])
+
+    def test_rankings_of_gains(self):
+        metrics = [PrecisionCWLMetric(3), RBPCWLMetric(0.8)]
+        evaluator = CWLEvaluator(self.qrels, metrics=metrics, residuals=True)
+        docs = {topic_id: doc_ids for topic_id, (doc_ids, element_types) in self.rankings.items()}
+        by_docs = evaluator.evaluate(docs)
+        # the gains of the docs, with NaN for those that are not judged
+        gains = {topic_id: [self.qrels.get(topic_id, {}).get(doc_id, np.nan) for doc_id in doc_ids]
+                 for topic_id, doc_ids in docs.items()}
+        by_gains = evaluator.evaluate(gains)
+        np.testing.assert_array_equal(by_docs, by_gains)
+
+        # a (topics x ranks) array of gains, without qrels
+        evaluator = CWLEvaluator(metrics=metrics)
+        records = evaluator.evaluate(np.array([[1.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.5, 1.0]]), topic_ids=["a", "b"])
+        self.assertEqual(list(records["topic"]), ["a", "a", "b", "b"])
+        np.testing.assert_allclose(records["EU"], [2.0 / 3.0, 0.2 + 0.2 * 0.64, 0.5 / 3.0, 0.2 * 0.64 * 0.5 + 0.2 * 0.512])
+        with self.assertRaises(ValueError):
+            evaluator.evaluate(docs)
+
+    def test_rankings_of_numbers_are_gains(self):
+        """
+        Test that lists and arrays of ints and bools are gains (rather than doc ids), as lists of floats are,
+        and that doc ids that are numbers can be given explicitly.
+        """
+        evaluator = CWLEvaluator({"T1": {"1": 1.0, "3": 1.0}}, metrics=[PrecisionCWLMetric(3)])
+        expected = evaluator.evaluate({"T1": [1.0, 0.0, 1.0]})["EU"]
+        np.testing.assert_allclose(expected, [2.0 / 3.0])
+        for gains in [[1, 0, 1], [True, False, True], np.array([1, 0, 1]), np.array([True, False, True]),
+                      [None, 1, 1], {"gains": [1, 0, 1]}, {"gains": [1, 0, 1], "costs": [1.0, 1.0, 1.0]},
+                      {"doc_ids": [1, 2, 3]}, {"doc_ids": ["1", "2", "3"], "element_types": ["a", "a", "a"]}]:
+            records = evaluator.evaluate({"T1": gains})
+            np.testing.assert_allclose(records["EU"], expected, err_msg=str(gains))
+        with self.assertRaises(ValueError):
+            evaluator.evaluate({"T1": {"docs": [1, 2, 3]}})
+
+    def test_measurement_records(self):
+        records = measurement_records(["T1"], ["P@1", "P@2"], np.arange(10.0).reshape(1, 2, 5))
+        self.assertEqual(records.dtype.names, ("topic", "metric", "EU", "ETU", "EC", "ETC", "ED"))
+        self.assertEqual(list(records["ED"]), [4.0, 9.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
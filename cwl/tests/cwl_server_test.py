@@ -0,0 +1,151 @@
+import unittest
+import contextlib
+import http.client
+import io
+import json
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from cwl import cwl_eval
+from cwl import cwl_server
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path):
+        super(UnixHTTPConnection, self).__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class TestCWLServer(unittest.TestCase):
+
+    def setUp(self):
+        # cwl_eval.main logs to cwl.log in the current directory
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        self.qrel_file = os.path.join(TEST_DIR, "qrel_file")
+        self.result_file = os.path.join(TEST_DIR, "result_file")
+        self.cost_file = os.path.join(TEST_DIR, "cost_file")
+        with open(self.result_file, "rb") as f:
+            self.run = f.read()
+        self.service = cwl_server.EvaluationService([("test", self.qrel_file)], cost_file=self.cost_file)
+        self.servers = []
+
+    def tearDown(self):
+        for server, thread in self.servers:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        logger = logging.getLogger('cwl')
+        for handler in list(logger.handlers):
+            handler.close()
+            logger.removeHandler(handler)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def start(self, **kwargs):
+        server = cwl_server.make_server(self.service, **kwargs)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.servers.append((server, thread))
+        return server
+
+    def request(self, connection, method, path, body=None, headers=None):
+        connection.request(method, path, body, headers or {})
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def expected(self, **kwargs):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            cwl_eval.main(self.result_file, self.qrel_file, self.cost_file, **kwargs)
+        return out.getvalue().encode("utf-8")
+
+    def test_evaluate_over_http(self):
+        server = self.start(port=0)
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+        (status, body) = self.request(connection, "POST", "/evaluate", self.run)
+        self.assertEqual(status, 200)
+        self.assertEqual(body, self.expected())
+        (status, body) = self.request(connection, "POST", "/evaluate?residuals=1&format=csv&colnames=1", self.run)
+        self.assertEqual(body, self.expected(residuals=True, output_format="csv", col_names=True))
+        (status, body) = self.request(connection, "POST", "/evaluate?summary=1", self.run)
+        self.assertEqual(body, self.expected(summary=True))
+
+        (status, body) = self.request(connection, "POST", "/evaluate?qrels=other", self.run)
+        self.assertEqual(status, 404)
+        (status, body) = self.request(connection, "POST", "/evaluate", b"T1 E1 D1\n")
+        self.assertEqual(status, 400)
+        self.assertIn(b"line 1", body)
+
+        rankings = {"T1": ["D1", "D2"], "T2": [[1.0, 0.5], [2.0, 1.0]]}
+        (status, body) = self.request(connection, "POST", "/evaluate?format=jsonl&summary_only=1",
+                                      json.dumps(rankings), {"Content-Type": "application/json"})
+        rows = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+        self.assertEqual(rows[0]["Topic"], "all")
+        self.assertEqual(rows[0]["Metric"], "P@1")
+        self.assertEqual(rows[0]["EU"], 1.0)
+
+        (status, body) = self.request(connection, "GET", "/stats")
+        stats = json.loads(body.decode("utf-8"))
+        self.assertEqual(stats["requests"], 6)
+        self.assertEqual(stats["errors"], 2)
+        self.assertEqual(stats["topics"], 3 * 3 + 2)
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertIn("latency_p95_ms", stats)
+        (status, body) = self.request(connection, "GET", "/sets")
+        self.assertEqual(json.loads(body.decode("utf-8")), {"qrels": ["test"], "metrics": ["default"]})
+        connection.close()
+
+    def test_json_rankings_of_integer_gains(self):
+        """
+        Test that the gains of a JSON ranking may be ints (or bools), and that doc ids that are numbers
+        can be given explicitly.
+        """
+        def evaluate(rankings):
+            (output, topics) = self.service.evaluate(json.dumps(rankings).encode("utf-8"), json_payload=True)
+            return output
+
+        expected = evaluate({"T1": [1.0, 1.0]})
+        self.assertIn(b"T1\tP@2\t1.0000", expected)
+        self.assertEqual(evaluate({"T1": [1, 1]}), expected)
+        self.assertEqual(evaluate({"T1": [True, True]}), expected)
+        self.assertEqual(evaluate({"T1": {"gains": [1, 1]}}), expected)
+        self.assertEqual(evaluate({"T1": [[1, 1], [1, 1]]}), expected)
+        self.assertEqual(evaluate({"T1": {"doc_ids": ["D1", "D2"]}}), evaluate({"T1": ["D1", "D2"]}))
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets are not available")
+    def test_evaluate_over_unix_socket_with_workers(self):
+        socket_path = os.path.join(self.tmp_dir, "cwl.sock")
+        with cwl_eval.get_worker_pool(2, (self.service,), cwl_server.init_worker) as pool:
+            self.start(socket_path=socket_path, pool=pool)
+            connection = UnixHTTPConnection(socket_path)
+            (status, body) = self.request(connection, "POST", "/evaluate?qrels=test", self.run)
+            self.assertEqual(status, 200)
+            self.assertEqual(body, self.expected())
+            (status, body) = self.request(connection, "POST", "/evaluate?metrics=other", self.run)
+            self.assertEqual(status, 404)
+            connection.close()
+            server = self.servers.pop()
+            server[0].shutdown()
+            server[0].server_close()
+            server[1].join()
+
+    def test_named_file(self):
+        self.assertEqual(cwl_server.named_file("trec8=qrels/trec8.txt"), ("trec8", "qrels/trec8.txt"))
+        self.assertEqual(cwl_server.named_file("qrels/trec8.txt"), ("trec8", "qrels/trec8.txt"))
+
+
+if __name__ == '__main__':
+    unittest.main()
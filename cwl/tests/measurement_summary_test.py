@@ -0,0 +1,50 @@
+import unittest
+import sys
+import numpy as np
+sys.path.insert(0,'./')
+
+from cwl.ruler.measurement_summary import MeasurementSummary
+
+
+class TestMeasurementSummary(unittest.TestCase):
+
+    def test_batches_match_all_topics_at_once(self):
+        scores = np.random.RandomState(1).rand(50, 3, 5)
+        residual_scores = scores / 2.0
+        summary = MeasurementSummary()
+        for start, end in [(0, 1), (1, 7), (7, 20), (20, 50), (50, 50)]:
+            summary.update(scores[start:end], residual_scores[start:end])
+        self.assertEqual(summary.count, 50)
+        self.assertTrue(np.allclose(summary.mean, np.mean(scores, axis=0)))
+        self.assertTrue(np.allclose(summary.variance(), np.var(scores, axis=0, ddof=1)))
+        self.assertTrue(np.array_equal(summary.min, np.min(scores, axis=0)))
+        self.assertTrue(np.array_equal(summary.max, np.max(scores, axis=0)))
+        self.assertTrue(np.allclose(summary.residual_mean, np.mean(residual_scores, axis=0)))
+
+    def test_variance_is_stable_for_large_values(self):
+        """
+        Test that the variance of values with a large mean is not lost (as it is with the sum of squares).
+        """
+        scores = 1e9 + np.arange(4000, dtype=float).reshape(-1, 1, 1) % 4
+        summary = MeasurementSummary()
+        for start in range(0, len(scores), 100):
+            summary.update(scores[start:start + 100])
+        self.assertAlmostEqual(float(summary.variance()[0, 0]), float(np.var(scores, ddof=1)), places=6)
+
+    def test_summaries_are_merged(self):
+        scores = np.arange(12, dtype=float).reshape(4, 1, 3)
+        first = MeasurementSummary()
+        first.update(scores[:1], -scores[:1])
+        self.assertTrue(np.all(np.isnan(first.variance())))
+        second = MeasurementSummary()
+        second.update(scores[1:], -scores[1:])
+        first.merge(second)
+        first.merge(MeasurementSummary())
+        self.assertEqual(first.count, 4)
+        self.assertTrue(np.allclose(first.mean, np.mean(scores, axis=0)))
+        self.assertTrue(np.allclose(first.variance(), np.var(scores, axis=0, ddof=1)))
+        self.assertTrue(np.allclose(first.residual_mean, -np.mean(scores, axis=0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
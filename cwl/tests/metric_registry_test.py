@@ -0,0 +1,50 @@
+import unittest
+import importlib
+import os
+import subprocess
+import sys
+
+from cwl.ruler import metric_registry
+from cwl.ruler.measures.cwl_metrics import CWLMetric
+from cwl.ruler.measures.cwl_rbp import RBPCWLMetric
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestMetricRegistry(unittest.TestCase):
+
+    def test_every_metric_is_registered(self):
+        for class_name, module_name in metric_registry.METRIC_MODULES.items():
+            module = importlib.import_module("cwl.ruler.measures." + module_name)
+            self.assertTrue(issubclass(getattr(module, class_name), CWLMetric))
+        # (so none are left to be discovered)
+        self.assertEqual(metric_registry.discover_metric_classes(), {})
+        self.assertIs(metric_registry.get_metric_class("RBPCWLMetric"), RBPCWLMetric)
+        self.assertRaises(NameError, metric_registry.get_metric_class, "NoSuchCWLMetric")
+
+    def test_only_the_named_modules_are_imported(self):
+        # (in a new process, without the measures directory on the path)
+        code = ("import sys\n"
+                "from cwl.ruler.cwl_ruler import CWLRuler\n"
+                "ruler = CWLRuler()\n"
+                "print(' '.join(sorted(m for m in sys.modules if m.startswith('cwl.ruler.measures.'))))\n")
+        out = subprocess.check_output([sys.executable, "-c", code], cwd=PACKAGE_DIR).decode("utf-8")
+        self.assertEqual(out.split(), ["cwl.ruler.measures." + name for name in
+                                       ["cwl_ap", "cwl_dcg", "cwl_inst", "cwl_metrics", "cwl_precision", "cwl_rbp",
+                                        "cwl_rr"]])
+
+    def test_metrics_can_still_be_imported_from_the_ruler(self):
+        code = ("import sys\n"
+                "from cwl.ruler.cwl_ruler import RBPCWLMetric\n"
+                "from cwl.ruler.measures.cwl_rbp import RBPCWLMetric as registered\n"
+                "print(RBPCWLMetric is registered)\n"
+                "print(' '.join(sorted(m for m in sys.modules if m.startswith('cwl.ruler.measures.'))))\n")
+        out = subprocess.check_output([sys.executable, "-c", code], cwd=PACKAGE_DIR).decode("utf-8")
+        self.assertEqual(out.split(), ["True", "cwl.ruler.measures.cwl_metrics", "cwl.ruler.measures.cwl_rbp"])
+        from cwl.ruler import cwl_ruler
+        self.assertRaises(AttributeError, getattr, cwl_ruler, "NoSuchCWLMetric")
+        self.assertFalse(hasattr(cwl_ruler, "__wrapped__"))
+
+
+if __name__ == '__main__':
+    unittest.main()
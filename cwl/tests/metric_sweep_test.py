@@ -0,0 +1,101 @@
+import unittest
+import os
+import sys
+import tempfile
+import numpy as np
+sys.path.insert(0,'./')
+# (the classes in a metrics file are found as ruler.measures.*, as they are by the cwl-eval script)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cwl.ruler.ranking import RankingBatch
+from cwl.ruler.cwl_ruler import CWLRuler
+from cwl.ruler.metric_sweep import MetricSweep, sweep_values
+from cwl.ruler.measures.cwl_rbp import RBPCWLMetric
+from cwl.ruler.measures.cwl_dcg import NDCGCWLMetric
+from cwl.ruler.measures.cwl_inst import INSTCWLMetric
+from cwl.tests.vectorized_metrics_test import make_rankings
+
+
+class TestMetricSweep(unittest.TestCase):
+
+    def test_sweep_values(self):
+        values = sweep_values("0.05:0.95:0.05")
+        self.assertEqual(len(values), 19)
+        self.assertEqual(values[0:3], ["0.05", "0.10", "0.15"])
+        self.assertEqual(values[-1], "0.95")
+        self.assertEqual(sweep_values("1:6:2"), ["1", "3", "5"])
+        self.assertEqual(sweep_values(" 2.0 : 2.0 : 0.5"), ["2.0"])
+        for text in ["1:0:1", "1:2:0", "1:2", "a:b:c"]:
+            with self.assertRaises(ValueError):
+                sweep_values(text)
+
+    def test_sweep_matches_each_metric(self):
+        """
+        Test that a sweep gives the same measurements as scoring each of its metrics on its own,
+        whether its metrics are scored together (RBP, NDCG@k) or one by one (INST).
+        """
+        batch = RankingBatch(make_rankings(1000))
+        for metric_class, values in [(RBPCWLMetric, [0.1, 0.5, 0.9, 0.99]), (NDCGCWLMetric, [1, 5, 10, 600]),
+                                     (INSTCWLMetric, [1.0, 2.0])]:
+            for residuals in [False, True]:
+                sweep = MetricSweep([metric_class(value) for value in values])
+                self.assertEqual(sweep.stacked(), metric_class is not INSTCWLMetric)
+                for metric in sweep.metrics:
+                    metric.residuals = residuals
+                sweep.measure_batch(batch)
+                for value, swept in zip(values, sweep.metrics):
+                    metric = metric_class(value)
+                    metric.residuals = residuals
+                    metric.measure_batch(batch)
+                    self.assertEqual(swept.batch_scores.shape, (len(batch), 5))
+                    self.assertTrue(np.allclose(swept.batch_scores, metric.batch_scores, rtol=1e-12), metric.name())
+                    if residuals:
+                        self.assertTrue(np.allclose(swept.batch_residuals, metric.batch_residuals,
+                                                    rtol=1e-12, atol=1e-12), metric.name())
+                    else:
+                        self.assertIsNone(swept.batch_residuals)
+
+    def test_sweep_with_residuals_and_the_default_costs(self):
+        """
+        Test a sweep with residuals where the costs of both cases are the same (max_cost is min_cost),
+        so that they share one cost vector.
+        """
+        rankings = make_rankings(1000)
+        for ranking in rankings:
+            ranking.max_cost = ranking.min_cost = 1.0
+        batch = RankingBatch(rankings)
+        values = [0.1, 0.5, 0.9]
+        sweep = MetricSweep([RBPCWLMetric(value) for value in values])
+        for metric in sweep.metrics:
+            metric.residuals = True
+        sweep.measure_batch(batch)
+        for value, swept in zip(values, sweep.metrics):
+            metric = RBPCWLMetric(value)
+            metric.residuals = True
+            metric.measure_batch(batch)
+            self.assertTrue(np.allclose(swept.batch_scores, metric.batch_scores, rtol=1e-12), metric.name())
+            self.assertTrue(np.allclose(swept.batch_residuals, metric.batch_residuals, rtol=1e-12, atol=1e-12))
+            self.assertTrue(np.all(swept.batch_residuals[:, 2:4] == 0.0))
+
+    def test_metrics_file_with_sweeps(self):
+        (handle, metrics_file) = tempfile.mkstemp()
+        with os.fdopen(handle, "w") as f:
+            f.write("RBPCWLMetric(0.2:0.6:0.2)\nPrecisionCWLMetric(5)\nNDCGCWLMetric(5:10:5)\n")
+        try:
+            ruler = CWLRuler(metrics_file, residuals=True)
+        finally:
+            os.remove(metrics_file)
+        self.assertEqual(ruler.metric_names(), ["RBP@0.2", "RBP@0.4", "RBP@0.6", "P@5", "NDCG-k@5", "NDCG-k@10"])
+        self.assertEqual([len(sweep.metrics) for sweep in ruler.sweeps], [3, 2])
+        batch = RankingBatch(make_rankings(100))
+        ruler.measure_batch(batch)
+        (topic_ids, scores, residual_scores) = ruler.measurements()
+        self.assertEqual(scores.shape, (len(batch), 6, 5))
+        self.assertEqual(residual_scores.shape, (len(batch), 6, 5))
+        metric = RBPCWLMetric(0.4)
+        metric.measure_batch(batch)
+        self.assertTrue(np.allclose(scores[:, 1], metric.batch_scores, rtol=1e-12))
+
+
+if __name__ == '__main__':
+    unittest.main()
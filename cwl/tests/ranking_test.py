@@ -5,6 +5,10 @@ sys.path.insert(0,'./')
 
 from cwl.ruler.ranking import Ranking
 from cwl.ruler.ranking import RankingMaker
+from cwl.ruler.ranking import RankingBatch
+from cwl.ruler.measures.cwl_precision import PrecisionCWLMetric
+from cwl.ruler.measures.cwl_rbp import RBPCWLMetric
+from cwl.ruler.measures.cwl_rr import RRCWLMetric
 from cwl.seeker.trec_qrel_handler import TrecQrelHandler
 
 class TestRanking(unittest.TestCase):
@@ -126,6 +130,26 @@ class TestRanking(unittest.TestCase):
         self.assertEqual(np.sum(min_gains[0:5]), 4)
         self.assertEqual(np.sum(max_gains[0:5]), 4)
 
+    def test_resolved_vectors_are_shared(self):
+        """
+        Test that the resolved vectors are made once per ranking, are read only, and follow changes to n.
+        """
+        gains = self.ranking2.get_gain_vector(worse_case=False)
+        self.assertIs(self.ranking2.get_gain_vector(worse_case=False), gains)
+        self.assertFalse(gains.flags.writeable)
+        self.assertEqual(gains[1], 1.0)
+        both = self.ranking2.get_gain_vector(None)
+        self.assertEqual(both.shape, (2, 1000))
+        # the costs resolve the same in both cases (max_cost is min_cost), so the cases share one vector
+        shared = self.ranking2.get_cost_vector(None)
+        self.assertEqual(shared.shape, (1, 1000))
+        self.assertTrue(np.array_equal(self.ranking2.get_cost_vector(worse_case=False), shared[0]))
+        self.ranking2.n = 10
+        self.assertEqual(len(self.ranking2.get_gain_vector(worse_case=False)), 10)
+        self.assertEqual(len(self.ranking2.truncated(3).get_gain_vector()), 3)
+        with self.assertRaises(AttributeError):
+            self.ranking2.gains = gains
+
 class TestRankingMaker(unittest.TestCase):
 
     def setUp(self):
@@ -157,6 +181,110 @@ class TestRankingMaker(unittest.TestCase):
         self.assertEqual(np.sum(min_gains[0:20]), 5.0)
         self.assertEqual(np.sum(max_gains[0:20]), 15.0)
 
+    def test_items_past_max_n_are_not_kept(self):
+        rm = RankingMaker(topic_id="T1", gain_handler=self.rm.gain_handler, cost_dict={"a": 2.0}, max_n=3)
+        for d in ["D1", "D2", "D11", "D3"]:
+            rm.add(d, "a")
+        ranking = rm.get_ranking()
+        self.assertEqual(ranking.get_depth(), 3)
+        self.assertEqual(list(ranking.get_gain_vector(worse_case=False)), [1.0, 0.0, 1.0])
+        self.assertEqual(list(ranking.get_cost_vector()), [2.0, 2.0, 2.0])
+
+    def test_ranking_only_keeps_its_items(self):
+        rm = RankingMaker(topic_id="T1", gain_handler=self.rm.gain_handler, max_n=1000000)
+        docs = ["D{0}".format(i) for i in range(200)]
+        rm.add_all(docs[0:100], ["a"] * 100)
+        for d in docs[100:]:
+            rm.add(d, "a")
+        ranking = rm.get_ranking()
+        self.assertEqual(ranking.get_depth(), 200)
+        self.assertEqual(len(ranking._gains), 200)
+        self.assertIsNone(ranking._gains.base)
+        rm_all = RankingMaker(topic_id="T1", gain_handler=self.rm.gain_handler, max_n=1000000)
+        rm_all.add_all(docs, ["a"] * 200)
+        np.testing.assert_array_equal(ranking._gains, rm_all.get_ranking()._gains)
+
+    def test_add_all_matches_add(self):
+        docs = ["D1", "D11", "D2", "D3", "X1", "D10"]
+        element_types = ["a", "b", "a", "c", "a", "a"]
+        for max_n in [3, 10]:
+            rm = RankingMaker(topic_id="T1", gain_handler=self.rm.gain_handler, cost_dict={"a": 2.0, "b": 3.0},
+                              max_n=max_n)
+            for d, e in zip(docs, element_types):
+                rm.add(d, e)
+            rm_all = RankingMaker(topic_id="T1", gain_handler=self.rm.gain_handler, cost_dict={"a": 2.0, "b": 3.0},
+                                  max_n=max_n)
+            rm_all.add_all(docs[:2], element_types[:2])
+            rm_all.add_all(docs[2:], element_types[2:])
+            for worse_case in [True, False]:
+                np.testing.assert_array_equal(rm.get_ranking().get_gain_vector(worse_case),
+                                              rm_all.get_ranking().get_gain_vector(worse_case))
+                np.testing.assert_array_equal(rm.get_ranking().get_cost_vector(worse_case),
+                                              rm_all.get_ranking().get_cost_vector(worse_case))
+
+
+class TestRankingBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.rankings = [
+            Ranking("T1", [1., 0., 0.5, 1., 0.0], [1., 1., 1., 1., 1.]),
+            Ranking("T2", [1., np.nan, 0.5, 1., np.nan], [1., 1., 1., 1., 1.]),
+            Ranking("T3", [0., 0., 1.], [2., np.nan, 1.]),
+        ]
+        self.batch = RankingBatch(self.rankings)
+
+    def test_vectors_match_rankings(self):
+        """
+        Test that each row of the batch is padded and resolved in the same way as the ranking it came from
+        """
+        for worse_case in [True, False]:
+            gains = self.batch.get_gain_vector(worse_case)
+            costs = self.batch.get_cost_vector(worse_case)
+            for i, ranking in enumerate(self.rankings):
+                self.assertTrue(np.array_equal(gains[i], ranking.get_gain_vector(worse_case)))
+                self.assertTrue(np.array_equal(costs[i], ranking.get_cost_vector(worse_case)))
+
+    def test_totals_match_rankings(self):
+        for worse_case in [True, False]:
+            for i, ranking in enumerate(self.rankings):
+                self.assertEqual(self.batch.get_total_gain(worse_case)[i], ranking.get_total_gain(worse_case))
+                self.assertEqual(self.batch.get_total_rels(worse_case)[i], ranking.get_total_rels(worse_case))
+                self.assertEqual(self.batch.get_total_cost(worse_case)[i], ranking.get_total_cost(worse_case))
+
+    def test_deep_batch_is_only_padded_when_scored(self):
+        """
+        Test that the batch only stores its rankings (not the padding up to n), and that metrics that stop at
+        their effective depth or sum the padding in closed form do not pad the rows.
+        """
+        rankings = [Ranking(r.topic_id, r._gains, r._costs, max_n=100000) for r in self.rankings]
+        batch = RankingBatch(rankings)
+        self.assertEqual(batch._gains.shape, (3, 5))
+        for metric in [PrecisionCWLMetric(3), RBPCWLMetric(0.8), RRCWLMetric()]:
+            metric.residuals = True
+            metric.measure_batch(batch)
+            self.assertTrue(all(vec.shape[-1] <= 6 for vec in batch._vectors.values()))
+            for i, ranking in enumerate(rankings):
+                metric.measure(ranking)
+                np.testing.assert_allclose(metric.batch_scores[i], metric.get_scores())
+        for worse_case in [True, False]:
+            for i, ranking in enumerate(rankings):
+                self.assertEqual(batch.get_total_rels(worse_case)[i], ranking.get_total_rels(worse_case))
+                self.assertAlmostEqual(batch.get_total_cost(worse_case)[i], ranking.get_total_cost(worse_case))
+
+    def test_measure_batch_matches_measure(self):
+        """
+        Test that batched scoring gives the same measurements as scoring each ranking in turn,
+        both for vectorized metrics and for metrics that fall back to scoring one topic at a time.
+        """
+        for metric in [PrecisionCWLMetric(3), RBPCWLMetric(0.8), RRCWLMetric()]:
+            metric.residuals = True
+            metric.measure_batch(self.batch)
+            for i, ranking in enumerate(self.rankings):
+                metric.measure(ranking)
+                self.assertEqual(list(metric.batch_scores[i]), metric.get_scores())
+                self.assertEqual(metric.batch_residuals[i][0], metric.residual_expected_utility)
+                self.assertEqual(metric.batch_residuals[i][4], metric.residual_expected_items)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,61 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from cwl.ruler.result_cache import ResultCache, file_digest, make_key
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_make_key(self):
+        self.assertEqual(make_key("a", ["b", "c"]), make_key("a", ["b", "c"]))
+        # the parts are kept apart
+        self.assertNotEqual(make_key("a", ["b", "c"]), make_key("a", ["bc"]))
+        self.assertNotEqual(make_key("ab", "c"), make_key("a", "bc"))
+        filename = os.path.join(self.cache_dir, "file")
+        with open(filename, "w") as f:
+            f.write("T1 0 D1 1\n")
+        self.assertEqual(file_digest(filename), file_digest(filename))
+
+    def test_topics_and_runs_are_kept(self):
+        values = np.arange(30.0).reshape(3, 2, 5)
+        cache = ResultCache(self.cache_dir)
+        cache.put_topics(["k1", "k2", "k3"], values)
+        cache.put_run("run", ["T1", "T2", "T3"], ["k1", "k2", "k3"])
+        cache.close()
+
+        cache = ResultCache(self.cache_dir)
+        found = cache.get_topics(["k3", "k1", "k4"], 2)
+        self.assertEqual(sorted(found), ["k1", "k3"])
+        np.testing.assert_array_equal(found["k3"], values[2])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.assertEqual(cache.get_run("run"), (["T1", "T2", "T3"], ["k1", "k2", "k3"]))
+        self.assertIsNone(cache.get_run("other"))
+        cache.close()
+
+    def test_least_recently_used_are_evicted(self):
+        values = np.zeros((4, 2, 5))
+        entry_size = values[0].nbytes + len("k1")
+        cache = ResultCache(self.cache_dir, max_bytes=3 * entry_size)
+        cache.put_topics(["k1", "k2"], values[0:2])
+        cache.put_topics(["k3"], values[2:3])
+        # k1 is used after k2 (and k3), so k2 is evicted first
+        cache.get_topics(["k1"], 2)
+        cache.put_topics(["k4"], values[3:4])
+        cache.close()
+        cache = ResultCache(self.cache_dir)
+        self.assertEqual(sorted(cache.get_topics(["k1", "k2", "k3", "k4"], 2)), ["k1", "k3", "k4"])
+        self.assertEqual(cache.size(), 3 * entry_size)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import contextlib
+import csv
+import io
+import json
+import sys
+import numpy as np
+sys.path.insert(0,'./')
+
+from cwl.ruler.result_writer import TsvResultWriter, CsvResultWriter, JsonlResultWriter, NpzResultWriter
+from cwl.ruler.measures.cwl_precision import PrecisionCWLMetric
+from cwl.ruler.ranking import Ranking
+
+
+class TestResultWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.metric_names = ["P@1", "A,\"B\""]
+        self.scores = np.arange(20, dtype=float).reshape(2, 2, 5) / 3.0
+        self.residual_scores = -self.scores
+
+    def write(self, writer_class, out, **kwargs):
+        writer = writer_class(out, self.metric_names, buffer_size=10, **kwargs)
+        writer.write_header()
+        writer.write_batch(["T1"], self.scores[0:1], self.residual_scores[0:1], run_id="run")
+        writer.write_batch(["T2"], self.scores[1:2], self.residual_scores[1:2], run_id="run")
+        writer.close()
+        return out
+
+    def test_tsv_matches_the_report_of_each_metric(self):
+        # the format of a row, as each metric used to print it
+        template = "{}\t{}" + "\t{:.4f}" * 10 + "\n"
+        expected = ""
+        for i, topic_id in enumerate(["T1", "T2"]):
+            for j, metric_name in enumerate(self.metric_names):
+                expected += template.format(topic_id, metric_name, *self.scores[i, j], *self.residual_scores[i, j])
+        out = self.write(TsvResultWriter, io.StringIO(), residuals=True).getvalue()
+        self.assertEqual(out, expected)
+        out = self.write(TsvResultWriter, io.StringIO(), col_names=True, label_runs=True).getvalue()
+        self.assertEqual(out.splitlines()[0], "Run\tTopic\tMetric\tEU\tETU\tEC\tETC\tED")
+        self.assertEqual(out.splitlines()[1], "run\tT1\tP@1\t0.0000\t0.3333\t0.6667\t1.0000\t1.3333")
+
+    def test_report_of_a_metric_is_a_tsv_row(self):
+        metric = PrecisionCWLMetric(2)
+        metric.residuals = True
+        metric.measure(Ranking("T1", np.array([1.0, np.nan]), np.array([1.0, 1.0])))
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            metric.report()
+        self.assertEqual(out.getvalue(), "T1\tP@2\t0.5000\t1.0000\t1.0000\t2.0000\t2.0000"
+                                         "\t0.5000\t1.0000\t0.0000\t0.0000\t0.0000\n")
+
+    def test_csv_and_jsonl_are_read_back(self):
+        out = self.write(CsvResultWriter, io.StringIO(), residuals=True, col_names=True)
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        self.assertEqual([(row["Topic"], row["Metric"]) for row in rows],
+                         [("T1", "P@1"), ("T1", "A,\"B\""), ("T2", "P@1"), ("T2", "A,\"B\"")])
+        self.assertEqual([float(row["ETU"]) for row in rows], self.scores[..., 1].ravel().tolist())
+        self.assertEqual([float(row["ResED"]) for row in rows], self.residual_scores[..., 4].ravel().tolist())
+
+        out = self.write(JsonlResultWriter, io.StringIO(), label_runs=True)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(rows[1], dict(zip(["Run", "Topic", "Metric", "EU", "ETU", "EC", "ETC", "ED"],
+                                           ["run", "T1", "A,\"B\""] + self.scores[0, 1].tolist())))
+        self.scores[1, 1, 4] = np.inf
+        rows = [json.loads(line) for line in self.write(JsonlResultWriter, io.StringIO()).getvalue().splitlines()]
+        self.assertEqual(rows[3]["ED"], np.inf)
+
+    def test_npz_has_an_array_per_column(self):
+        out = self.write(NpzResultWriter, io.BytesIO(), residuals=True, label_runs=True)
+        out.seek(0)
+        arrays = np.load(out)
+        self.assertEqual(arrays["Topic"].tolist(), ["T1", "T1", "T2", "T2"])
+        self.assertEqual(arrays["Run"].tolist(), ["run"] * 4)
+        self.assertTrue(np.array_equal(arrays["EC"], self.scores[..., 2].ravel()))
+        self.assertTrue(np.array_equal(arrays["ResEU"], self.residual_scores[..., 0].ravel()))
+
+    def test_rows_are_read_back_by_the_writer(self):
+        values = np.concatenate((self.scores, self.residual_scores), axis=-1).reshape(4, 10)
+        for writer_class, out in [(TsvResultWriter, io.StringIO()), (CsvResultWriter, io.StringIO()),
+                                  (JsonlResultWriter, io.StringIO()), (NpzResultWriter, io.BytesIO())]:
+            self.write(writer_class, out, residuals=True, col_names=True)
+            out.seek(0)
+            (topic_ids, metric_names, read_values) = writer_class.read_rows(out)
+            self.assertEqual(topic_ids, ["T1", "T1", "T2", "T2"])
+            self.assertEqual(metric_names, self.metric_names * 2)
+            # (tsv holds the measurements to four decimal places)
+            np.testing.assert_allclose(read_values, values, atol=1e-4 if writer_class is TsvResultWriter else 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
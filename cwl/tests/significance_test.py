@@ -0,0 +1,55 @@
+import unittest
+import sys
+import numpy as np
+sys.path.insert(0,'./')
+
+from cwl.ruler.significance import t_test, wilcoxon_test, permutation_test, correct, compare_runs
+
+
+class TestSignificance(unittest.TestCase):
+
+    def test_t_test(self):
+        # (the two-sided 5% critical value of t with 10 degrees of freedom is 2.228, and the sd is 1)
+        differences = np.array([1.0, -1.0] * 5 + [0.0]) + 2.228 / np.sqrt(11.0)
+        self.assertAlmostEqual(t_test(differences[:, np.newaxis])[0], 0.05, places=4)
+        self.assertTrue(np.array_equal(t_test(np.array([[0.0, 1.0], [0.0, 1.0]])), [1.0, 0.0]))
+
+    def test_wilcoxon_test(self):
+        # the example of the differences in the heights of Darwin's plants (exactly p = 0.041259765625)
+        differences = np.array([6, 8, 14, 16, 23, 24, 28, 29, 41, -48, 49, 56, 60, -67, 75], dtype=float)
+        self.assertAlmostEqual(wilcoxon_test(differences[:, np.newaxis])[0], 0.041259765625)
+        # with ties, the normal approximation: the zero differences are dropped, W = 34 and the variance
+        # is 51 less 1.125 for the ties, so z = 16 / sqrt(49.875)
+        differences = np.array([1, 1, 2, 2, 2, -1, 3, 3, 0, 0], dtype=float)
+        self.assertAlmostEqual(wilcoxon_test(differences[:, np.newaxis])[0], 0.023477, places=5)
+        self.assertTrue(np.isnan(wilcoxon_test(np.zeros((3, 1)))[0]))
+
+    def test_permutation_test(self):
+        differences = np.random.RandomState(0).randn(40, 3) + [0.0, 0.5, 1.0]
+        p_values = permutation_test(differences, 20000, seed=1)
+        self.assertTrue(np.allclose(p_values, t_test(differences), atol=0.005))
+        # the same permutations are used for each column
+        self.assertEqual(permutation_test(differences[:, 1:2], 20000, seed=1)[0], p_values[1])
+        self.assertEqual(permutation_test(np.zeros((5, 1)), 100)[0], 1.0)
+
+    def test_corrections(self):
+        p_values = [0.01, 0.04, 0.03, 0.005, np.nan]
+        self.assertTrue(np.allclose(correct(p_values, "holm")[:4], [0.03, 0.06, 0.06, 0.02]))
+        self.assertTrue(np.allclose(correct(p_values, "bonferroni")[:4], [0.04, 0.16, 0.12, 0.02]))
+        self.assertTrue(np.isnan(correct(p_values, "holm")[4]))
+        with self.assertRaises(ValueError):
+            correct(p_values, "sidak")
+
+    def test_compare_runs(self):
+        runs = [np.random.RandomState(i).rand(30, 4) for i in range(3)]
+        pairs = [(0, 1), (0, 2), (1, 2)]
+        (t, w, p) = compare_runs(runs, pairs, 1000, correction="none", n_chunks=3)
+        for i, (a, b) in enumerate(pairs):
+            self.assertTrue(np.allclose(t[i], t_test(runs[b] - runs[a])))
+            self.assertTrue(np.allclose(p[i], permutation_test(runs[b] - runs[a], 1000)))
+        (t_holm, w_holm, p_holm) = compare_runs(runs, pairs, 1000)
+        self.assertTrue(np.allclose(w_holm[:, 2], correct(w[:, 2], "holm")))
+
+
+if __name__ == '__main__':
+    unittest.main()
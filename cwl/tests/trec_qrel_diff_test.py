@@ -0,0 +1,56 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from cwl.seeker.trec_qrel_handler import TrecQrelHandler
+from cwl.seeker.trec_qrel_index import TrecQrelIndex, compile_qrel_index
+from cwl.seeker.trec_qrel_diff import read_judgements, changed_topics, apply_qrel_delta
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestTrecQrelDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.qrel_file = os.path.join(TEST_DIR, "qrel_file")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_file(self, name, text):
+        filename = os.path.join(self.tmp_dir, name)
+        with open(filename, "w") as f:
+            f.write(text)
+        return filename
+
+    def test_changed_topics(self):
+        with open(self.qrel_file) as f:
+            qrels = f.read()
+        # T1 has a new judgement, T2 a changed one, and T4 is new
+        changed_file = self.write_file("changed", qrels.replace("T2   00  D6   0", "T2   00  D6   2")
+                                       + "T1 0 D20 0\nT4 0 D1 1\n")
+        index_file = os.path.join(self.tmp_dir, "index")
+        compile_qrel_index(changed_file, index_file)
+        previous = TrecQrelHandler(self.qrel_file)
+        # (a doc that is looked up, but not judged, is not a change)
+        previous.get_value("T3", "D1")
+        for current in [TrecQrelHandler(changed_file), TrecQrelIndex(index_file), read_judgements(changed_file)]:
+            self.assertEqual(changed_topics(previous, current), {"T1", "T2", "T4"})
+            self.assertEqual(changed_topics(read_judgements(self.qrel_file), current), {"T1", "T2", "T4"})
+        self.assertEqual(changed_topics(previous, TrecQrelHandler(self.qrel_file)), set())
+
+    def test_delta_replaces_judgements(self):
+        qrh = TrecQrelHandler(self.qrel_file)
+        delta_file = self.write_file("delta", "T1 0 D1 1\nT2 0 D6 1\nT5 0 D1 1\n")
+        self.assertEqual(apply_qrel_delta(qrh, delta_file), {"T2", "T5"})
+        self.assertEqual(qrh.get_value("T2", "D6"), 1.0)
+        self.assertEqual(qrh.get_value("T5", "D1"), 1.0)
+        index_file = os.path.join(self.tmp_dir, "index")
+        compile_qrel_index(self.qrel_file, index_file)
+        self.assertRaises(ValueError, apply_qrel_delta, TrecQrelIndex(index_file), delta_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
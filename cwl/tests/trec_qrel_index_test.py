@@ -0,0 +1,82 @@
+import unittest
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import numpy as np
+sys.path.insert(0,'./')
+
+from cwl.seeker.trec_qrel_handler import TrecQrelHandler
+from cwl.seeker.trec_qrel_index import TrecQrelIndex, compile_qrel_index, is_qrel_index
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestTrecQrelIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.qrel_file = os.path.join(TEST_DIR, "qrel_file")
+        self.index_file = os.path.join(self.tmp_dir, "qrel_index")
+        compile_qrel_index(self.qrel_file, self.index_file)
+        self.qrh = TrecQrelHandler(self.qrel_file)
+        self.index = TrecQrelIndex(self.index_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_is_qrel_index(self):
+        self.assertTrue(is_qrel_index(self.index_file))
+        self.assertFalse(is_qrel_index(self.qrel_file))
+
+    def test_lookups_match_qrel_handler(self):
+        self.assertEqual(sorted(self.index.get_topic_list()), sorted(self.qrh.get_topic_list()))
+        for topic in self.qrh.get_topic_list():
+            self.assertEqual(sorted(self.index.get_doc_list(topic)), sorted(self.qrh.get_doc_list(topic)))
+            for doc in self.qrh.get_doc_list(topic):
+                self.assertEqual(self.index.get_value_if_exists(topic, doc), self.qrh.get_value_if_exists(topic, doc))
+            self.assertEqual(self.index.get_total_gains(topic), self.qrh.get_total_gains(topic))
+            self.assertEqual(self.index.get_total_rels(topic), self.qrh.get_total_rels(topic))
+            self.assertIsNone(self.index.get_value_if_exists(topic, "NOT_JUDGED"))
+            self.assertEqual(self.index.get_value(topic, "NOT_JUDGED"), 0.0)
+
+    def test_lists_of_docs_match_single_lookups(self):
+        for topic in self.qrh.get_topic_list() + ["NO_TOPIC"]:
+            docs = list(self.qrh.get_doc_list(topic)) + ["NOT_JUDGED", "D1", "D3"]
+            expected = [self.qrh.get_value_if_exists(topic, doc) for doc in docs]
+            expected = np.array([np.nan if value is None else value for value in expected])
+            np.testing.assert_array_equal(self.qrh.get_values_if_exist(topic, docs), expected)
+            np.testing.assert_array_equal(self.index.get_values_if_exist(topic, docs), expected)
+        self.assertEqual(len(self.qrh.get_values_if_exist("T1", [])), 0)
+
+    def test_docs_longer_than_the_doc_ids_are_not_judged(self):
+        """
+        Test that a doc whose id extends a judged doc id (past the width of the doc ids) is not found.
+        """
+        docs = self.index.get_doc_list("T1")
+        longest = max(docs, key=len)
+        self.assertIsNone(self.index.get_value_if_exists("T1", longest + "X"))
+        values = self.index.get_values_if_exist("T1", [longest + "X", longest])
+        self.assertTrue(np.isnan(values[0]))
+        self.assertEqual(values[1], self.qrh.get_value_if_exists("T1", longest))
+
+    def test_unknown_topic(self):
+        self.assertIsNone(self.index.get_value_if_exists("NO_TOPIC", "D1"))
+        self.assertEqual(self.index.get_total_gains("NO_TOPIC"), 0.0)
+        self.assertEqual(self.index.get_total_rels("NO_TOPIC"), 0.0)
+        self.assertEqual(self.index.get_doc_list("NO_TOPIC"), [])
+
+    def test_validate_gains(self):
+        self.index.validate_gains(min_gain=0.0, max_gain=1.0)
+        self.assertRaises(ValueError, self.index.validate_gains, 0.0, 0.5)
+        self.assertRaises(ValueError, self.index.validate_gains, 0.5, 1.0)
+
+    def test_pickled_index_is_reopened(self):
+        index = pickle.loads(pickle.dumps(self.index))
+        self.assertEqual(index.get_total_gains("T1"), self.index.get_total_gains("T1"))
+        self.assertEqual(index.get_value_if_exists("T1", "D1"), self.index.get_value_if_exists("T1", "D1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
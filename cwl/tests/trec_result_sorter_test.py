@@ -0,0 +1,98 @@
+import unittest
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+sys.path.insert(0,'./')
+
+from cwl.seeker.trec_result_sorter import TrecResultSorter
+
+
+class TestTrecResultSorter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_results(self, lines):
+        results_file = os.path.join(self.tmp_dir, "results")
+        with open(results_file, "w") as rf:
+            for line in lines:
+                rf.write(line + "\n")
+        return results_file
+
+    def doc_ids(self, sorter, results_file):
+        return [(topic_id, doc_ids) for topic_id, doc_ids, element_types in sorter.topics(results_file)]
+
+    def test_sorted_file_is_read_through(self):
+        results_file = self.write_results(["T1 Q0 D1 1 3.0 run", "T1 Q0 D2 2 2.0 run", "T2 Q0 D3 1 1.0 run"])
+        for block_size in [16, 1 << 20]:
+            sorter = TrecResultSorter(block_size=block_size)
+            self.assertTrue(sorter.is_grouped(results_file))
+            self.assertEqual(self.doc_ids(sorter, results_file), [("T1", ["D1", "D2"]), ("T2", ["D3"])])
+
+    def test_topic_runs_are_found_without_splitting_lines(self):
+        """
+        Test that is_grouped tells topics apart that start with the same characters,
+        and copes with mixed tabs and spaces and leading whitespace.
+        """
+        grouped = ["T1 Q0 D1 1 3.0 run", "T1\tQ0 D2 2 2.0 run", " T1 Q0 D3 3 1.0 run", "T10 Q0 D1 1 1.0 run"]
+        self.assertTrue(TrecResultSorter(block_size=24).is_grouped(self.write_results(grouped)))
+        self.assertTrue(TrecResultSorter().is_grouped(self.write_results(grouped)))
+        interleaved = ["T1 Q0 D1 1 3.0 run", "T10 Q0 D1 1 1.0 run", "T1 Q0 D2 2 2.0 run"]
+        self.assertFalse(TrecResultSorter().is_grouped(self.write_results(interleaved * 200)))
+
+    def test_ties_are_broken_on_doc_id(self):
+        """
+        Test that items are ranked by score, and that ties are broken on the doc id, in descending order (as trec_eval).
+        """
+        results_file = self.write_results(["T1 Q0 D1 1 1.0 run", "T1 Q0 D3 2 1.0 run",
+                                           "T1 Q0 D2 3 2.0 run", "T1 Q0 D4 4 -1.0 run"])
+        self.assertEqual(self.doc_ids(TrecResultSorter(), results_file), [("T1", ["D2", "D3", "D1", "D4"])])
+
+    def test_interleaved_topics_are_grouped(self):
+        """
+        Test that the lines of each topic are grouped, in order of first appearance, whether or not
+        the sort runs over temporary chunk files.
+        """
+        lines = ["T2 Q0 D1 1 1.0 run", "T1 Q0 D2 1 5.0 run", "T2 Q0 D3 2 4.0 run",
+                 "T1 Q0 D4 2 1.0 run", "T2 Q0 D5 3 4.0 run", "T1 Q0 D6 3 6.0 run"]
+        results_file = self.write_results(lines)
+        expected = [("T2", ["D5", "D3", "D1"]), ("T1", ["D6", "D2", "D4"])]
+        self.assertFalse(TrecResultSorter().is_grouped(results_file))
+        self.assertEqual(self.doc_ids(TrecResultSorter(), results_file), expected)
+        sorter = TrecResultSorter(max_lines=2, temp_dir=self.tmp_dir)
+        self.assertEqual(self.doc_ids(sorter, results_file), expected)
+        # and when the lines of a topic are split over blocks
+        sorter = TrecResultSorter(max_lines=2, temp_dir=self.tmp_dir, block_size=16)
+        self.assertEqual(self.doc_ids(sorter, results_file), expected)
+        # the chunk files are removed once the topics have been read
+        self.assertEqual(os.listdir(self.tmp_dir), ["results"])
+
+    def test_compressed_file_is_read_without_a_temporary_file(self):
+        lines = ["T2 Q0 D1 1 1.0 run", "T1 Q0 D2 1 5.0 run", "T2 Q0 D3 2 4.0 run"]
+        results_file = os.path.join(self.tmp_dir, "results.gz")
+        with gzip.open(results_file, "wt") as rf:
+            rf.write("\n".join(lines + ["T1 Q0 D4 2 x run"]))
+        sorter = TrecResultSorter(temp_dir=self.tmp_dir)
+        # malformed lines are reported with the name of the compressed file (not the temporary file)
+        with self.assertRaisesRegex(ValueError, "results.gz: line 4"):
+            self.doc_ids(sorter, results_file)
+        with gzip.open(results_file, "wt") as rf:
+            rf.write("\n".join(lines))
+        self.assertEqual(self.doc_ids(sorter, results_file), [("T2", ["D3", "D1"]), ("T1", ["D2"])])
+        self.assertEqual(os.listdir(self.tmp_dir), ["results.gz"])
+        # the topics of a grouped file are read as it is decompressed (with no copy of it in the temp_dir)
+        with gzip.open(results_file, "wt") as rf:
+            rf.write("\n".join(sorted(lines)))
+        topics = sorter.topics(results_file)
+        self.assertEqual(next(topics)[0:2], ("T1", ["D2"]))
+        self.assertEqual(os.listdir(self.tmp_dir), ["results.gz"])
+        self.assertEqual(next(topics)[0:2], ("T2", ["D3", "D1"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
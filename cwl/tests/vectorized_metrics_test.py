@@ -0,0 +1,395 @@
+import unittest
+import math
+import numpy as np
+
+from cwl.ruler.ranking import Ranking, RankingBatch
+from cwl.ruler.measures.cwl_precision import PrecisionCWLMetric
+from cwl.ruler.measures.cwl_rbp import RBPCWLMetric
+from cwl.ruler.measures.cwl_npv import NPVCWLMetric
+from cwl.ruler.measures.cwl_rr import RRCWLMetric
+from cwl.ruler.measures.cwl_ap import APCWLMetric, TrAPCWLMetric
+from cwl.ruler.measures.cwl_dcg import NDCGCWLMetric
+from cwl.ruler.measures.cwl_set import SETCWLMetric
+from cwl.ruler.measures.cwl_inst import INSTCWLMetric
+from cwl.ruler.measures.cwl_insq import INSQCWLMetric
+from cwl.ruler.measures.cwl_tbg import TBGCWLMetric
+from cwl.ruler.measures.cwl_bpm import BPMCWLMetric, BPMDCWLMetric
+from cwl.ruler.measures.cwl_umeasure import UMeasureCWLMetric
+from cwl.ruler.measures.cwl_ift import IFTGoalCWLMetric, IFTRateCWLMetric, IFTGoalRateCWLMetric
+from cwl.ruler.measures.cwl_nerr import NERReq8CWLMetric, NERReq9CWLMetric, NERReq10CWLMetric, NERReq11CWLMetric
+
+"""
+Regression tests for the vectorized metrics: each metric is compared against the
+loop based implementation it replaced (kept below as a reference), at depth 1000 and 10000.
+"""
+
+
+def c_from_w_loop(wvec):
+    cvec = []
+    for i in range(0, len(wvec)-1):
+        if wvec[i] > 0.0:
+            cvec.append(wvec[i+1] / wvec[i])
+        else:
+            cvec.append(0.0)
+    cvec.append(0.0)
+    return np.array(cvec)
+
+
+class LoopPrecision(PrecisionCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        cvec = np.ones(self.k-1)
+        return self._pad_vector(cvec, ranking.n, 0.0)
+
+
+class LoopRBP(RBPCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        return np.dot(np.ones(ranking.n), self.theta)
+
+
+class LoopNPV(NPVCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        gains = ranking.get_gain_vector(worse_case)
+        return np.dot(np.ones(len(gains)), (1.0/(1.0+self.rate)))
+
+
+class LoopRR(RRCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        gains = ranking.get_gain_vector(worse_case)
+        cvec = np.zeros(len(gains))
+        i = 0
+        found_gain = False
+        while i < len(gains) and not found_gain:
+            if gains[i] > 0:
+                found_gain = True
+            else:
+                cvec[i] = 1.0
+            i = i + 1
+        return cvec
+
+
+class LoopAP(APCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        gains = ranking.get_gain_vector(worse_case)
+        n = len(gains)
+        rii = np.array([gains[i]/(i+1) for i in range(0, n)])
+        cvec = []
+        for i in range(0, n-1):
+            bot = np.sum(rii[i:n])
+            top = np.sum(rii[i+1:n])
+            if top > 0.0:
+                cvec.append(top/bot)
+            else:
+                cvec.append(0.0)
+        cvec.append(0.0)
+        return np.array(cvec)
+
+
+class LoopTrAP(TrAPCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        return c_from_w_loop(self.w_vector(ranking, worse_case))
+
+    def w_vector(self, ranking, worse_case=True):
+        c_costs = np.cumsum(ranking.get_cost_vector(worse_case))
+        c_gains = np.cumsum(ranking.get_gain_vector(worse_case))
+        i = 0
+        while (c_gains[i] == 0) and (i < len(c_gains)-1):
+            c_gains[i] = 1.0
+            i += 1
+        total_rels = ranking.get_total_rels(worse_case)
+        wvec = np.divide(c_gains, c_costs)
+        if total_rels > 0:
+            wvec = wvec / total_rels
+        return np.array(wvec)
+
+
+class LoopNDCG(NDCGCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        cvec = []
+        for i in range(1, ranking.n+1):
+            if i < self.k:
+                cvec.append(math.log(i+1, self.base)/math.log(i+2, self.base))
+            else:
+                cvec.append(0.0)
+        return np.array(cvec)
+
+
+class LoopSET(SETCWLMetric):
+    def _weight(self, i):
+        return math.pow(i + 1, self.beta) - math.pow(i, self.beta)
+
+    def c_vector(self, ranking, worse_case=True):
+        cvec = []
+        for i in range(1, ranking.n + 1):
+            if i < self.k:
+                cvec.append(self._weight(i+1)/self._weight(i))
+            else:
+                cvec.append(0.0)
+        return np.array(cvec)
+
+
+class LoopINST(INSTCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        gains = ranking.get_gain_vector(worse_case)
+        c_gains = np.cumsum(gains)
+        cvec = []
+        for i in range(0, len(c_gains)):
+            Ti = self.T - c_gains[i]
+            cvec.append((((i+1.0)+self.T+Ti-1.0) / ((i+1.0)+self.T+Ti))**2.0)
+        return np.array(cvec)
+
+
+class LoopINSQ(INSQCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        gains = ranking.get_gain_vector(worse_case)
+        cvec = []
+        for i in range(0, len(gains)):
+            cvec.append((((i+1.0) + (2.0 * self.T)-1.0) / ((i+1.0) + (2.0 * self.T)))**2.0)
+        return np.array(cvec)
+
+
+class LoopTBG(TBGCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        return c_from_w_loop(self.w_vector(ranking, worse_case))
+
+    def w_vector(self, ranking, worse_case=True):
+        c_costs = np.cumsum(ranking.get_cost_vector(worse_case))
+        norm = self.loop_decay(0.0)
+        wvec = [norm]
+        for i in range(0, len(c_costs)-1):
+            weight_i = self.loop_decay(c_costs[i])
+            norm = norm + weight_i
+            wvec.append(weight_i)
+        return np.divide(np.array(wvec), norm)
+
+    def loop_decay(self, x):
+        h = self.halflife
+        return (h * (2.0 ** (-x/h))) / math.log(2.0, math.e)
+
+
+class LoopUMeasure(UMeasureCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        return c_from_w_loop(self.w_vector(ranking, worse_case))
+
+    def w_vector(self, ranking, worse_case=True):
+        c_costs = np.cumsum(ranking.get_cost_vector(worse_case))
+        wvec = []
+        start = 0
+        norm = 0.0
+        for i in range(0, len(c_costs)-1):
+            weight_i = max(0.0, (1.0 - (start / self.L)))
+            start = c_costs[i]
+            wvec.append(weight_i)
+            norm = norm + weight_i
+        wvec.append(0.0)
+        return np.divide(np.array(wvec), norm)
+
+
+class LoopBPM(BPMCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        gains = ranking.get_gain_vector(worse_case)
+        costs = ranking.get_cost_vector(worse_case)
+        c_gain = np.cumsum(gains)
+        c_cost = np.cumsum(costs)
+        cvec = np.zeros(len(gains))
+        i = 0
+        while i < len(gains) and c_gain[i] < self.T and c_cost[i] < self.K:
+            cvec[i] = 1.0
+            i = i + 1
+        return cvec
+
+
+class LoopBPMD(BPMDCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        gains = ranking.get_gain_vector(worse_case)
+        costs = ranking.get_cost_vector(worse_case)
+        c_gain = np.cumsum(gains)
+        c_cost = np.cumsum(costs)
+        rr_cvec = np.zeros(len(gains))
+        i = 0
+        T = self.T
+        while i < len(gains) and (c_gain[i] < T):
+            rr_cvec[i] = 1.0
+            T = T + self.hb * (gains[i] - self.gain_med)
+            i = i + 1
+        p_cvec = np.zeros(len(costs))
+        i = 0
+        while i < len(costs) and (c_cost[i] < self.K):
+            p_cvec[i] = 1.0
+            i = i + 1
+        return rr_cvec * p_cvec
+
+
+class LoopIFTGoal(IFTGoalCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        c_gains = np.cumsum(ranking.get_gain_vector(worse_case))
+        cvec = []
+        for i in range(0, len(c_gains)):
+            ex = (1.0 + self.b1 * math.pow(math.e, ((self.T-c_gains[i]) * self.R1)))
+            cvec.append(1.0 - math.pow(ex, -1.0))
+        return np.array(cvec)
+
+
+class LoopIFTRate(IFTRateCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        c_gains = np.cumsum(ranking.get_gain_vector(worse_case))
+        c_costs = np.cumsum(ranking.get_cost_vector(worse_case))
+        cvec = []
+        for i in range(0, len(c_gains)):
+            ex = (1.0 + self.b2 * math.pow(math.e, ((self.A - (c_gains[i]/c_costs[i])) * self.R2)))
+            cvec.append(math.pow(ex, -1.0))
+        return np.array(cvec)
+
+
+class LoopIFTGoalRate(IFTGoalRateCWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        c_gains = np.cumsum(ranking.get_gain_vector(worse_case))
+        c_costs = np.cumsum(ranking.get_cost_vector(worse_case))
+        cvec = []
+        for i in range(0, len(c_gains)):
+            ex1 = (1.0 + self.b1 * math.pow(math.e, ((self.T-c_gains[i]) * self.R1)))
+            ex2 = (1.0 + self.b2 * math.pow(math.e, ((self.A - (c_gains[i]/c_costs[i])) * self.R2)))
+            cvec.append((1.0 - math.pow(ex1, -1.0)) * math.pow(ex2, -1.0))
+        return np.array(cvec)
+
+
+class LoopNERReq8(NERReq8CWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        gains = ranking.get_gain_vector(worse_case)
+        cvec = np.zeros(len(gains))
+        i = 0
+        while i < len(gains) and i < self.k - 1:
+            cvec[i] = 1 - gains[i]
+            i = i + 1
+        return cvec
+
+
+class LoopNERReq9(NERReq9CWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        gains = ranking.get_gain_vector(worse_case)
+        cvec = np.zeros(len(gains))
+        i = 0
+        while i < len(gains) and i < self.k - 1:
+            rank = i + 1
+            cvec[i] = (1.0*rank/(rank+1.0)) * (1.0-gains[i])
+            i = i + 1
+        return cvec
+
+
+class LoopNERReq10(NERReq10CWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        gains = ranking.get_gain_vector(worse_case)
+        return np.array([self.phi * (1 - g) for g in gains])
+
+
+class LoopNERReq11(NERReq11CWLMetric):
+    def c_vector(self, ranking, worse_case=True):
+        gains = ranking.get_gain_vector(worse_case)
+        cvec = np.zeros(len(gains))
+        for i in range(0, len(gains)):
+            rank = i + 1
+            cvec[i] = (((rank + (2.0 * self.T)-1.0) / (rank + (2.0 * self.T)))**2.0) * (1.0-gains[i])
+        return cvec
+
+
+METRIC_PAIRS = [
+    (PrecisionCWLMetric(10), LoopPrecision(10)),
+    (RBPCWLMetric(0.9), LoopRBP(0.9)),
+    (NPVCWLMetric(0.1), LoopNPV(0.1)),
+    (RRCWLMetric(), LoopRR()),
+    (APCWLMetric(), LoopAP()),
+    (TrAPCWLMetric(), LoopTrAP()),
+    (NDCGCWLMetric(10), LoopNDCG(10)),
+    (SETCWLMetric(0.5, 10), LoopSET(0.5, 10)),
+    (INSTCWLMetric(2.0), LoopINST(2.0)),
+    (INSQCWLMetric(2.0), LoopINSQ(2.0)),
+    (TBGCWLMetric(22), LoopTBG(22)),
+    (UMeasureCWLMetric(50), LoopUMeasure(50)),
+    (BPMCWLMetric(2.0, 20), LoopBPM(2.0, 20)),
+    (BPMDCWLMetric(1.2, 10), LoopBPMD(1.2, 10)),
+    (IFTGoalCWLMetric(2.0, 0.9, 10), LoopIFTGoal(2.0, 0.9, 10)),
+    (IFTRateCWLMetric(0.2, 0.9, 10), LoopIFTRate(0.2, 0.9, 10)),
+    (IFTGoalRateCWLMetric(2.0, 0.9, 10, 0.2, 0.9, 10), LoopIFTGoalRate(2.0, 0.9, 10, 0.2, 0.9, 10)),
+    (NERReq8CWLMetric(10), LoopNERReq8(10)),
+    (NERReq9CWLMetric(10), LoopNERReq9(10)),
+    (NERReq10CWLMetric(0.8), LoopNERReq10(0.8)),
+    (NERReq11CWLMetric(2.0), LoopNERReq11(2.0)),
+]
+
+
+def make_rankings(max_n, seed=7):
+    rng = np.random.RandomState(seed)
+    rankings = []
+    for t, size in enumerate([5, 60, max_n // 2, max_n]):
+        gains = rng.choice([0.0, 0.0, 0.25, 0.5, 1.0, np.nan], size)
+        costs = rng.choice([1.0, 2.0, 0.5, np.nan], size)
+        ranking = Ranking("T{0}".format(t), gains, costs, max_cost=3.0, min_cost=0.5, max_n=max_n)
+        ranking.total_qrel_gain = np.nansum(gains) + 2.0
+        ranking.total_qrel_rels = np.sum(gains > 0) + 2.0
+        rankings.append(ranking)
+    return rankings
+
+
+class TestVectorizedMetrics(unittest.TestCase):
+
+    def check_depth(self, max_n):
+        rankings = make_rankings(max_n)
+        for metric, reference in METRIC_PAIRS:
+            for ranking in rankings:
+                for worse_case in [True, False]:
+                    msg = "{0} {1} worse_case={2} n={3}".format(metric.name(), ranking.topic_id, worse_case, max_n)
+                    cvec = metric.c_vector(ranking, worse_case)
+                    ref_cvec = reference.c_vector(ranking, worse_case)
+                    self.assertEqual(np.shape(cvec), np.shape(ref_cvec), msg)
+                    self.assertTrue(np.allclose(cvec, ref_cvec, rtol=1e-9, atol=1e-12), msg)
+                    scores = metric._do_score(ranking, worse_case)
+                    ref_scores = reference._do_score(ranking, worse_case)
+                    self.assertTrue(np.allclose(scores, ref_scores, rtol=1e-9, atol=1e-12), msg)
+
+    def test_depth_1000(self):
+        self.check_depth(1000)
+
+    def test_depth_10000(self):
+        self.check_depth(10000)
+
+    def test_batch_matches_rankings(self):
+        """
+        Test that every shipped metric scores a batch in one go, giving the same results as each ranking.
+        """
+        rankings = make_rankings(1000)
+        batch = RankingBatch(rankings)
+        for metric, _ in METRIC_PAIRS:
+            self.assertTrue(metric.VECTORIZED)
+            metric.residuals = True
+            metric.measure_batch(batch)
+            for i, ranking in enumerate(rankings):
+                metric.measure(ranking)
+                self.assertTrue(np.allclose(metric.batch_scores[i], metric.get_scores(), rtol=1e-12), metric.name())
+                self.assertTrue(np.allclose(metric.batch_residuals[i][0], metric.residual_expected_utility,
+                                            rtol=1e-12, atol=1e-15), metric.name())
+
+    def test_fused_cases_match_each_case(self):
+        """
+        Test that scoring the worse and best cases together gives the same results as scoring each case in turn.
+        """
+        rankings = make_rankings(1000)
+        batch = RankingBatch(rankings)
+        for metric, _ in METRIC_PAIRS:
+            metric.residuals = True
+            for ranking in rankings:
+                metric.measure(ranking)
+                worse = np.array(metric._do_score(ranking, True))
+                best = np.array(metric._do_score(ranking, False))
+                self.assertTrue(np.allclose(metric.get_scores(), worse, rtol=1e-12), metric.name())
+                residuals = [metric.residual_expected_utility, metric.residual_expected_total_utility,
+                             metric.residual_expected_cost, metric.residual_expected_total_cost,
+                             metric.residual_expected_items]
+                self.assertTrue(np.allclose(residuals, best - worse, rtol=1e-12, atol=1e-12), metric.name())
+            metric.measure_batch(batch)
+            worse = metric._do_score_batch(batch, True)
+            best = metric._do_score_batch(batch, False)
+            self.assertTrue(np.allclose(metric.batch_scores, worse, rtol=1e-12), metric.name())
+            self.assertTrue(np.allclose(metric.batch_residuals, best - worse, rtol=1e-12, atol=1e-12), metric.name())
+
+
+if __name__ == '__main__':
+    unittest.main()